@@ -1,14 +1,16 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import earthaccess
-import xarray as xr
 import numpy as np
 from datetime import datetime, timedelta
-import random
-import math
 import os
 import traceback
 import json
+import sys
+
+# Shared single-handle granule reader from the Vercel API
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+from _granulo import GranuloTempo, VARIABLES_A_EXTRAER  # noqa: E402
 
 app = Flask(__name__)
 CORS(app)
@@ -182,36 +184,24 @@ def consultar_tempo_coordenada(lat, lon):
             print(f"  [DEBUG] Archivos abiertos: {len(files)}")
             if not files: continue
 
-            ds_root = xr.open_dataset(files[0], engine='h5netcdf')
-            ds_product = xr.open_dataset(files[0], engine='h5netcdf', group='product')
-            
-            if 'latitude' not in ds_root.coords or 'longitude' not in ds_root.coords:
-                print("  [DEBUG] ✗ No se encontraron coordenadas 'latitude'/'longitude' en el archivo.")
-                ds_root.close(); ds_product.close(); continue
-            
-            lat_arr = ds_root['latitude'].values
-            lon_arr = ds_root['longitude'].values
-            lat_idx = np.abs(lat_arr - lat).argmin()
-            lon_idx = np.abs(lon_arr - lon).argmin()
-            
-            print(f"  [DEBUG] Coordenada de píxel más cercano: {lat_arr[lat_idx]:.4f}, {lon_arr[lon_idx]:.4f}")
-            
-            vars_dict = {}
-            variables_a_extraer = {
-                'troposphere': 'vertical_column_troposphere',
-                'uncertainty': 'vertical_column_troposphere_uncertainty',
-                'stratosphere': 'vertical_column_stratosphere',
-                'quality_flag': 'main_data_quality_flag'
-            }
-
-            for nombre_interno, nombre_tempo in variables_a_extraer.items():
-                if nombre_tempo in ds_product.data_vars:
-                    var = ds_product[nombre_tempo]
-                    selector = {'latitude': lat_idx, 'longitude': lon_idx}
-                    if 'time' in var.dims: selector['time'] = 0
-                    valor = var.isel(**selector).values
-                    vars_dict[nombre_interno] = float(valor)
-                    print(f"    - {nombre_interno}: {float(valor):.2e}")
+            # One HDF5 handle for root coordinates and product variables, always closed
+            with GranuloTempo(files[0]) as granulo:
+                if not granulo.tiene_coordenadas():
+                    print("  [DEBUG] ✗ No se encontraron coordenadas 'latitude'/'longitude' en el archivo.")
+                    continue
+                
+                lat_arr = granulo.latitudes
+                lon_arr = granulo.longitudes
+                lat_idx = np.abs(lat_arr - lat).argmin()
+                lon_idx = np.abs(lon_arr - lon).argmin()
+                
+                print(f"  [DEBUG] Coordenada de píxel más cercano: {lat_arr[lat_idx]:.4f}, {lon_arr[lon_idx]:.4f}")
+                
+                vars_dict = {}
+                columnas = granulo.leer_puntos([lat_idx], [lon_idx], VARIABLES_A_EXTRAER)
+                for nombre_interno, valores in columnas.items():
+                    vars_dict[nombre_interno] = float(valores[0])
+                    print(f"    - {nombre_interno}: {float(valores[0]):.2e}")
 
             if vars_dict and not np.isnan(vars_dict.get('troposphere', np.nan)):
                 resultados['contaminantes'][config["contaminante"]] = vars_dict
@@ -220,10 +210,6 @@ def consultar_tempo_coordenada(lat, lon):
             else:
                 print("  [DEBUG] ✗ El valor principal es NaN o no hay datos.")
 
-            
-            ds_root.close()
-            ds_product.close()
-
         except Exception as e:
             print(f"  [DEBUG] ‼️ ERROR al procesar {config['short_name']}: {type(e).__name__} - {e}")
             traceback.print_exc() # Imprime el traceback completo para más detalles
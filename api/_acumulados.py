@@ -0,0 +1,304 @@
+"""
+Promedios móviles por píxel (8 horas y diario) mantenidos de forma incremental
+a partir de las particiones horarias que escribe api/_ingesta.py.
+
+Por cada producto y ventana se guardan, en memmaps propios, la suma de
+troposphere/uncertainty/stratosphere y el número de horas válidas de cada
+píxel (troposphere finito y sin quality_flag > 0). Cada hora nueva se suma y
+las que salen de la ventana se restan releyendo su partición: O(rejilla) por
+hora, sin recorrer la ventana entera. El máximo no se puede restar, así que
+usa bloques de la longitud de la ventana (van Herk/Gil-Werman): el máximo
+acumulado del bloque en curso más los máximos por sufijo del bloque anterior,
+calculados una vez al cerrarlo.
+
+El resultado se publica como un almacén columnar más ({ventana}/{hora}/
+{contaminante}/ con la media de cada variable, 'maximo' y 'cuenta'), que
+/api/tempo lee con 'modo': '8h' o 'diario' (TEMPO_ACUMULADOS_DIR):
+
+    python api/_acumulados.py --almacen /tmp/tempo_almacen --destino /tmp/tempo_acumulados --cada 300
+
+Para restar sin reconstruir, la ingesta conserva por defecto la ventana más
+larga más una hora (HORAS_A_CONSERVAR); si aun así falta una, la ventana se
+rehace con las horas que sigan disponibles. El estado guarda la última hora
+que falta en las sumas ('incompleta_hasta') y el manifiesto publica
+'completa': la API devuelve en 'ventana_completa' si la media cubre de verdad
+la ventana entera o sólo las horas disponibles ('horas').
+"""
+import argparse
+import calendar
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import tempo  # noqa: E402
+from _ingesta import FILAS_POR_FRANJA, _escribir_manifiesto, _limpiar, _publicar_particion, leer_manifiesto  # noqa: E402
+
+VENTANAS = tempo.VENTANAS_ACUMULADO
+VARIABLES_MEDIA = ('troposphere', 'uncertainty', 'stratosphere')
+
+def _numero_hora(hora):
+    """'2025-09-01T14' -> horas desde 1970."""
+    return calendar.timegm(time.strptime(hora, '%Y-%m-%dT%H')) // 3600
+
+def _validos(variables, filas=slice(None)):
+    validos = np.isfinite(variables['troposphere'][filas])
+    for nombre in VARIABLES_MEDIA[1:]:
+        if nombre in variables:
+            validos &= np.isfinite(variables[nombre][filas])
+    if 'quality_flag' in variables:
+        validos &= ~(variables['quality_flag'][filas] > 0)
+    return validos
+
+def leer_particion(carpeta):
+    """{variable: memmap} de una partición del almacén columnar, o None si no está."""
+    if not os.path.exists(os.path.join(carpeta, 'troposphere.npy')):
+        return None
+    return {
+        nombre: np.load(os.path.join(carpeta, archivo), mmap_mode='r')
+        for archivo in os.listdir(carpeta) if archivo.endswith('.npy')
+        for nombre in [archivo[:-4]]
+    }
+
+class VentanaMovil:
+    """Estado de una ventana de `horas` horas de un producto, en `directorio`."""
+
+    def __init__(self, directorio, horas):
+        self.directorio = directorio
+        self.horas = horas
+        self.estado = self._leer_estado()
+        self.reconstrucciones = 0
+
+    def _leer_estado(self):
+        try:
+            with open(os.path.join(self.directorio, 'estado.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'horas': [], 'bloque': None, 'forma': None, 'variables': [], 'incompleta_hasta': None}
+
+    def _guardar_estado(self):
+        temporal = os.path.join(self.directorio, '.estado.json.tmp')
+        with open(temporal, 'w') as f:
+            json.dump(self.estado, f)
+        os.replace(temporal, os.path.join(self.directorio, 'estado.json'))
+
+    def _array(self, nombre, dtype=None, forma=None):
+        """Memmap del estado (r+); con dtype/forma se crea a cero."""
+        ruta = os.path.join(self.directorio, f'{nombre}.npy')
+        if dtype is not None:
+            return np.lib.format.open_memmap(ruta, mode='w+', dtype=dtype, shape=forma)
+        return np.load(ruta, mmap_mode='r+')
+
+    def _reiniciar(self, forma, variables, incompleta_hasta):
+        shutil.rmtree(self.directorio, ignore_errors=True)
+        os.makedirs(self.directorio)
+        for nombre in variables:
+            self._array(f'suma_{nombre}', np.float64, forma)
+        self._array('cuenta', np.uint8, forma)
+        self._array('prefijo', np.float32, forma)[:] = np.nan
+        self._array('sufijo', np.float32, (self.horas,) + forma)[:] = np.nan
+        self.estado = {
+            'horas': [], 'bloque': None, 'forma': list(forma), 'variables': list(variables),
+            'incompleta_hasta': incompleta_hasta,
+        }
+
+    def _sumar(self, variables, signo):
+        """Suma (signo=1) o resta (signo=-1) una hora de las sumas y la cuenta, por franjas."""
+        sumas = {nombre: self._array(f'suma_{nombre}') for nombre in self.estado['variables']}
+        cuenta = self._array('cuenta')
+        for i0 in range(0, cuenta.shape[0], FILAS_POR_FRANJA):
+            filas = slice(i0, i0 + FILAS_POR_FRANJA)
+            validos = _validos(variables, filas)
+            for nombre, suma in sumas.items():
+                suma[filas] += signo * np.where(validos, variables[nombre][filas], 0.0)
+            if signo > 0:
+                cuenta[filas] += validos
+            else:
+                cuenta[filas] -= validos
+        for array in list(sumas.values()) + [cuenta]:
+            array.flush()
+
+    def _maximo_hora(self, variables, filas=slice(None)):
+        return np.where(_validos(variables, filas), variables['troposphere'][filas], np.nan).astype(np.float32)
+
+    def _actualizar_maximo(self, numero, variables, leer_hora):
+        bloque = numero // self.horas
+        prefijo = self._array('prefijo')
+        if bloque != self.estado['bloque']:
+            sufijo = self._array('sufijo')
+            sufijo[:] = np.nan
+            if self.estado['bloque'] is not None and bloque == self.estado['bloque'] + 1:
+                # Close the previous block: sufijo[k] = max over its hours at position >= k
+                por_posicion = {
+                    _numero_hora(h) % self.horas: h for h in self.estado['horas']
+                    if _numero_hora(h) // self.horas == self.estado['bloque']
+                }
+                for i0 in range(0, prefijo.shape[0], FILAS_POR_FRANJA):
+                    filas = slice(i0, i0 + FILAS_POR_FRANJA)
+                    acumulado = np.full(prefijo[filas].shape, np.nan, dtype=np.float32)
+                    for posicion in range(self.horas - 1, -1, -1):
+                        if posicion in por_posicion:
+                            anteriores = leer_hora(por_posicion[posicion])
+                            if anteriores is not None:
+                                acumulado = np.fmax(acumulado, self._maximo_hora(anteriores, filas))
+                        sufijo[posicion, filas] = acumulado
+            sufijo.flush()
+            prefijo[:] = np.nan
+            self.estado['bloque'] = bloque
+        for i0 in range(0, prefijo.shape[0], FILAS_POR_FRANJA):
+            filas = slice(i0, i0 + FILAS_POR_FRANJA)
+            prefijo[filas] = np.fmax(prefijo[filas], self._maximo_hora(variables, filas))
+        prefijo.flush()
+
+    def agregar(self, hora, variables, leer_hora):
+        """
+        Añade la hora `hora` ('2025-09-01T14') con sus {variable: array 2D}.
+        leer_hora(h) devuelve las variables de una hora anterior (o None) para
+        restarla cuando sale de la ventana. False si la hora no es posterior.
+        """
+        numero = _numero_hora(hora)
+        forma = list(variables['troposphere'].shape)
+        presentes = [nombre for nombre in VARIABLES_MEDIA if nombre in variables]
+        if self.estado['forma'] != forma or self.estado['variables'] != presentes:
+            # Nothing before this hour is in the sums
+            self._reiniciar(tuple(forma), presentes, numero - 1)
+        if self.estado['horas'] and numero <= _numero_hora(self.estado['horas'][-1]):
+            return False
+
+        salientes = [h for h in self.estado['horas'] if numero - _numero_hora(h) >= self.horas]
+        for h in salientes:
+            anteriores = leer_hora(h)
+            if anteriores is None or list(anteriores['troposphere'].shape) != forma:
+                tempo.log.info("%s: la hora %s ya no está, se rehace la ventana", self.directorio, h)
+                return self._reconstruir(hora, variables, leer_hora)
+            self._sumar(anteriores, -1)
+        self._sumar(variables, 1)
+        self._actualizar_maximo(numero, variables, leer_hora)
+        self.estado['horas'] = [h for h in self.estado['horas'] if h not in salientes] + [hora]
+        self._guardar_estado()
+        return True
+
+    def _reconstruir(self, hora, variables, leer_hora):
+        """Ventana desde cero con las horas anteriores que sigan en ella y estén disponibles."""
+        self.reconstrucciones += 1
+        numero = _numero_hora(hora)
+        vigentes = [h for h in self.estado['horas'] if numero - _numero_hora(h) < self.horas]
+        incompleta_hasta = self.estado.get('incompleta_hasta')
+        if incompleta_hasta is None and self.estado['horas']:
+            incompleta_hasta = _numero_hora(self.estado['horas'][0]) - 1
+        self._reiniciar(tuple(variables['troposphere'].shape), [n for n in VARIABLES_MEDIA if n in variables], incompleta_hasta)
+        for h in vigentes:
+            anteriores = leer_hora(h)
+            if anteriores is not None and list(anteriores['troposphere'].shape) == self.estado['forma']:
+                self.agregar(h, anteriores, leer_hora)
+            else:
+                # An hour still inside the window is lost: incomplete until it would have left
+                self.estado['incompleta_hasta'] = max(self.estado['incompleta_hasta'] or 0, _numero_hora(h))
+        return self.agregar(hora, variables, leer_hora)
+
+    def completa(self):
+        """True si las sumas cubren las `horas` horas que terminan en la última añadida."""
+        if not self.estado['horas']: return False
+        incompleta_hasta = self.estado.get('incompleta_hasta')
+        if incompleta_hasta is None:
+            incompleta_hasta = _numero_hora(self.estado['horas'][0]) - 1
+        return _numero_hora(self.estado['horas'][-1]) - incompleta_hasta >= self.horas
+
+    def escribir(self, destino):
+        """Media de cada variable (NaN sin horas válidas), 'maximo' y 'cuenta' en `destino`."""
+        cuenta = self._array('cuenta')
+        numero = _numero_hora(self.estado['horas'][-1])
+        posicion = numero % self.horas
+        prefijo = self._array('prefijo')
+        sufijo = self._array('sufijo') if posicion + 1 < self.horas else None
+        for nombre in self.estado['variables']:
+            suma = self._array(f'suma_{nombre}')
+            salida = np.lib.format.open_memmap(
+                os.path.join(destino, f'{nombre}.npy'), mode='w+', dtype=np.float32, shape=cuenta.shape
+            )
+            for i0 in range(0, cuenta.shape[0], FILAS_POR_FRANJA):
+                filas = slice(i0, i0 + FILAS_POR_FRANJA)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    salida[filas] = np.where(cuenta[filas] > 0, suma[filas] / cuenta[filas], np.nan)
+            salida.flush()
+            del salida
+        maximo = np.lib.format.open_memmap(
+            os.path.join(destino, 'maximo.npy'), mode='w+', dtype=np.float32, shape=cuenta.shape
+        )
+        for i0 in range(0, cuenta.shape[0], FILAS_POR_FRANJA):
+            filas = slice(i0, i0 + FILAS_POR_FRANJA)
+            maximo[filas] = prefijo[filas] if sufijo is None else np.fmax(prefijo[filas], sufijo[posicion + 1, filas])
+        maximo.flush()
+        del maximo
+        np.save(os.path.join(destino, 'cuenta.npy'), np.asarray(cuenta))
+
+def _horas_disponibles(almacen, contaminante):
+    return sorted(
+        d for d in os.listdir(almacen)
+        if not d.startswith('.') and os.path.isdir(os.path.join(almacen, d, contaminante))
+    )
+
+def actualizar(almacen, destino, conservar=2):
+    """
+    Una pasada: añade a cada ventana las horas nuevas del almacén columnar, en
+    orden, y publica la ventana tras la última. Devuelve {ventana: {contaminante: [horas]}}.
+    """
+    agregadas = {}
+    for ventana, horas in VENTANAS.items():
+        publicado = os.path.join(destino, ventana)
+        os.makedirs(publicado, exist_ok=True)
+        manifiesto = leer_manifiesto(publicado)
+        agregadas[ventana] = {}
+        for config in tempo.DATASETS_CONFIG:
+            contaminante = config["contaminante"]
+            estado = VentanaMovil(os.path.join(destino, '.estado', ventana, contaminante), horas)
+            def leer_hora(h, contaminante=contaminante):
+                return leer_particion(os.path.join(almacen, h, contaminante))
+            ultima = estado.estado['horas'][-1] if estado.estado['horas'] else None
+            nuevas = [h for h in _horas_disponibles(almacen, contaminante) if ultima is None or h > ultima]
+            for hora in nuevas:
+                variables = leer_hora(hora)
+                if variables is not None:
+                    estado.agregar(hora, variables, leer_hora)
+            agregadas[ventana][contaminante] = nuevas
+            if not nuevas or not estado.estado['horas']: continue
+
+            hora = estado.estado['horas'][-1]
+            origen = os.path.join(almacen, hora, contaminante)
+            def escribir(carpeta, estado=estado, origen=origen):
+                estado.escribir(carpeta)
+                for eje in ('latitude.npy', 'longitude.npy'):
+                    shutil.copyfile(os.path.join(origen, eje), os.path.join(carpeta, eje))
+            _publicar_particion(publicado, hora, contaminante, escribir)
+            manifiesto[contaminante] = {
+                'hora': hora,
+                'granulo': f"{contaminante}-{ventana}-{hora}",
+                'horas': estado.estado['horas'],
+                'completa': estado.completa(),
+                'ingerido': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            }
+            _escribir_manifiesto(publicado, manifiesto)
+            print(f"  ✓ {contaminante} {ventana} hasta {hora}: {len(estado.estado['horas'])} horas"
+                  + ("" if estado.completa() else " (ventana incompleta)"))
+        _limpiar(publicado, manifiesto, conservar)
+    return agregadas
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Promedios móviles de 8 horas y diarios por píxel')
+    parser.add_argument('--almacen', default=tempo.ALMACEN_DIR or '/tmp/tempo_almacen', help='Almacén columnar de api/_ingesta.py')
+    parser.add_argument('--destino', default=os.environ.get('TEMPO_ACUMULADOS_DIR') or '/tmp/tempo_acumulados')
+    parser.add_argument('--cada', type=float, default=300, help='Segundos entre pasadas')
+    parser.add_argument('--una-vez', action='store_true', help='Una sola pasada y salir')
+    args = parser.parse_args()
+
+    while True:
+        print(f"🧮 Actualizando promedios móviles ({datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S}Z)")
+        actualizar(args.almacen, args.destino)
+        if args.una_vez:
+            break
+        time.sleep(args.cada)
@@ -0,0 +1,304 @@
+"""
+Evaluación masiva de alertas: miles de puntos vigilados por cada granulo nuevo.
+
+Los puntos viven en RegistroSuscripciones, arrays paralelos (id, lat, lon y
+una columna por variable de estado) en lugar de un objeto por suscripción, con
+el píxel de cada punto precalculado por rejilla de producto. Por cada granulo
+nuevo MotorAlertas muestrea las variables del producto en esos píxeles (un
+solo gather), recalcula el AQI de todos los puntos con
+calcular_indice_realista_array usando el último valor conocido de cada
+producto y emite sólo los puntos cuya categoría (las bandas de get_categoria)
+cambió. Se deja corriendo junto a la ingesta, con la misma fuente de granulos:
+
+    python api/_alertas.py --suscripciones puntos.csv --estado alertas.npz --cada 300
+    python api/_alertas.py --suscripciones puntos.csv --fuente-dir /tmp/fixtures --una-vez
+
+puntos.csv tiene columnas id,lat,lon; las transiciones salen en NDJSON.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import tempo  # noqa: E402
+from _granulo import VARIABLES_A_EXTRAER, GranuloTempo  # noqa: E402
+from _ingesta import FuenteCMR, FuenteDirectorio, pendientes  # noqa: E402
+
+# Band of a subscription that has not been scored yet; its first band is not a transition
+SIN_EVALUAR = -2
+# Category name per band index (banda_aqi_array), -1 = no data
+CATEGORIAS = {
+    banda: tempo.get_categoria(aqi)
+    for banda, aqi in enumerate([int(limite) for limite in tempo.LIMITES_BANDAS_AQI] + [500])
+}
+CATEGORIAS[-1] = tempo.get_categoria(None)
+
+class RegistroSuscripciones:
+    """
+    Puntos vigilados en arrays paralelos. Además de ids/latitudes/longitudes,
+    columna(nombre) crea columnas alineadas que agregar/eliminar mantienen.
+    """
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.latitudes = np.empty(0, dtype=np.float64)
+        self.longitudes = np.empty(0, dtype=np.float64)
+        self.columnas = {}
+        self._rellenos = {}
+        # clave_rejilla -> (IndiceRejilla, filas, columnas)
+        self._indices = {}
+        self._siguiente_id = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self.ids.size
+
+    def columna(self, nombre, dtype=np.float64, relleno=np.nan):
+        """Columna de estado por suscripción; se crea con `relleno` la primera vez."""
+        with self._lock:
+            if nombre not in self.columnas:
+                self.columnas[nombre] = np.full(len(self), relleno, dtype=dtype)
+                self._rellenos[nombre] = relleno
+            return self.columnas[nombre]
+
+    def agregar(self, lats, lons, ids=None):
+        """Añade puntos y devuelve sus ids. Los índices ya calculados sólo se extienden."""
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        with self._lock:
+            if ids is None:
+                ids = np.arange(self._siguiente_id, self._siguiente_id + lats.size, dtype=np.int64)
+            ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+            if ids.size:
+                self._siguiente_id = max(self._siguiente_id, int(ids.max()) + 1)
+            self.ids = np.concatenate([self.ids, ids])
+            self.latitudes = np.concatenate([self.latitudes, lats])
+            self.longitudes = np.concatenate([self.longitudes, lons])
+            for nombre, valores in self.columnas.items():
+                nuevos = np.full(lats.size, self._rellenos[nombre], dtype=valores.dtype)
+                self.columnas[nombre] = np.concatenate([valores, nuevos])
+            for clave, (indice, filas, columnas) in self._indices.items():
+                nuevas_filas, nuevas_columnas = indice.indices(lats, lons)
+                self._indices[clave] = (
+                    indice, np.concatenate([filas, nuevas_filas]), np.concatenate([columnas, nuevas_columnas])
+                )
+            return ids
+
+    def eliminar(self, ids):
+        """Quita las suscripciones con esos ids; devuelve cuántas se quitaron."""
+        with self._lock:
+            conservar = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+            quitadas = int(conservar.size - conservar.sum())
+            if quitadas:
+                self.ids = self.ids[conservar]
+                self.latitudes = self.latitudes[conservar]
+                self.longitudes = self.longitudes[conservar]
+                self.columnas = {nombre: valores[conservar] for nombre, valores in self.columnas.items()}
+                self._indices = {
+                    clave: (indice, filas[conservar], columnas[conservar])
+                    for clave, (indice, filas, columnas) in self._indices.items()
+                }
+            return quitadas
+
+    def indices(self, clave_rejilla, indice):
+        """(filas, columnas) del píxel de cada punto en la rejilla `indice`, calculados una vez."""
+        with self._lock:
+            cacheado = self._indices.get(clave_rejilla)
+            if cacheado is not None and cacheado[0].forma == indice.forma:
+                return cacheado[1], cacheado[2]
+            filas, columnas = indice.indices(self.latitudes, self.longitudes)
+            self._indices[clave_rejilla] = (indice, filas, columnas)
+            return filas, columnas
+
+    def guardar(self, ruta, **extra):
+        with self._lock:
+            np.savez(
+                ruta, ids=self.ids, latitudes=self.latitudes, longitudes=self.longitudes,
+                rellenos=json.dumps({n: None if np.isnan(r) else r for n, r in self._rellenos.items()}),
+                extra=json.dumps(extra),
+                **{f'columna:{nombre}': valores for nombre, valores in self.columnas.items()}
+            )
+
+    @classmethod
+    def cargar(cls, ruta):
+        """(registro, extra) de un archivo escrito por guardar()."""
+        registro = cls()
+        with np.load(ruta) as datos:
+            registro.agregar(datos['latitudes'], datos['longitudes'], datos['ids'])
+            rellenos = json.loads(str(datos['rellenos']))
+            for clave in datos.files:
+                if clave.startswith('columna:'):
+                    nombre = clave[len('columna:'):]
+                    relleno = rellenos.get(nombre)
+                    registro.columnas[nombre] = datos[clave].copy()
+                    registro._rellenos[nombre] = np.nan if relleno is None else relleno
+            return registro, json.loads(str(datos['extra']))
+
+class MotorAlertas:
+    """Puntúa un RegistroSuscripciones por granulo y devuelve las transiciones de categoría."""
+
+    def __init__(self, registro=None):
+        self.registro = registro if registro is not None else RegistroSuscripciones()
+        self.registro.columna('banda', np.int8, SIN_EVALUAR)
+        # contaminante -> hora ('2025-09-01T14') del último granulo evaluado
+        self.horas = {}
+        self.evaluaciones = 0
+        self.segundos = 0.0
+
+    def _contaminantes(self):
+        columnas = self.registro.columnas
+        return {
+            contaminante: {
+                nombre: columnas[f'{contaminante}.{nombre}']
+                for nombre in VARIABLES_A_EXTRAER if f'{contaminante}.{nombre}' in columnas
+            }
+            for contaminante in self.horas
+        }
+
+    def evaluar(self, contaminante, valores, hora=None):
+        """
+        valores: {variable: array con un valor por suscripción} del granulo
+        nuevo de `contaminante`. Devuelve {'ids', 'antes', 'despues', 'aqi'}
+        (arrays) de los puntos que cambiaron de banda (-1 = sin datos).
+        """
+        inicio = time.perf_counter()
+        registro = self.registro
+        with registro._lock:
+            for nombre, columna in valores.items():
+                registro.columna(f'{contaminante}.{nombre}')[:] = columna
+            if 'troposphere' in valores and 'quality_flag' in valores:
+                # Like the point API, a product without a value does not count, so neither does its flag
+                calidad = registro.columnas[f'{contaminante}.quality_flag']
+                calidad[np.isnan(registro.columnas[f'{contaminante}.troposphere'])] = np.nan
+            self.horas[contaminante] = hora
+            aqi = tempo.calcular_indice_realista_array(self._contaminantes(), nan_como_ausente=True)
+            bandas = tempo.banda_aqi_array(aqi).astype(np.int8)
+            anteriores = registro.columnas['banda']
+            cambios = np.flatnonzero((bandas != anteriores) & (anteriores != SIN_EVALUAR))
+            transiciones = {
+                'ids': registro.ids[cambios],
+                'antes': anteriores[cambios],
+                'despues': bandas[cambios],
+                'aqi': aqi[cambios],
+            }
+            registro.columnas['banda'] = bandas
+        self.evaluaciones += 1
+        self.segundos += time.perf_counter() - inicio
+        return transiciones
+
+    def evaluar_rejilla(self, contaminante, variables, indice, clave_rejilla, hora=None, origen=(0, 0)):
+        """
+        evaluar() muestreando {variable: array 2D (lat, lon)} en el píxel de
+        cada suscripción; `origen` es la (fila, columna) de variables[...][0, 0]
+        cuando son un recorte de la rejilla.
+        """
+        filas, columnas = self.registro.indices(clave_rejilla, indice)
+        filas, columnas = filas - origen[0], columnas - origen[1]
+        valores = {nombre: datos[filas, columnas] for nombre, datos in variables.items()}
+        return self.evaluar(contaminante, valores, hora)
+
+    def evaluar_granulo(self, ruta, config, hora=None):
+        """evaluar_rejilla sobre un granulo local, leyendo sólo el rectángulo que cubre los puntos."""
+        clave = tempo._clave_rejilla(config)
+        with GranuloTempo(ruta) as granulo:
+            indice = tempo.indice_rejilla(clave, granulo.forma, lambda: (granulo.latitudes, granulo.longitudes))
+            filas, columnas = self.registro.indices(clave, indice)
+            if not filas.size:
+                return self.evaluar(config["contaminante"], {}, hora)
+            i0, i1 = int(filas.min()), int(filas.max()) + 1
+            j0, j1 = int(columnas.min()), int(columnas.max()) + 1
+            variables = {
+                nombre_interno: granulo.leer_franja(nombre_tempo, i0, i1, j0, j1)
+                for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items()
+                if granulo.variable(nombre_tempo) is not None
+            }
+        return self.evaluar_rejilla(config["contaminante"], variables, indice, clave, hora, origen=(i0, j0))
+
+    def estadisticas(self):
+        return {
+            'suscripciones': len(self.registro),
+            'evaluaciones': self.evaluaciones,
+            'segundos': round(self.segundos, 3),
+            'horas': dict(self.horas),
+        }
+
+def eventos(transiciones, contaminante, hora):
+    """Transiciones (arrays) -> dicts listos para NDJSON."""
+    return [
+        {
+            'id': int(id_), 'hora': hora, 'producto': contaminante,
+            'aqi': None if np.isnan(aqi) else int(aqi),
+            'categoria_anterior': CATEGORIAS[int(antes)], 'categoria': CATEGORIAS[int(despues)],
+        }
+        for id_, antes, despues, aqi in zip(
+            transiciones['ids'], transiciones['antes'], transiciones['despues'], transiciones['aqi']
+        )
+    ]
+
+def procesar(motor, fuente, emitir):
+    """
+    Una pasada: evalúa, en orden, los granulos de cada producto posteriores al
+    último evaluado y llama a emitir(evento) por cada transición.
+    """
+    for config in tempo.DATASETS_CONFIG:
+        contaminante = config["contaminante"]
+        try:
+            nuevos = pendientes(fuente, config, motor.horas.get(contaminante))
+        except Exception as e:
+            tempo.log.warning("%s: búsqueda fallida: %s", config["short_name"], e)
+            continue
+        for hora, granulo in nuevos:
+            ruta = fuente.ruta(granulo)
+            if not ruta: continue
+            try:
+                transiciones = motor.evaluar_granulo(ruta, config, hora)
+            except Exception as e:
+                tempo.log.warning("%s: %s", tempo.id_granulo(granulo), e)
+                break
+            finally:
+                fuente.liberar(ruta)
+            for evento in eventos(transiciones, contaminante, hora):
+                emitir(evento)
+
+def leer_suscripciones(ruta):
+    with open(ruta, newline='') as f:
+        filas = list(csv.DictReader(f))
+    return (np.array([float(fila['lat']) for fila in filas]), np.array([float(fila['lon']) for fila in filas]),
+            np.array([int(fila['id']) for fila in filas], dtype=np.int64))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Transiciones de categoría AQI de puntos vigilados por granulo nuevo')
+    parser.add_argument('--suscripciones', help='CSV id,lat,lon con los puntos a vigilar')
+    parser.add_argument('--estado', help='Archivo .npz donde conservar suscripciones, bandas y horas entre ejecuciones')
+    parser.add_argument('--fuente-dir', help='Directorio de granulos .nc a usar en lugar de CMR')
+    parser.add_argument('--cada', type=float, default=300, help='Segundos entre pasadas')
+    parser.add_argument('--una-vez', action='store_true', help='Una sola pasada y salir')
+    args = parser.parse_args()
+
+    if args.estado and os.path.exists(args.estado):
+        registro, extra = RegistroSuscripciones.cargar(args.estado)
+        motor = MotorAlertas(registro)
+        motor.horas = extra.get('horas', {})
+    else:
+        motor = MotorAlertas()
+    if args.suscripciones:
+        lats, lons, ids = leer_suscripciones(args.suscripciones)
+        nuevos = ~np.isin(ids, motor.registro.ids)
+        motor.registro.agregar(lats[nuevos], lons[nuevos], ids[nuevos])
+
+    fuente = FuenteDirectorio(args.fuente_dir) if args.fuente_dir else FuenteCMR()
+    while True:
+        tempo.log.info("Evaluando %d suscripciones (%s)", len(motor.registro), datetime.now(timezone.utc).isoformat(timespec='seconds'))
+        procesar(motor, fuente, lambda evento: print(json.dumps(evento), flush=True))
+        if args.estado:
+            motor.registro.guardar(args.estado, horas=motor.horas)
+        if args.una_vez:
+            break
+        time.sleep(args.cada)
@@ -0,0 +1,201 @@
+"""
+Variante asíncrona (ASGI) de la API, con el mismo contrato y JSON que
+api/tempo.py (process_tempo_request). Para servidores de larga vida:
+
+    uvicorn --app-dir api _asgi:app --port 5000
+
+El event loop sólo parsea y responde; process_tempo_request (búsqueda CMR,
+lecturas HDF5) corre en un executor acotado. Como mucho ASGI_MAX_EN_CURSO
+peticiones están dentro a la vez; las demás esperan un hueco hasta
+ASGI_ESPERA_COLA segundos y, si no lo hay, reciben 503 con Retry-After en
+lugar de acumularse sin límite.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ASGI_WORKERS = int(os.environ.get('TEMPO_ASGI_WORKERS', '16'))
+ASGI_MAX_EN_CURSO = int(os.environ.get('TEMPO_ASGI_MAX_EN_CURSO', str(ASGI_WORKERS)))
+# Each admitted request fans out one task per product on tempo's own pool;
+# size it so that pool is not a second, hidden limit below ASGI_MAX_EN_CURSO
+os.environ.setdefault('TEMPO_MAX_WORKERS', str(3 * ASGI_MAX_EN_CURSO))
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import tempo  # noqa: E402
+
+ASGI_ESPERA_COLA = float(os.environ.get('TEMPO_ASGI_ESPERA_COLA', '1.0'))
+ASGI_RETRY_AFTER = int(os.environ.get('TEMPO_ASGI_RETRY_AFTER', '2'))
+MAX_CUERPO = 1024 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_WORKERS, thread_name_prefix='tempo-asgi')
+
+CABECERAS_CORS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+    (b'access-control-allow-headers', b'Content-Type'),
+    (b'access-control-expose-headers', tempo.CABECERAS_EXPUESTAS.encode()),
+]
+
+class Admision:
+    """
+    Límite de peticiones en curso. Se crea perezosamente dentro del event loop
+    (asyncio.Semaphore queda ligado al loop en el que se usa).
+    """
+
+    def __init__(self, max_en_curso=ASGI_MAX_EN_CURSO, espera=ASGI_ESPERA_COLA):
+        self.max_en_curso = max_en_curso
+        self.espera = espera
+        self._semaforo = None
+        self._lock = threading.Lock()
+        self.en_curso = 0
+        self.atendidas = 0
+        self.rechazadas = 0
+
+    async def entrar(self):
+        """True si se obtuvo un hueco; False si la espera se agotó (saturado)."""
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.max_en_curso)
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), timeout=self.espera)
+        except asyncio.TimeoutError:
+            with self._lock: self.rechazadas += 1
+            return False
+        with self._lock: self.en_curso += 1
+        return True
+
+    def salir(self):
+        with self._lock:
+            self.en_curso -= 1
+            self.atendidas += 1
+        self._semaforo.release()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'en_curso': self.en_curso,
+                'max_en_curso': self.max_en_curso,
+                'atendidas': self.atendidas,
+                'rechazadas': self.rechazadas,
+                'workers': ASGI_WORKERS,
+            }
+
+admision = Admision()
+
+async def _leer_cuerpo(receive):
+    partes, total = [], 0
+    while True:
+        mensaje = await receive()
+        if mensaje['type'] == 'http.disconnect':
+            return None
+        parte = mensaje.get('body', b'')
+        total += len(parte)
+        if total > MAX_CUERPO:
+            raise ValueError('Cuerpo demasiado grande')
+        partes.append(parte)
+        if not mensaje.get('more_body'):
+            return b''.join(partes)
+
+async def _responder(send, status, cuerpo=None, cabeceras=()):
+    datos = b'' if cuerpo is None else json.dumps(cuerpo).encode()
+    cabeceras = list(CABECERAS_CORS) + list(cabeceras)
+    if cuerpo is not None:
+        cabeceras.append((b'content-type', b'application/json'))
+    cabeceras.append((b'content-length', str(len(datos)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': cabeceras})
+    await send({'type': 'http.response.body', 'body': datos})
+
+async def _responder_columnar(send, buffers, cabeceras):
+    # ASGI bodies must be bytes: the columns are copied once, into the joined body
+    datos = b''.join(buffers)
+    cabeceras = list(CABECERAS_CORS) + list(cabeceras) + [
+        (b'content-type', tempo.TIPO_COLUMNAR.encode()),
+        (b'content-length', str(len(datos)).encode()),
+    ]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': cabeceras})
+    await send({'type': 'http.response.body', 'body': datos})
+
+async def _tempo(receive, send, accept):
+    try:
+        cuerpo = await _leer_cuerpo(receive)
+        if cuerpo is None: return
+        data = json.loads(cuerpo or b'{}')
+    except ValueError:
+        await _responder(send, 400, {'error': 'Invalid JSON'})
+        return
+
+    if not await admision.entrar():
+        await _responder(send, 503, {'error': 'Servicio saturado, reintentar'},
+                         [(b'retry-after', str(ASGI_RETRY_AFTER).encode())])
+        return
+    try:
+        loop = asyncio.get_running_loop()
+        result, status_code, server_timing = await loop.run_in_executor(_executor, tempo.procesar_con_tiempos, data)
+    except Exception as e:
+        tempo.log.error("Error in ASGI route: %s", e, exc_info=True)
+        await _responder(send, 500, {'error': 'Internal server error'})
+        return
+    finally:
+        admision.salir()
+
+    cabeceras = [(b'x-cache', result['cache'].encode())] if 'cache' in result else []
+    if server_timing:
+        cabeceras.append((b'server-timing', server_timing.encode()))
+    cabeceras.append((b'vary', b'Accept'))
+    if status_code == 200 and tempo.acepta_columnar(accept):
+        await _responder_columnar(send, tempo.respuesta_columnar(result), cabeceras)
+        return
+    await _responder(send, status_code, result, cabeceras)
+
+async def _stats(send):
+    await _responder(send, 200, {
+        'cache_granulos': tempo.cache_granulos.estadisticas(),
+        'cache_respuestas': tempo.cache_respuestas.estadisticas(),
+        'granulos_abiertos': tempo.GranuloTempo.estadisticas(),
+        'asgi': admision.estadisticas(),
+    })
+
+async def _metrics(send):
+    datos = tempo.registro.exponer().encode()
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/plain; version=0.0.4'), (b'content-length', str(len(datos)).encode()),
+    ]})
+    await send({'type': 'http.response.body', 'body': datos})
+
+@tempo.registro.coleccion
+def _metricas_asgi():
+    estadisticas = admision.estadisticas()
+    return [
+        ('tempo_asgi_en_curso', 'gauge', 'Peticiones admitidas en curso', estadisticas['en_curso']),
+        ('tempo_asgi_rechazadas_total', 'counter', 'Peticiones rechazadas con 503', estadisticas['rechazadas']),
+    ]
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                _executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    metodo, ruta = scope['method'], scope['path']
+    if metodo == 'OPTIONS':
+        await _responder(send, 200)
+    elif ruta == '/api/tempo' and metodo == 'POST':
+        accept = dict(scope['headers']).get(b'accept', b'').decode('latin-1')
+        await _tempo(receive, send, accept)
+    elif ruta == '/api/tempo/stats' and metodo == 'GET':
+        await _stats(send)
+    elif ruta == '/metrics' and metodo == 'GET':
+        await _metrics(send)
+    elif ruta == '/api/tempo':
+        await _responder(send, 405, {'error': 'Method not allowed'})
+    else:
+        await _responder(send, 404, {'error': 'Not found'})
@@ -0,0 +1,76 @@
+"""
+Formato columnar binario de las respuestas (alternativa compacta al JSON).
+
+    'TMPC' | uint32 LE longitud de la cabecera | cabecera JSON (UTF-8) |
+    relleno hasta múltiplo de 8 | columnas
+
+La cabecera lleva los metadatos de la respuesta más 'n' (filas) y
+'columnas': [{'nombre', 'tipo' (dtype de NumPy, p. ej. '<f4'), 'offset',
+'bytes'}], con offsets relativos al inicio de la sección de columnas. Cada
+columna es un buffer little-endian contiguo alineado a 8 bytes, así que un
+cliente la lee sin copiar (np.frombuffer, o un Float32Array en JavaScript).
+"""
+import json
+import struct
+
+import numpy as np
+
+TIPO_COLUMNAR = 'application/vnd.tempo.columnar'
+MAGIA = b'TMPC'
+ALINEACION = 8
+
+def acepta_columnar(accept):
+    """True si la cabecera Accept pide TIPO_COLUMNAR (y no con q=0)."""
+    for parte in (accept or '').split(','):
+        tipo, _, parametros = parte.partition(';')
+        if tipo.strip().lower() != TIPO_COLUMNAR: continue
+        for parametro in parametros.split(';'):
+            clave, _, valor = parametro.partition('=')
+            if clave.strip() == 'q':
+                try:
+                    return float(valor) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+def _relleno(n):
+    return b'\0' * (-n % ALINEACION)
+
+def codificar(cabecera, columnas):
+    """
+    Lista de buffers (para escribir o unir) con la cabecera y las columnas
+    {nombre: array 1D}. Las columnas ya contiguas en little-endian no se copian.
+    """
+    descripcion, buffers, offset = [], [], 0
+    for nombre, valores in columnas.items():
+        valores = np.ascontiguousarray(valores)
+        if valores.dtype.byteorder == '>':
+            valores = valores.astype(valores.dtype.newbyteorder('<'))
+        tamano = valores.nbytes
+        descripcion.append({'nombre': nombre, 'tipo': valores.dtype.str, 'offset': offset, 'bytes': tamano})
+        buffers.append(memoryview(valores).cast('B'))
+        if tamano % ALINEACION:
+            buffers.append(_relleno(tamano))
+        offset += tamano + (-tamano % ALINEACION)
+
+    texto = json.dumps(dict(cabecera, columnas=descripcion), separators=(',', ':')).encode()
+    inicio = MAGIA + struct.pack('<I', len(texto)) + texto
+    return [inicio + _relleno(len(inicio))] + buffers
+
+def decodificar(datos):
+    """(cabecera, {nombre: array}) de un cuerpo codificado; los arrays apuntan a `datos` sin copiarlos."""
+    datos = memoryview(datos)
+    if bytes(datos[:4]) != MAGIA:
+        raise ValueError('No es una respuesta columnar de TEMPO')
+    longitud = struct.unpack('<I', datos[4:8])[0]
+    cabecera = json.loads(bytes(datos[8:8 + longitud]))
+    base = 8 + longitud + (-(8 + longitud) % ALINEACION)
+    columnas = {
+        columna['nombre']: np.frombuffer(
+            datos, dtype=np.dtype(columna['tipo']),
+            count=columna['bytes'] // np.dtype(columna['tipo']).itemsize, offset=base + columna['offset']
+        )
+        for columna in cabecera.pop('columnas')
+    }
+    return cabecera, columnas
@@ -0,0 +1,239 @@
+"""
+Lector de granulos TEMPO L3 con un único handle HDF5.
+
+Lo usan api/tempo.py y EXTERNALPROYECTS/App.py. Un granulo se abre una sola
+vez (h5py, sobre una ruta local o el archivo que devuelve earthaccess.open) y
+desde ese handle se leen tanto las coordenadas del grupo raíz como las
+variables del grupo 'product'. Usar siempre como context manager para que el
+archivo se cierre aunque falle la lectura:
+
+    with GranuloTempo(files[0]) as granulo:
+        columnas = granulo.leer_puntos(lat_idx, lon_idx)
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+VARIABLES_A_EXTRAER = {
+    'troposphere': 'vertical_column_troposphere',
+    'uncertainty': 'vertical_column_troposphere_uncertainty',
+    'stratosphere': 'vertical_column_stratosphere',
+    'quality_flag': 'main_data_quality_flag'
+}
+
+# Above this many pixels the bounding window is too sparse to be worth one read
+MAX_PIXELES_VENTANA = int(os.environ.get('TEMPO_MAX_PIXELES_VENTANA', '4000000'))
+# The bounding window (or a row segment) is read in one go only while it holds at most
+# this many pixels per requested point; otherwise far-apart points would pull in every
+# chunk between them
+PIXELES_POR_PUNTO = int(os.environ.get('TEMPO_PIXELES_POR_PUNTO', '4096'))
+
+def dataset_mmap(ds):
+    """np.memmap sobre un dataset HDF5 contiguo y sin filtros; si no, el dataset h5py (lectura perezosa)."""
+    if ds.chunks is None and ds.compression is None and ds.size:
+        offset = ds.id.get_offset()
+        if offset is not None:
+            return np.memmap(ds.file.filename, mode='r', dtype=ds.dtype, offset=offset, shape=ds.shape)
+    return ds
+
+def nombres_dimensiones(ds):
+    try:
+        return [dim[0].name.rsplit('/', 1)[-1] for dim in ds.dims]
+    except Exception:
+        # No dimension scales attached: assume TEMPO's (time, latitude, longitude) layout
+        return ['time', 'latitude', 'longitude'][-ds.ndim:]
+
+def decodificar(valores, attrs):
+    """Same masking/scaling xarray applies by default (_FillValue, scale_factor, add_offset)."""
+    valores = np.asarray(valores, dtype=np.float64)
+    fill = attrs.get('_FillValue')
+    if fill is not None:
+        valores = np.where(valores == float(np.asarray(fill).ravel()[0]), np.nan, valores)
+    if 'scale_factor' in attrs: valores = valores * float(np.asarray(attrs['scale_factor']).ravel()[0])
+    if 'add_offset' in attrs: valores = valores + float(np.asarray(attrs['add_offset']).ravel()[0])
+    return valores
+
+def indices_mas_cercanos(eje, valores):
+    """Equivalente vectorizado de np.abs(eje - v).argmin() para un eje monótono."""
+    eje = np.asarray(eje, dtype=np.float64)
+    valores = np.atleast_1d(np.asarray(valores, dtype=np.float64))
+    if eje.size == 1: return np.zeros(valores.shape, dtype=np.intp)
+    if eje[0] > eje[-1]: eje, valores = -eje, -valores
+    pos = np.clip(np.searchsorted(eje, valores), 1, eje.size - 1)
+    izquierda = np.abs(valores - eje[pos - 1]) <= np.abs(eje[pos] - valores)
+    return np.where(izquierda, pos - 1, pos)
+
+def _leer_por_filas(var, dims, lat_idx, lon_idx):
+    """Un tramo por cada fila con puntos, o un píxel por punto en las filas donde el tramo sale disperso."""
+    salida = None
+    orden = np.argsort(lat_idx, kind='stable')
+    filas, inicios = np.unique(lat_idx[orden], return_index=True)
+    for fila, grupo in zip(filas, np.split(orden, inicios[1:])):
+        columnas = lon_idx[grupo]
+        j0, j1 = int(columnas.min()), int(columnas.max()) + 1
+        if j1 - j0 <= PIXELES_POR_PUNTO * grupo.size:
+            cortes = {'latitude': int(fila), 'longitude': slice(j0, j1)}
+            valores = np.asarray(var[tuple(cortes.get(d, 0) for d in dims)])[columnas - j0]
+        else:
+            valores = np.array([
+                np.asarray(var[tuple({'latitude': int(fila), 'longitude': int(j)}.get(d, 0) for d in dims)])
+                for j in columnas
+            ])
+        if salida is None:
+            salida = np.empty(lat_idx.size, dtype=valores.dtype)
+        salida[grupo] = valores
+    return salida
+
+def leer_puntos_variable(var, dims, lat_idx, lon_idx):
+    """
+    Lee todos los píxeles pedidos de una variable (dataset h5py, memmap o
+    DataArray): una sola lectura de la ventana que los contiene y un
+    fancy-index si la ventana es densa (PIXELES_POR_PUNTO); si no, por filas.
+    """
+    i0, i1 = int(lat_idx.min()), int(lat_idx.max()) + 1
+    j0, j1 = int(lon_idx.min()), int(lon_idx.max()) + 1
+    pixeles = (i1 - i0) * (j1 - j0)
+    if pixeles > min(MAX_PIXELES_VENTANA, PIXELES_POR_PUNTO * lat_idx.size):
+        return _leer_por_filas(var, dims, lat_idx, lon_idx)
+    cortes = {'latitude': slice(i0, i1), 'longitude': slice(j0, j1)}
+    ventana = np.asarray(var[tuple(cortes.get(d, 0) for d in dims)])
+    locales = {'latitude': lat_idx - i0, 'longitude': lon_idx - j0}
+    return ventana[tuple(locales[d] for d in dims if d in cortes)]
+
+class ArchivoContado:
+    """Envoltorio de un archivo (p. ej. de fsspec) que cuenta los bytes que lee h5py."""
+
+    def __init__(self, archivo):
+        self._archivo = archivo
+        self.bytes_leidos = 0
+        self.lecturas = 0
+
+    def read(self, n=-1):
+        datos = self._archivo.read(n)
+        self.bytes_leidos += len(datos)
+        self.lecturas += 1
+        return datos
+
+    def readinto(self, buffer):
+        datos = self.read(len(buffer))
+        buffer[:len(datos)] = datos
+        return len(datos)
+
+    def seek(self, *args):
+        return self._archivo.seek(*args)
+
+    def tell(self):
+        return self._archivo.tell()
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def bytes_red(self):
+        """Bytes pedidos al servidor según la cache de fsspec (o los leídos si no la hay)."""
+        cache = getattr(self._archivo, 'cache', None)
+        return getattr(cache, 'total_requested_bytes', None) or self.bytes_leidos
+
+    def close(self):
+        self._archivo.close()
+
+class GranuloTempo:
+    """
+    Un granulo TEMPO L3 abierto una sola vez. `fuente` es una ruta local
+    (datasets contiguos vía memmap) o un objeto archivo de earthaccess/fsspec.
+    """
+
+    _lock = threading.Lock()
+    _aperturas = 0
+    _cierres = 0
+    _segundos_apertura = 0.0
+
+    def __init__(self, fuente):
+        # Imported here so importing the API does not load libhdf5 before the first read
+        import h5py
+        inicio = time.perf_counter()
+        self.local = isinstance(fuente, (str, os.PathLike))
+        self._h5 = h5py.File(fuente, 'r')
+        self._latitudes = None
+        self._longitudes = None
+        self.segundos_apertura = time.perf_counter() - inicio
+        with GranuloTempo._lock:
+            GranuloTempo._aperturas += 1
+            GranuloTempo._segundos_apertura += self.segundos_apertura
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        if self._h5 is not None:
+            self._h5.close()
+            self._h5 = None
+            with GranuloTempo._lock:
+                GranuloTempo._cierres += 1
+
+    @classmethod
+    def estadisticas(cls):
+        with cls._lock:
+            return {
+                'aperturas': cls._aperturas,
+                'cierres': cls._cierres,
+                'segundos_apertura': cls._segundos_apertura,
+            }
+
+    def _dataset(self, ds):
+        return dataset_mmap(ds) if self.local else ds
+
+    def tiene_coordenadas(self):
+        return 'latitude' in self._h5 and 'longitude' in self._h5 and 'product' in self._h5
+
+    @property
+    def forma(self):
+        """(n_latitudes, n_longitudes) leída de los metadatos, sin tocar los datos."""
+        return (self._h5['latitude'].shape[0], self._h5['longitude'].shape[0])
+
+    @property
+    def latitudes(self):
+        if self._latitudes is None:
+            self._latitudes = np.asarray(self._dataset(self._h5['latitude'])[:])
+        return self._latitudes
+
+    @property
+    def longitudes(self):
+        if self._longitudes is None:
+            self._longitudes = np.asarray(self._dataset(self._h5['longitude'])[:])
+        return self._longitudes
+
+    def variable(self, nombre_tempo):
+        """Dataset h5py de una variable del grupo 'product' (o None)."""
+        producto = self._h5['product']
+        return producto[nombre_tempo] if nombre_tempo in producto else None
+
+    def leer_puntos(self, lat_idx, lon_idx, variables=VARIABLES_A_EXTRAER):
+        """{nombre_interno: array float64 decodificado} para los píxeles (lat_idx[k], lon_idx[k])."""
+        lat_idx = np.atleast_1d(np.asarray(lat_idx, dtype=np.intp))
+        lon_idx = np.atleast_1d(np.asarray(lon_idx, dtype=np.intp))
+        columnas = {}
+        for nombre_interno, nombre_tempo in variables.items():
+            ds = self.variable(nombre_tempo)
+            if ds is None: continue
+            valores = leer_puntos_variable(self._dataset(ds), nombres_dimensiones(ds), lat_idx, lon_idx)
+            columnas[nombre_interno] = decodificar(valores, ds.attrs)
+        return columnas
+
+    def leer_franja(self, nombre_tempo, i0, i1, j0=0, j1=None):
+        """Bloque [i0:i1, j0:j1] (latitud, longitud) decodificado de una variable."""
+        ds = self.variable(nombre_tempo)
+        dims = nombres_dimensiones(ds)
+        cortes = {'latitude': slice(i0, i1), 'longitude': slice(j0, j1)}
+        bloque = self._dataset(ds)[tuple(cortes.get(d, 0) for d in dims)]
+        if [d for d in dims if d in cortes] == ['longitude', 'latitude']:
+            bloque = np.asarray(bloque).T
+        return decodificar(bloque, ds.attrs)
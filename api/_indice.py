@@ -0,0 +1,125 @@
+"""
+Índice de calidad del aire compuesto (AQI 0-500) a partir de las columnas
+TEMPO, y su color y categoría.
+
+Sólo depende de NumPy para que lo puedan importar los procesos de
+api/_rejilla.py sin cargar Flask ni el resto de tempo.py, que lo reexporta.
+"""
+import numpy as np
+
+# Threshold tables for calcular_indice_realista_array. A value v falls in band
+# np.searchsorted(UMBRALES, v, side='right'), i.e. the first threshold with v < umbral.
+UMBRALES_NO2 = np.array([5e14, 1e15, 2e15, 4e15, 7e15, 1e16, 1.5e16, 2e16, 3e16, 5e16])
+SUBINDICES_NO2 = np.array([25, 50, 75, 100, 125, 150, 175, 200, 250, 300, 400])
+UMBRALES_HCHO = np.array([5e14, 1e15, 2e15, 3e15, 5e15, 8e15, 1.2e16, 1.5e16])
+SUBINDICES_HCHO = np.array([30, 50, 75, 100, 150, 200, 250, 300, 400])
+# O3 bands are nested open intervals around 8e18, checked narrowest first
+BANDAS_O3 = [(7.5e18, 8.5e18, 50), (7e18, 9e18, 75), (6.5e18, 9.5e18, 100), (6e18, 1e19, 125)]
+SUBINDICE_O3_FUERA = 150
+
+def _confianza(trop, unc):
+    """max(0, 1 - unc/trop), o 0 si trop <= 0 (NaN incluido)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(trop > 0, unc / np.where(trop > 0, trop, 1.0), 1.0)
+    confianza = 1 - ratio
+    return np.where(confianza > 0, confianza, 0.0)
+
+def calcular_indice_realista_array(contaminantes, nan_como_ausente=False):
+    """
+    Versión vectorizada de calcular_indice_realista: mismo dict de entrada pero
+    con arrays de NumPy (o escalares) en lugar de floats. Devuelve un array
+    float64 con el índice entero por píxel y NaN donde el escalar devuelve None.
+
+    Con nan_como_ausente=True un píxel con troposphere NaN se trata como si el
+    producto no estuviera (útil para rejillas completas).
+    """
+    arrays = [np.asarray(v) for vars in contaminantes.values() for v in vars.values()]
+    forma = np.broadcast_shapes(*[a.shape for a in arrays]) if arrays else ()
+    
+    invalido = np.zeros(forma, dtype=bool)
+    for vars in contaminantes.values():
+        invalido |= np.asarray(vars.get('quality_flag', 0)) > 0
+    
+    suma_ponderada = np.zeros(forma)
+    suma_confianzas = np.zeros(forma)
+    num_altos = np.zeros(forma, dtype=np.int8)
+    hay_subindices = np.zeros(forma, dtype=bool)
+    
+    def _agregar(subindice, confianza, trop):
+        nonlocal suma_ponderada, suma_confianzas, num_altos, hay_subindices
+        presente = ~np.isnan(trop) if nan_como_ausente else np.ones(forma, dtype=bool)
+        suma_ponderada = suma_ponderada + np.where(presente, subindice * confianza, 0.0)
+        suma_confianzas = suma_confianzas + np.where(presente, confianza, 0.0)
+        num_altos = num_altos + (presente & (subindice > 150))
+        hay_subindices = hay_subindices | presente
+    
+    # --- NO2 (PESO 50%) ---
+    if 'NO2' in contaminantes:
+        no2_vars = contaminantes['NO2']
+        trop = np.asarray(no2_vars.get('troposphere', 0), dtype=np.float64)
+        unc = np.asarray(no2_vars.get('uncertainty', 0), dtype=np.float64)
+        strat = np.asarray(no2_vars.get('stratosphere', 0), dtype=np.float64)
+        aqi_no2 = SUBINDICES_NO2[np.searchsorted(UMBRALES_NO2, trop, side='right')]
+        aqi_no2 = aqi_no2 + np.where((strat < 2e15) | (strat > 4e15), 15, 0)
+        _agregar(aqi_no2, _confianza(trop, unc) * 0.5, trop)
+    
+    # --- HCHO (PESO 35%) ---
+    if 'HCHO' in contaminantes:
+        hcho_vars = contaminantes['HCHO']
+        trop = np.asarray(hcho_vars.get('troposphere', 0), dtype=np.float64)
+        unc = np.asarray(hcho_vars.get('uncertainty', 0), dtype=np.float64)
+        aqi_hcho = SUBINDICES_HCHO[np.searchsorted(UMBRALES_HCHO, trop, side='right')]
+        _agregar(aqi_hcho, _confianza(trop, unc) * 0.35, trop)
+    
+    # --- O3 (PESO 15%) ---
+    if 'O3' in contaminantes:
+        total = np.asarray(contaminantes['O3'].get('troposphere', 0), dtype=np.float64)
+        aqi_o3 = np.select(
+            [(bajo < total) & (total < alto) for bajo, alto, _ in BANDAS_O3],
+            [subindice for _, _, subindice in BANDAS_O3],
+            default=SUBINDICE_O3_FUERA
+        )
+        _agregar(aqi_o3, np.full(forma, 0.15), total)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        indice_final = suma_ponderada / suma_confianzas
+    indice_final = np.where(num_altos >= 2, indice_final * 1.15, indice_final)
+    indice_final = np.clip(np.trunc(indice_final), 0, 500)
+    
+    sin_indice = invalido | ~hay_subindices | (suma_confianzas == 0)
+    return np.where(sin_indice, np.nan, indice_final)
+
+def calcular_indice_realista(contaminantes):
+    """
+    Índice compuesto 0-500 (escala EPA-style) usando 12 variables.
+    Pesos basados en impacto y confiabilidad del dato satelital.
+    Envoltorio escalar de calcular_indice_realista_array.
+    """
+    indice = calcular_indice_realista_array(contaminantes)
+    return None if np.isnan(indice) else int(indice)
+
+def get_color_from_score(aqi):
+    if aqi is None: return '#808080'
+    if aqi <= 50: return '#00E400'
+    if aqi <= 100: return '#FFFF00'
+    if aqi <= 150: return '#FF7E00'
+    if aqi <= 200: return '#FF0000'
+    if aqi <= 300: return '#8F3F97'
+    return '#7E0023'
+
+def get_categoria(aqi):
+    if aqi is None: return "Sin datos"
+    if aqi <= 50: return "Bueno"
+    if aqi <= 100: return "Moderado"
+    if aqi <= 150: return "Poco saludable para sensibles"
+    if aqi <= 200: return "Poco saludable"
+    if aqi <= 300: return "Muy poco saludable"
+    return "Peligroso"
+
+# Upper bound of each AQI band, in the same order as get_color_from_score / get_categoria
+LIMITES_BANDAS_AQI = np.array([50, 100, 150, 200, 300])
+
+def banda_aqi_array(aqi):
+    """Índice de banda 0-5 por píxel (la misma división que get_categoria); -1 para NaN."""
+    aqi = np.asarray(aqi, dtype=np.float64)
+    return np.where(np.isnan(aqi), -1, np.searchsorted(LIMITES_BANDAS_AQI, aqi, side='left'))
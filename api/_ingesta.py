@@ -0,0 +1,221 @@
+"""
+Ingesta incremental de granulos TEMPO al almacén columnar que lee /api/tempo
+(TEMPO_ALMACEN_DIR). Se deja corriendo junto a la API:
+
+    python api/_ingesta.py --cada 300
+
+Por cada producto de DATASETS_CONFIG guarda en actual.json una marca de agua
+(la hora del último granulo ingerido) y sólo procesa granulos posteriores.
+Cada granulo se extrae por franjas con GranuloTempo a una partición horaria
+{hora}/{contaminante}/ con un .npy por variable (float32, NaN = sin dato) más
+los ejes latitude/longitude; la partición se escribe aparte y se publica con
+un rename, así la API nunca ve una a medio escribir. Para pruebas sin red, un
+directorio de archivos NetCDF con nombres reales hace de archivo remoto:
+
+    python api/_ingesta.py --fuente-dir /tmp/fixtures --una-vez
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import tempo  # noqa: E402
+from _granulo import VARIABLES_A_EXTRAER, GranuloTempo  # noqa: E402
+
+FILAS_POR_FRANJA = 256
+TIPO_ALMACEN = np.float32
+# api/_acumulados.py subtracts each hour as it leaves its window, so the longest
+# window plus the hour being added must still be on disk
+HORAS_MINIMAS_ACUMULADOS = max(tempo.VENTANAS_ACUMULADO.values()) + 1
+HORAS_A_CONSERVAR = int(os.environ.get('TEMPO_ALMACEN_HORAS', str(HORAS_MINIMAS_ACUMULADOS)))
+# First run without a watermark only looks this far back
+HORAS_INICIALES = 6
+MAX_GRANULOS_BUSQUEDA = 200
+
+class FuenteCMR:
+    """Granulos publicados en CMR; cada uno se descarga, se extrae y se borra."""
+
+    def granulos(self, config, desde):
+        temporal = (desde.strftime('%Y-%m-%dT%H:%M:%S'), datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S'))
+        # Oldest first: when more than MAX_GRANULOS_BUSQUEDA are pending, the capped
+        # page starts right after the watermark and the next pass picks up the rest
+        return list(tempo.obtener_earthaccess().search_data(
+            short_name=config["short_name"], version=config["version"],
+            temporal=temporal, count=MAX_GRANULOS_BUSQUEDA, sort_key='start_date'
+        ))
+
+    def ruta(self, granulo):
+        temporal = tempfile.mkdtemp(prefix='tempo-ingesta-')
+        archivos = tempo.obtener_earthaccess().download([granulo], local_path=temporal)
+        if not archivos:
+            shutil.rmtree(temporal, ignore_errors=True)
+            return None
+        return str(archivos[0])
+
+    def liberar(self, ruta):
+        shutil.rmtree(os.path.dirname(ruta), ignore_errors=True)
+
+class FuenteDirectorio:
+    """Un directorio de archivos .nc con nombres de granulo reales hace de CMR."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+
+    def granulos(self, config, desde):
+        prefijo = f"{config['short_name']}_{config['version']}_"
+        return [
+            {'umm': {'GranuleUR': nombre}}
+            for nombre in sorted(os.listdir(self.directorio))
+            if nombre.startswith(prefijo) and nombre.endswith('.nc')
+        ]
+
+    def ruta(self, granulo):
+        return os.path.join(self.directorio, tempo.id_granulo(granulo))
+
+    def liberar(self, ruta):
+        pass
+
+def _particion(hora):
+    """'2025-09-01T14:00:00Z' -> '2025-09-01T14'"""
+    return hora[:13]
+
+def leer_manifiesto(directorio):
+    try:
+        with open(os.path.join(directorio, 'actual.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _escribir_manifiesto(directorio, manifiesto):
+    temporal = os.path.join(directorio, '.actual.json.tmp')
+    with open(temporal, 'w') as f:
+        json.dump(manifiesto, f, indent=2)
+    os.replace(temporal, os.path.join(directorio, 'actual.json'))
+
+def pendientes(fuente, config, marca):
+    """[(hora, granulo)] posteriores a la marca de agua, del más antiguo al más nuevo."""
+    desde = (datetime.strptime(marca, '%Y-%m-%dT%H') + timedelta(hours=1) if marca
+             else datetime.utcnow() - timedelta(hours=HORAS_INICIALES))
+    por_hora = {}
+    for granulo in fuente.granulos(config, desde):
+        hora = tempo.hora_granulo(granulo)
+        if hora and (marca is None or _particion(hora) > marca):
+            # Several granules in one hour: the last one listed (newest processing) wins
+            por_hora[_particion(hora)] = granulo
+    return sorted(por_hora.items())
+
+def extraer_granulo(ruta, destino, filas_por_franja=FILAS_POR_FRANJA):
+    """Escribe los ejes y un .npy por variable del granulo en `destino`."""
+    with GranuloTempo(ruta) as granulo:
+        if not granulo.tiene_coordenadas():
+            raise ValueError(f"{os.path.basename(ruta)} no tiene coordenadas latitude/longitude")
+        np.save(os.path.join(destino, 'latitude.npy'), granulo.latitudes)
+        np.save(os.path.join(destino, 'longitude.npy'), granulo.longitudes)
+        n_lat, n_lon = granulo.forma
+        for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items():
+            if granulo.variable(nombre_tempo) is None: continue
+            salida = np.lib.format.open_memmap(
+                os.path.join(destino, f'{nombre_interno}.npy'), mode='w+', dtype=TIPO_ALMACEN, shape=(n_lat, n_lon)
+            )
+            for i0 in range(0, n_lat, filas_por_franja):
+                i1 = min(i0 + filas_por_franja, n_lat)
+                salida[i0:i1] = granulo.leer_franja(nombre_tempo, i0, i1)
+            salida.flush()
+            del salida
+
+def _publicar_particion(directorio, hora, contaminante, escribir):
+    """Escribe la partición en una carpeta temporal y la mueve a {hora}/{contaminante}."""
+    final = os.path.join(directorio, hora, contaminante)
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    temporal = tempfile.mkdtemp(dir=directorio, prefix=f'.{hora}-{contaminante}-')
+    try:
+        escribir(temporal)
+        if os.path.exists(final):
+            shutil.rmtree(final)
+        os.replace(temporal, final)
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+def _limpiar(directorio, manifiesto, conservar=HORAS_A_CONSERVAR):
+    """Borra las horas más antiguas que no están publicadas en actual.json."""
+    publicadas = {entrada['hora'] for entrada in manifiesto.values()}
+    horas = sorted(d for d in os.listdir(directorio) if not d.startswith('.') and os.path.isdir(os.path.join(directorio, d)))
+    for hora in horas[:max(len(horas) - conservar, 0)]:
+        if hora not in publicadas:
+            shutil.rmtree(os.path.join(directorio, hora), ignore_errors=True)
+
+def ingerir(fuente, directorio, conservar=HORAS_A_CONSERVAR):
+    """
+    Una pasada: ingiere los granulos nuevos de cada producto en orden y mueve
+    su marca de agua tras cada uno. Devuelve {contaminante: [horas ingeridas]}.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    manifiesto = leer_manifiesto(directorio)
+    ingeridas = {}
+    for config in tempo.DATASETS_CONFIG:
+        contaminante = config["contaminante"]
+        marca = manifiesto.get(contaminante, {}).get('hora')
+        try:
+            nuevos = pendientes(fuente, config, marca)
+        except Exception as e:
+            print(f"  ✗ {config['short_name']}: búsqueda fallida: {type(e).__name__} - {e}")
+            continue
+        ingeridas[contaminante] = []
+        for hora, granulo in nuevos:
+            inicio = time.perf_counter()
+            ruta = None
+            try:
+                ruta = fuente.ruta(granulo)
+                if not ruta:
+                    # Skipping it would let the next hour move the watermark past this one for good
+                    print(f"  ✗ {tempo.id_granulo(granulo)}: descarga vacía")
+                    break
+                _publicar_particion(directorio, hora, contaminante, lambda destino: extraer_granulo(ruta, destino))
+            except Exception as e:
+                # Leave the watermark where it is so the granule is retried next pass
+                print(f"  ✗ {tempo.id_granulo(granulo)}: {type(e).__name__} - {e}")
+                break
+            finally:
+                if ruta:
+                    fuente.liberar(ruta)
+            manifiesto[contaminante] = {
+                'hora': hora,
+                'granulo': tempo.id_granulo(granulo),
+                'ingerido': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            }
+            _escribir_manifiesto(directorio, manifiesto)
+            ingeridas[contaminante].append(hora)
+            print(f"  ✓ {contaminante} {hora}: {tempo.id_granulo(granulo)} en {time.perf_counter() - inicio:.1f}s")
+    _limpiar(directorio, manifiesto, conservar)
+    return ingeridas
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ingesta incremental de granulos TEMPO al almacén columnar')
+    parser.add_argument('--directorio', default=tempo.ALMACEN_DIR or '/tmp/tempo_almacen')
+    parser.add_argument('--fuente-dir', help='Directorio de granulos .nc a usar en lugar de CMR')
+    parser.add_argument('--cada', type=float, default=300, help='Segundos entre pasadas')
+    parser.add_argument('--una-vez', action='store_true', help='Una sola pasada y salir')
+    parser.add_argument('--conservar', type=int, default=HORAS_A_CONSERVAR, help='Horas de particiones a conservar')
+    args = parser.parse_args()
+
+    if args.conservar < HORAS_MINIMAS_ACUMULADOS:
+        print(f"⚠️ --conservar {args.conservar} < {HORAS_MINIMAS_ACUMULADOS}: los promedios móviles "
+              "(api/_acumulados.py) se rehacen cada hora y cubren sólo las horas conservadas")
+    fuente = FuenteDirectorio(args.fuente_dir) if args.fuente_dir else FuenteCMR()
+    while True:
+        print(f"🛰️ Buscando granulos nuevos ({datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S}Z)")
+        try:
+            ingerir(fuente, args.directorio, args.conservar)
+        except Exception as e:
+            # A full disk or an unreadable manifest must not kill the loop; the next pass retries
+            print(f"  ✗ Pasada fallida: {type(e).__name__} - {e}")
+        if args.una_vez:
+            break
+        time.sleep(args.cada)
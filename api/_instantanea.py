@@ -0,0 +1,257 @@
+"""
+Instantánea de la última hora: el último granulo de cada producto decodificado
+en un único archivo que todos los workers de la API mapean en sólo lectura
+(TEMPO_INSTANTANEA). Un solo cargador busca y decodifica los granulos:
+
+    python api/_instantanea.py --cada 300
+    python api/_instantanea.py --fuente-dir /tmp/fixtures --una-vez
+
+Formato: 'TEMPOSNP', uint64 con la longitud de la cabecera, la cabecera JSON
+y, alineados a 64 bytes, los ejes (float64) y las variables (float32, NaN =
+sin dato; quality_flag en uint8 con SIN_BANDERA = sin dato) de cada producto.
+Las posiciones de la cabecera son relativas al inicio de los datos.
+
+Cada versión se escribe entera en un temporal junto al destino y se publica
+con os.replace: un worker ve la anterior o la nueva, nunca una a medias, y la
+que tenga mapeada sigue siendo válida hasta que la suelte. Como los workers
+comparten las páginas del archivo (mejor en /dev/shm), la memoria no crece
+con el número de workers.
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _granulo import VARIABLES_A_EXTRAER, GranuloTempo  # noqa: E402
+
+MAGIA = b'TEMPOSNP'
+ALINEACION = 64
+SIN_BANDERA = 255
+FILAS_POR_FRANJA = 256
+TIPOS = {'latitude': '<f8', 'longitude': '<f8', 'quality_flag': '|u1'}
+TIPO_VARIABLE = '<f4'
+
+def _alinear(n):
+    return -(-n // ALINEACION) * ALINEACION
+
+def _forma_array(nombre, forma):
+    """Forma de un array del producto: los ejes son 1D, las variables la rejilla (n_lat, n_lon)."""
+    return {'latitude': tuple(forma[:1]), 'longitude': tuple(forma[1:])}.get(nombre, tuple(forma))
+
+def codificar_calidad(valores):
+    """quality_flag decodificado (float, NaN = sin dato) -> uint8."""
+    valores = np.asarray(valores)
+    return np.where(np.isfinite(valores) & (valores >= 0) & (valores < SIN_BANDERA), valores, SIN_BANDERA).astype(np.uint8)
+
+class BanderaCalidad:
+    """quality_flag uint8 mapeado que al indexarlo devuelve float32 con NaN, como el resto de variables."""
+
+    def __init__(self, datos):
+        self.datos = datos
+        self.shape = datos.shape
+
+    def __getitem__(self, clave):
+        valores = np.asarray(self.datos[clave], dtype=np.float32)
+        valores[valores == SIN_BANDERA] = np.nan
+        return valores
+
+class Instantanea:
+    """Una versión de la instantánea mapeada en sólo lectura."""
+
+    def __init__(self, ruta):
+        with open(ruta, 'rb') as f:
+            estado = os.fstat(f.fileno())
+            self.firma = (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+            # Mapped from the open descriptor: a swap between stat and open cannot mix versions
+            self._mapa = np.memmap(f, mode='r', dtype=np.uint8)
+        if self._mapa.size < 16 or bytes(self._mapa[:8]) != MAGIA:
+            raise ValueError(f'{ruta} no es una instantánea TEMPO')
+        longitud, = struct.unpack('<Q', bytes(self._mapa[8:16]))
+        self.cabecera = json.loads(bytes(self._mapa[16:16 + longitud]))
+        self._inicio = _alinear(16 + longitud)
+        self.bytes = int(self._mapa.size)
+        self.productos = {contaminante: self._producto(entrada) for contaminante, entrada in self.cabecera['productos'].items()}
+
+    def _array(self, bloque, forma):
+        inicio = self._inicio + bloque['offset']
+        tipo = np.dtype(bloque['dtype'])
+        return self._mapa[inicio:inicio + int(np.prod(forma)) * tipo.itemsize].view(tipo).reshape(forma)
+
+    def _producto(self, entrada):
+        arrays = entrada['arrays']
+        variables = {
+            nombre: self._array(bloque, _forma_array(nombre, entrada['forma']))
+            for nombre, bloque in arrays.items() if nombre not in ('latitude', 'longitude')
+        }
+        if 'quality_flag' in variables:
+            variables['quality_flag'] = BanderaCalidad(variables['quality_flag'])
+        return {
+            'hora': entrada['hora'],
+            'granulo': entrada['granulo'],
+            'latitudes': self._array(arrays['latitude'], _forma_array('latitude', entrada['forma'])),
+            'longitudes': self._array(arrays['longitude'], _forma_array('longitude', entrada['forma'])),
+            'variables': variables,
+        }
+
+def abrir(ruta):
+    """Instantanea vigente en `ruta` o None si no existe."""
+    return Instantanea(ruta) if os.path.exists(ruta) else None
+
+def escribir(ruta, nuevos, anterior=None, filas_por_franja=FILAS_POR_FRANJA):
+    """
+    Publica una versión con los granulos de `nuevos` ({contaminante: (hora,
+    granulo, ruta local)}) y, para el resto de productos, los arrays de la
+    Instantanea `anterior`. Devuelve la cabecera escrita.
+    """
+    granulos = {}
+    try:
+        for contaminante, (hora, granulo, ruta_granulo) in nuevos.items():
+            abierto = GranuloTempo(ruta_granulo)
+            if not abierto.tiene_coordenadas():
+                abierto.close()
+                raise ValueError(f"{os.path.basename(ruta_granulo)} no tiene coordenadas latitude/longitude")
+            granulos[contaminante] = (hora, granulo, abierto)
+
+        productos, posicion = {}, 0
+
+        def reservar(nombres, forma):
+            nonlocal posicion
+            arrays = {}
+            for nombre in nombres:
+                tipo = TIPOS.get(nombre, TIPO_VARIABLE)
+                arrays[nombre] = {'dtype': tipo, 'offset': posicion}
+                posicion = _alinear(posicion + int(np.prod(_forma_array(nombre, forma))) * np.dtype(tipo).itemsize)
+            return arrays
+
+        for contaminante, (hora, granulo, abierto) in granulos.items():
+            nombres = ['latitude', 'longitude'] + [
+                nombre_interno for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items()
+                if abierto.variable(nombre_tempo) is not None
+            ]
+            productos[contaminante] = {
+                'hora': hora, 'granulo': granulo, 'forma': list(abierto.forma),
+                'arrays': reservar(nombres, abierto.forma),
+            }
+        for contaminante, entrada in (anterior.cabecera['productos'] if anterior else {}).items():
+            if contaminante not in productos:
+                productos[contaminante] = dict(entrada, arrays=reservar(entrada['arrays'], entrada['forma']))
+
+        cabecera = {
+            'version': 1,
+            'generado': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'productos': productos,
+        }
+        texto = json.dumps(cabecera).encode()
+        inicio = _alinear(16 + len(texto))
+
+        temporal = os.path.join(os.path.dirname(os.path.abspath(ruta)), f'.{os.path.basename(ruta)}.{os.getpid()}.tmp')
+        try:
+            mapa = np.memmap(temporal, mode='w+', dtype=np.uint8, shape=(inicio + max(posicion, 1),))
+            mapa[:8] = np.frombuffer(MAGIA, dtype=np.uint8)
+            mapa[8:16] = np.frombuffer(struct.pack('<Q', len(texto)), dtype=np.uint8)
+            mapa[16:16 + len(texto)] = np.frombuffer(texto, dtype=np.uint8)
+
+            def destino(contaminante, nombre):
+                entrada = productos[contaminante]
+                bloque = entrada['arrays'][nombre]
+                forma = _forma_array(nombre, entrada['forma'])
+                desde = inicio + bloque['offset']
+                tipo = np.dtype(bloque['dtype'])
+                return mapa[desde:desde + int(np.prod(forma)) * tipo.itemsize].view(tipo).reshape(forma)
+
+            for contaminante, (_, _, abierto) in granulos.items():
+                destino(contaminante, 'latitude')[:] = abierto.latitudes
+                destino(contaminante, 'longitude')[:] = abierto.longitudes
+                n_lat = abierto.forma[0]
+                for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items():
+                    if nombre_interno not in productos[contaminante]['arrays']: continue
+                    salida = destino(contaminante, nombre_interno)
+                    for i0 in range(0, n_lat, filas_por_franja):
+                        i1 = min(i0 + filas_por_franja, n_lat)
+                        franja = abierto.leer_franja(nombre_tempo, i0, i1)
+                        salida[i0:i1] = codificar_calidad(franja) if nombre_interno == 'quality_flag' else franja
+            for contaminante in productos:
+                if contaminante in granulos: continue
+                # Raw copy: quality_flag keeps its uint8 encoding
+                origen = anterior.cabecera['productos'][contaminante]
+                for nombre, bloque in origen['arrays'].items():
+                    destino(contaminante, nombre)[:] = anterior._array(bloque, _forma_array(nombre, origen['forma']))
+            mapa.flush()
+            del mapa
+            os.replace(temporal, ruta)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        return cabecera
+    finally:
+        for _, _, abierto in granulos.values():
+            abierto.close()
+
+def cargar(fuente, ruta):
+    """
+    Una pasada del cargador: busca el granulo más reciente de cada producto y,
+    si alguno es posterior al de la instantánea vigente, publica una versión
+    nueva. Devuelve {contaminante: hora} de los productos actualizados.
+    """
+    import tempo
+    from _ingesta import pendientes
+
+    anterior = abrir(ruta)
+    vigentes = anterior.cabecera['productos'] if anterior else {}
+    nuevos, rutas = {}, []
+    try:
+        for config in tempo.DATASETS_CONFIG:
+            contaminante = config["contaminante"]
+            try:
+                candidatos = pendientes(fuente, config, vigentes.get(contaminante, {}).get('hora'))
+            except Exception as e:
+                print(f"  ✗ {config['short_name']}: búsqueda fallida: {type(e).__name__} - {e}")
+                continue
+            if not candidatos: continue
+            # Only the newest hour is served; intermediate granules are never decoded
+            hora, granulo = candidatos[-1]
+            ruta_granulo = fuente.ruta(granulo)
+            if not ruta_granulo: continue
+            rutas.append(ruta_granulo)
+            nuevos[contaminante] = (hora, tempo.id_granulo(granulo), ruta_granulo)
+        if not nuevos:
+            return {}
+        escribir(ruta, nuevos, anterior)
+        return {contaminante: hora for contaminante, (hora, _, _) in nuevos.items()}
+    finally:
+        for ruta_granulo in rutas:
+            fuente.liberar(ruta_granulo)
+
+if __name__ == '__main__':
+    import tempo  # noqa: E402
+    from _ingesta import FuenteCMR, FuenteDirectorio  # noqa: E402
+
+    parser = argparse.ArgumentParser(description='Instantánea compartida de la última hora de TEMPO')
+    parser.add_argument('--ruta', default=tempo.INSTANTANEA or '/dev/shm/tempo_instantanea.bin')
+    parser.add_argument('--fuente-dir', help='Directorio de granulos .nc a usar en lugar de CMR')
+    parser.add_argument('--cada', type=float, default=300, help='Segundos entre pasadas')
+    parser.add_argument('--una-vez', action='store_true', help='Una sola pasada y salir')
+    args = parser.parse_args()
+
+    fuente = FuenteDirectorio(args.fuente_dir) if args.fuente_dir else FuenteCMR()
+    while True:
+        print(f"🛰️ Buscando granulos nuevos ({datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S}Z)")
+        inicio = time.perf_counter()
+        try:
+            actualizados = cargar(fuente, args.ruta)
+        except Exception as e:
+            print(f"  ✗ {type(e).__name__} - {e}")
+        else:
+            if actualizados:
+                print(f"  ✓ {args.ruta}: {actualizados} en {time.perf_counter() - inicio:.1f}s")
+            else:
+                print("  ✓ Instantánea al día")
+        if args.una_vez:
+            break
+        time.sleep(args.cada)
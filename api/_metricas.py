@@ -0,0 +1,191 @@
+"""
+Instrumentación de la API TEMPO.
+
+- `log`: logger 'tempo' con el nivel de TEMPO_LOG_LEVEL (WARNING por defecto).
+  Los mensajes de depuración usan formato perezoso (%s), así que con el nivel
+  desactivado no se formatea nada.
+- `registro`: contadores e histogramas en memoria del proceso, expuestos en
+  formato de texto Prometheus por /metrics.
+- `tramo(etapa, producto, granulo)`: mide una etapa (búsqueda, apertura,
+  coordenadas, lectura, puntuación), la observa en tempo_etapa_segundos, cuenta
+  sus excepciones en tempo_errores_total y la suma a los tiempos de la petición
+  en curso (cabecera Server-Timing).
+"""
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger('tempo')
+if not log.handlers:
+    _manejador = logging.StreamHandler()
+    _manejador.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    log.addHandler(_manejador)
+    log.propagate = False
+log.setLevel(os.environ.get('TEMPO_LOG_LEVEL', 'WARNING').upper())
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _etiquetas(nombres, valores):
+    if not nombres: return ''
+    return '{' + ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)) + '}'
+
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = tuple(str(etiquetas.get(nombre, '')) for nombre in self.etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def lineas(self):
+        with self._lock:
+            valores = dict(self._valores)
+        for clave, valor in sorted(valores.items()):
+            yield f'{self.nombre}{_etiquetas(self.etiquetas, clave)} {valor}'
+
+class Histograma:
+    tipo = 'histogram'
+    LIMITES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.limites = tuple(limites)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(str(etiquetas.get(nombre, '')) for nombre in self.etiquetas)
+        posicion = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][posicion] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def lineas(self):
+        with self._lock:
+            series = {clave: (list(c), s, n) for clave, (c, s, n) in self._series.items()}
+        for clave, (cubetas, suma, cuenta) in sorted(series.items()):
+            acumulado = 0
+            for limite, n in zip(self.limites + ('+Inf',), cubetas):
+                acumulado += n
+                yield (f'{self.nombre}_bucket'
+                       f'{_etiquetas(self.etiquetas + ("le",), clave + (limite,))} {acumulado}')
+            yield f'{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {suma}'
+            yield f'{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {cuenta}'
+
+class Registro:
+    """Métricas del proceso más colecciones que leen contadores ya existentes al exponer."""
+
+    def __init__(self):
+        self._metricas = []
+        self._colecciones = []
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        metrica = Contador(nombre, ayuda, etiquetas)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=Histograma.LIMITES):
+        metrica = Histograma(nombre, ayuda, etiquetas, limites)
+        self._metricas.append(metrica)
+        return metrica
+
+    def coleccion(self, funcion):
+        """funcion() -> [(nombre, tipo, ayuda, valor)]; se evalúa en cada exposición."""
+        self._colecciones.append(funcion)
+        return funcion
+
+    def exponer(self):
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f'# HELP {metrica.nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {metrica.nombre} {metrica.tipo}')
+            lineas.extend(metrica.lineas())
+        for funcion in self._colecciones:
+            try:
+                muestras = funcion()
+            except Exception:
+                log.warning('Colección de métricas %s falló', funcion.__name__, exc_info=True)
+                continue
+            for nombre, tipo, ayuda, valor in muestras:
+                if valor is None: continue
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} {tipo}')
+                lineas.append(f'{nombre} {valor}')
+        return '\n'.join(lineas) + '\n'
+
+registro = Registro()
+
+ETAPA_SEGUNDOS = registro.histograma(
+    'tempo_etapa_segundos', 'Duración de cada etapa de una consulta', ('etapa', 'producto')
+)
+ERRORES = registro.contador(
+    'tempo_errores_total', 'Excepciones por etapa (búsqueda CMR, apertura, lectura...)', ('etapa', 'producto')
+)
+
+class TiemposPeticion:
+    """Segundos acumulados por etapa durante una petición (para Server-Timing)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.etapas = {}
+
+    def sumar(self, nombre, segundos):
+        with self._lock:
+            self.etapas[nombre] = self.etapas.get(nombre, 0.0) + segundos
+
+    def server_timing(self):
+        with self._lock:
+            return ', '.join(f'{nombre};dur={segundos * 1000:.1f}' for nombre, segundos in self.etapas.items())
+
+_peticion = contextvars.ContextVar('tempo_peticion', default=None)
+
+@contextmanager
+def peticion():
+    """Abre la recolección de tiempos de una petición; al cerrar añade 'total'."""
+    tiempos = TiemposPeticion()
+    token = _peticion.set(tiempos)
+    inicio = time.perf_counter()
+    try:
+        yield tiempos
+    finally:
+        tiempos.sumar('total', time.perf_counter() - inicio)
+        _peticion.reset(token)
+
+def enviar(executor, funcion, *args):
+    """executor.submit que conserva el contexto (la petición en curso) en el hilo del pool."""
+    return executor.submit(contextvars.copy_context().run, funcion, *args)
+
+@contextmanager
+def tramo(etapa, producto='', granulo=None):
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORES.inc(etapa=etapa, producto=producto)
+        raise
+    finally:
+        segundos = time.perf_counter() - inicio
+        ETAPA_SEGUNDOS.observar(segundos, etapa=etapa, producto=producto)
+        tiempos = _peticion.get()
+        if tiempos is not None:
+            tiempos.sumar(f'{etapa}-{producto}' if producto else etapa, segundos)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('%s producto=%s granulo=%s %.1f ms', etapa, producto or '-', granulo or '-', segundos * 1000)
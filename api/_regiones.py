@@ -0,0 +1,141 @@
+"""
+Polígonos GeoJSON sobre la rejilla L3 de TEMPO.
+
+- `anillos(geometria)`: anillos (lon, lat) de un Polygon/MultiPolygon, sea la
+  geometría, un Feature o el dict ya parseado.
+- `rasterizar(anillos, latitudes, longitudes)`: (filas, columnas) de los
+  píxeles cuyo centro cae dentro (regla par-impar, así los huecos quedan
+  fuera), por barrido de filas: O(filas × aristas) y no O(píxeles × aristas).
+- `CatalogoRegiones`: regiones con nombre de un FeatureCollection local
+  (propiedad 'nombre' o 'name'), cargado la primera vez que se pide.
+"""
+import hashlib
+import json
+import threading
+
+import numpy as np
+
+def anillos(geometria):
+    """Lista de arrays (n, 2) lon/lat; ValueError si no es un Polygon/MultiPolygon válido."""
+    if not isinstance(geometria, dict):
+        raise ValueError('La geometría debe ser un objeto GeoJSON')
+    if geometria.get('type') == 'Feature':
+        geometria = geometria.get('geometry') or {}
+    tipo, coordenadas = geometria.get('type'), geometria.get('coordinates')
+    if tipo == 'Polygon':
+        poligonos = [coordenadas]
+    elif tipo == 'MultiPolygon':
+        poligonos = coordenadas
+    else:
+        raise ValueError('Sólo se admiten geometrías Polygon o MultiPolygon')
+    try:
+        salida = [np.asarray(anillo, dtype=np.float64)[:, :2] for poligono in poligonos for anillo in poligono]
+    except (TypeError, ValueError, IndexError):
+        raise ValueError('Coordenadas de polígono inválidas')
+    if not salida or any(anillo.ndim != 2 or len(anillo) < 3 or not np.isfinite(anillo).all() for anillo in salida):
+        raise ValueError('Coordenadas de polígono inválidas')
+    return salida
+
+def caja(anillos_):
+    """(lat_min, lat_max, lon_min, lon_max) de los anillos."""
+    puntos = np.concatenate(anillos_)
+    return float(puntos[:, 1].min()), float(puntos[:, 1].max()), float(puntos[:, 0].min()), float(puntos[:, 0].max())
+
+def centroide(anillos_):
+    """Centro (lat, lon) de la caja, para situar el resultado y buscar granulos."""
+    lat_min, lat_max, lon_min, lon_max = caja(anillos_)
+    return (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+def huella(geometria):
+    """Clave estable de una geometría para la cache de máscaras."""
+    return hashlib.sha1(json.dumps(geometria, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+def _aristas(anillos_):
+    """(x1, y1, x2, y2) de todas las aristas, cerrando cada anillo."""
+    x1, y1, x2, y2 = [], [], [], []
+    for anillo in anillos_:
+        siguiente = np.roll(anillo, -1, axis=0)
+        x1.append(anillo[:, 0]); y1.append(anillo[:, 1])
+        x2.append(siguiente[:, 0]); y2.append(siguiente[:, 1])
+    return tuple(np.concatenate(v) for v in (x1, y1, x2, y2))
+
+def rasterizar(anillos_, latitudes, longitudes):
+    """
+    (filas, columnas) int32 de los píxeles con centro dentro del polígono.
+    Si ninguno cae dentro (polígono menor que un píxel) devuelve el píxel más
+    cercano al centroide, como hace el vecindario con radios pequeños; si el
+    centroide cae fuera de la rejilla, ningún píxel.
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    x1, y1, x2, y2 = _aristas(anillos_)
+    lat_min, lat_max, lon_min, lon_max = caja(anillos_)
+    filas_caja = np.flatnonzero((latitudes >= lat_min) & (latitudes <= lat_max))
+    columnas_caja = np.flatnonzero((longitudes >= lon_min) & (longitudes <= lon_max))
+    lons_caja = longitudes[columnas_caja]
+
+    filas, columnas = [], []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for fila in filas_caja:
+            y = latitudes[fila]
+            # Half-open test so a vertex on the scanline is counted once
+            cruza = (y1 <= y) != (y2 <= y)
+            if not cruza.any(): continue
+            xs = np.sort(x1[cruza] + (y - y1[cruza]) * (x2[cruza] - x1[cruza]) / (y2[cruza] - y1[cruza]))
+            dentro = np.zeros(lons_caja.size, dtype=bool)
+            for inicio, fin in zip(xs[0::2], xs[1::2]):
+                dentro |= (lons_caja >= inicio) & (lons_caja < fin)
+            seleccion = columnas_caja[dentro]
+            filas.append(np.full(seleccion.size, fila, dtype=np.int32))
+            columnas.append(seleccion.astype(np.int32))
+
+    filas = np.concatenate(filas) if filas else np.empty(0, dtype=np.int32)
+    columnas = np.concatenate(columnas) if columnas else np.empty(0, dtype=np.int32)
+    if not filas.size and latitudes.size and longitudes.size:
+        lat, lon = centroide(anillos_)
+        fila, columna = int(np.abs(latitudes - lat).argmin()), int(np.abs(longitudes - lon).argmin())
+        # A polygon off the grid would otherwise be answered with the edge pixel
+        if (abs(latitudes[fila] - lat) <= _paso(latitudes) / 2 and
+                abs(longitudes[columna] - lon) <= _paso(longitudes) / 2):
+            filas = np.array([fila], dtype=np.int32)
+            columnas = np.array([columna], dtype=np.int32)
+    return filas, columnas
+
+def _paso(eje):
+    """Separación entre centros de píxel de un eje (infinita con un solo píxel)."""
+    return float(np.abs(np.diff(eje)).max()) if eje.size > 1 else float('inf')
+
+class CatalogoRegiones:
+    """Regiones con nombre de un archivo GeoJSON FeatureCollection."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._regiones = None
+        self._lock = threading.Lock()
+
+    def _cargar(self):
+        with open(self.ruta, 'r') as f:
+            coleccion = json.load(f)
+        if not isinstance(coleccion, dict) or not isinstance(coleccion.get('features', []), list):
+            raise ValueError(f"{self.ruta} no es una FeatureCollection GeoJSON")
+        regiones = {}
+        for feature in coleccion.get('features', []):
+            propiedades = feature.get('properties') if isinstance(feature, dict) else None
+            if not isinstance(propiedades, dict): continue
+            nombre = propiedades.get('nombre') or propiedades.get('name')
+            if nombre and feature.get('geometry'):
+                regiones[str(nombre).strip().lower()] = (str(nombre), feature['geometry'])
+        return regiones
+
+    def obtener(self, nombre):
+        """(nombre, geometría) o None; la búsqueda no distingue mayúsculas."""
+        with self._lock:
+            if self._regiones is None:
+                self._regiones = self._cargar()
+        return self._regiones.get(str(nombre).strip().lower())
+
+    def nombres(self):
+        with self._lock:
+            if self._regiones is None:
+                self._regiones = self._cargar()
+        return sorted(nombre for nombre, _ in self._regiones.values())
@@ -0,0 +1,179 @@
+"""
+AQI de la rejilla L3 completa repartido entre varios procesos.
+
+La rejilla se trocea en franjas de filas y cada franja la procesa entero un
+proceso del pool: lectura de las variables de cada producto, máscara de
+calidad y AQI con calcular_indice_realista_array. Los procesos abren los
+granulos por su cuenta (un handle h5py por proceso, reutilizado entre franjas)
+y escriben el resultado directamente en un uint16 mapeado en memoria
+compartida (un archivo en /dev/shm), así que ni las entradas ni las salidas
+se serializan: a cada tarea sólo le llegan dos enteros. La memoria de cada
+proceso depende de la franja, no de la rejilla; el único array del tamaño de
+la rejilla es el compartido, que se devuelve sin copiarlo.
+
+    python api/_rejilla.py --no2 a.nc --o3 b.nc --hcho c.nc --procesos 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Only the NumPy AQI helpers: importing tempo would load Flask and earthaccess into every worker
+from _indice import calcular_indice_realista_array  # noqa: E402
+from _granulo import VARIABLES_A_EXTRAER, GranuloTempo, nombres_dimensiones  # noqa: E402
+
+PROCESOS = int(os.environ.get('TEMPO_PROCESOS_REJILLA', '0')) or os.cpu_count() or 1
+FILAS_POR_FRANJA = int(os.environ.get('TEMPO_FILAS_POR_FRANJA', '128'))
+SIN_DATOS = np.uint16(65535)
+# tmpfs where available, so the shared grid never touches disk
+DIRECTORIO_COMPARTIDO = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+# Per worker process: open granules and the shared output grid
+_estado = {}
+
+def aqi_franja(productos, i0, i1):
+    """AQI uint16 de las filas [i0, i1) a partir de {contaminante: GranuloTempo}."""
+    contaminantes = {
+        contaminante: {
+            nombre_interno: granulo.leer_franja(nombre_tempo, i0, i1)
+            for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items()
+            if granulo.variable(nombre_tempo) is not None
+        }
+        for contaminante, granulo in productos.items()
+    }
+    indice = calcular_indice_realista_array(contaminantes, nan_como_ausente=True)
+    return np.where(np.isnan(indice), SIN_DATOS, indice).astype(np.uint16)
+
+def _iniciar_proceso(rutas, ruta_compartida, forma):
+    _estado['aqi'] = np.memmap(ruta_compartida, dtype=np.uint16, mode='r+', shape=forma)
+    _estado['productos'] = {contaminante: GranuloTempo(ruta) for contaminante, ruta in rutas.items()}
+
+def memoria_mb():
+    """
+    {'uss', 'pss'} en MB del proceso actual según /proc/self/smaps_rollup, o
+    None donde no existe. A diferencia de ru_maxrss no cuenta las páginas
+    heredadas del padre por fork ni las del mapeo compartido más de una vez.
+    """
+    campos = {}
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            for linea in f:
+                partes = linea.split()
+                if len(partes) == 3 and partes[2] == 'kB':
+                    campos[partes[0].rstrip(':')] = int(partes[1]) / 1024
+    except OSError:
+        return None
+    return {'uss': campos.get('Private_Clean', 0) + campos.get('Private_Dirty', 0), 'pss': campos.get('Pss', 0)}
+
+def _procesar_franja(i0, i1):
+    inicio = time.process_time()
+    franja = aqi_franja(_estado['productos'], i0, i1)
+    # Measured while the band is still alive, i.e. at the worker's high-water mark
+    memoria = memoria_mb()
+    _estado['aqi'][i0:i1] = franja
+    return os.getpid(), time.process_time() - inicio, memoria
+
+def _filas_chunk(granulo):
+    """Filas de latitud por chunk HDF5 de las variables del producto (1 si no están troceadas)."""
+    for nombre_tempo in VARIABLES_A_EXTRAER.values():
+        ds = granulo.variable(nombre_tempo)
+        if ds is not None and ds.chunks and 'latitude' in nombres_dimensiones(ds):
+            return ds.chunks[nombres_dimensiones(ds).index('latitude')]
+    return 1
+
+def _productos_compatibles(rutas):
+    """
+    (latitudes, longitudes, {contaminante: ruta}, filas por chunk) con los
+    productos de la misma rejilla.
+    """
+    granulos = {contaminante: GranuloTempo(ruta) for contaminante, ruta in rutas.items()}
+    try:
+        referencia = next(iter(granulos.values()))
+        compatibles, filas_chunk = {}, 1
+        for contaminante, granulo in granulos.items():
+            if granulo.forma != referencia.forma:
+                print(f"  ✗ {contaminante}: rejilla distinta a la de referencia, se omite")
+                continue
+            compatibles[contaminante] = rutas[contaminante]
+            filas_chunk = max(filas_chunk, _filas_chunk(granulo))
+        return np.array(referencia.latitudes), np.array(referencia.longitudes), compatibles, filas_chunk
+    finally:
+        for granulo in granulos.values():
+            granulo.close()
+
+def calcular_aqi_rejilla(rutas, procesos=PROCESOS, filas_por_franja=FILAS_POR_FRANJA, estadisticas=None):
+    """
+    AQI de toda la rejilla a partir de {contaminante: ruta local}, repartido
+    entre `procesos`; la franja se redondea a un múltiplo de las filas por
+    chunk HDF5 salvo que el chunk sea más del doble de alto.
+
+    Devuelve (latitudes, longitudes, aqi uint16). aqi es una vista del mapeo
+    compartido en el que escribieron los procesos (el archivo ya está borrado
+    y la memoria se libera con el último array que la use). Si se pasa un
+    dict en `estadisticas` se rellena con el tiempo de CPU y la memoria
+    (USS y PSS) máxima de los procesos.
+    """
+    # Granules are closed again before the pool forks, so no h5py handle crosses processes
+    lat_arr, lon_arr, compatibles, filas_chunk = _productos_compatibles(rutas)
+    forma = (lat_arr.size, lon_arr.size)
+    # A band that splits an HDF5 chunk makes two workers decompress the same chunk;
+    # chunks much taller than the band are split anyway to keep memory bounded
+    if filas_chunk <= 2 * filas_por_franja:
+        filas_por_franja = max(1, round(filas_por_franja / filas_chunk)) * filas_chunk
+    franjas = [(i0, min(i0 + filas_por_franja, forma[0])) for i0 in range(0, forma[0], filas_por_franja)]
+
+    descriptor, ruta_compartida = tempfile.mkstemp(prefix='tempo-rejilla-', suffix='.u16', dir=DIRECTORIO_COMPARTIDO)
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.truncate(max(forma[0] * forma[1], 1) * 2)
+        aqi = np.memmap(ruta_compartida, dtype=np.uint16, mode='r+', shape=forma)
+        with ProcessPoolExecutor(
+            max_workers=max(1, min(procesos, len(franjas))),
+            initializer=_iniciar_proceso, initargs=(compatibles, ruta_compartida, forma)
+        ) as pool:
+            cpu, uss, pss = {}, {}, {}
+            for pid, segundos, memoria in pool.map(_procesar_franja, *zip(*franjas)):
+                cpu[pid] = cpu.get(pid, 0.0) + segundos
+                if memoria:
+                    uss[pid] = max(uss.get(pid, 0.0), memoria['uss'])
+                    pss[pid] = max(pss.get(pid, 0.0), memoria['pss'])
+    finally:
+        # The mapping outlives the name: the pages go away with the last array using them
+        os.unlink(ruta_compartida)
+    resultado = aqi.view(np.ndarray)
+
+    if estadisticas is not None:
+        estadisticas.update({
+            'procesos': len(cpu),
+            'franjas': len(franjas),
+            'filas_por_franja': filas_por_franja,
+            'cpu_s_por_proceso': sorted(round(s, 3) for s in cpu.values()),
+            'uss_max_mb_por_proceso': round(max(uss.values()), 1) if uss else None,
+            'pss_max_mb_por_proceso': round(max(pss.values()), 1) if pss else None,
+        })
+    return lat_arr, lon_arr, resultado
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='AQI de la rejilla completa en varios procesos')
+    parser.add_argument('--no2', help='Archivo local de NO2')
+    parser.add_argument('--o3', help='Archivo local de O3TOT')
+    parser.add_argument('--hcho', help='Archivo local de HCHO')
+    parser.add_argument('--procesos', type=int, default=PROCESOS)
+    parser.add_argument('--filas', type=int, default=FILAS_POR_FRANJA, help='Filas por franja')
+    args = parser.parse_args()
+
+    rutas = {c: r for c, r in (('NO2', args.no2), ('O3', args.o3), ('HCHO', args.hcho)) if r}
+    if not rutas:
+        parser.error('Hace falta al menos un granulo')
+    inicio = time.perf_counter()
+    estadisticas = {}
+    lat_arr, lon_arr, aqi = calcular_aqi_rejilla(rutas, args.procesos, args.filas, estadisticas)
+    segundos = time.perf_counter() - inicio
+    validos = int((aqi != SIN_DATOS).sum())
+    print(f"✓ {aqi.size} píxeles ({validos} con datos) en {segundos:.2f} s "
+          f"con {estadisticas['procesos']} procesos: {aqi.size / segundos:,.0f} píxeles/s")
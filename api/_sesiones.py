@@ -0,0 +1,112 @@
+"""
+Conexiones HTTP compartidas por todo el proceso.
+
+earthaccess crea una sesión de requests nueva en cada search_data (DataGranules
+llama a auth.get_session()), así que cada búsqueda CMR repite el handshake TLS.
+`instalar(earthaccess)` (una vez, tras el login) sustituye eso por:
+
+- una única sesión requests (búsquedas CMR, descargas) con un pool de urllib3
+  acotado: POOL_HOSTS hosts y POOL_POR_HOST conexiones keep-alive por host;
+  lleva el token bearer y el cookie jar de Earthdata, que se conservan entre
+  peticiones y productos;
+- un HTTPFileSystem de fsspec (earthaccess.open) propio, sobre un TCPConnector
+  de aiohttp con el mismo límite por host y keep-alive de KEEPALIVE_S segundos.
+
+`estadisticas()` cuenta conexiones abiertas (handshakes) frente a peticiones:
+con el proceso caliente las conexiones nuevas por petición deberían ser ~0.
+"""
+import os
+import threading
+
+POOL_HOSTS = int(os.environ.get('TEMPO_POOL_HOSTS', '8'))
+POOL_POR_HOST = int(os.environ.get('TEMPO_POOL_POR_HOST', '16'))
+KEEPALIVE_S = float(os.environ.get('TEMPO_KEEPALIVE_S', '60'))
+
+_sesion = None
+_sistema_archivos = None
+_lock = threading.Lock()
+_http_asincrono = {'conexiones_nuevas': 0, 'conexiones_reusadas': 0, 'peticiones': 0}
+
+def sesion_agrupada(sesion):
+    """Monta en `sesion` (requests) adaptadores con el pool acotado y la devuelve."""
+    from requests.adapters import HTTPAdapter
+    for prefijo in ('https://', 'http://'):
+        sesion.mount(prefijo, HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_POR_HOST))
+    return sesion
+
+def _contar(clave):
+    async def contar(_sesion, _contexto, _parametros):
+        with _lock:
+            _http_asincrono[clave] += 1
+    return contar
+
+async def _cliente_aiohttp(**kwargs):
+    """get_client de fsspec: ClientSession con conector acotado y trazas de conexión."""
+    import aiohttp
+    traza = aiohttp.TraceConfig()
+    traza.on_connection_create_end.append(_contar('conexiones_nuevas'))
+    traza.on_connection_reuseconn.append(_contar('conexiones_reusadas'))
+    traza.on_request_start.append(_contar('peticiones'))
+    conector = aiohttp.TCPConnector(
+        limit=POOL_HOSTS * POOL_POR_HOST, limit_per_host=POOL_POR_HOST, keepalive_timeout=KEEPALIVE_S
+    )
+    return aiohttp.ClientSession(connector=conector, trace_configs=[traza], **kwargs)
+
+def instalar(earthaccess):
+    """
+    Hace que earthaccess use la sesión y el sistema de archivos compartidos.
+    Devuelve False (y no toca nada) si no hay login.
+    """
+    global _sesion, _sistema_archivos
+    auth = getattr(earthaccess, '__auth__', None)
+    if auth is None or not auth.authenticated:
+        return False
+    with _lock:
+        if _sesion is None:
+            # auth.get_session() already carries the bearer token and the URS
+            # redirect hook; the instance attribute then shadows the method, so
+            # every DataGranules gets this same session.
+            _sesion = sesion_agrupada(auth.get_session())
+            auth.get_session = lambda: _sesion
+        store = getattr(earthaccess, '__store__', None)
+        if store is not None:
+            store._http_session = _sesion
+            if _sistema_archivos is None:
+                import fsspec
+                _sistema_archivos = fsspec.filesystem(
+                    'https',
+                    client_kwargs={
+                        'headers': {'Authorization': f"Bearer {auth.token['access_token']}"},
+                        'trust_env': False,
+                    },
+                    get_client=_cliente_aiohttp,
+                    skip_instance_cache=True,
+                )
+            store.get_fsspec_session = lambda: _sistema_archivos
+    return True
+
+def estadisticas():
+    """Conexiones y peticiones de la sesión requests (por host) y del cliente de fsspec."""
+    hosts = {}
+    if _sesion is not None:
+        for adaptador in set(_sesion.adapters.values()):
+            pools = getattr(adaptador, 'poolmanager', None)
+            if pools is None: continue
+            for clave in pools.pools.keys():
+                pool = pools.pools.get(clave)
+                if pool is None: continue
+                host = hosts.setdefault(pool.host, {'conexiones_nuevas': 0, 'peticiones': 0})
+                host['conexiones_nuevas'] += pool.num_connections
+                host['peticiones'] += pool.num_requests
+    with _lock:
+        asincrono = dict(_http_asincrono)
+    return {
+        'instalado': _sesion is not None,
+        'limites': {'hosts': POOL_HOSTS, 'por_host': POOL_POR_HOST, 'keepalive_s': KEEPALIVE_S},
+        'requests': {
+            'conexiones_nuevas': sum(h['conexiones_nuevas'] for h in hosts.values()),
+            'peticiones': sum(h['peticiones'] for h in hosts.values()),
+            'hosts': hosts,
+        },
+        'fsspec': asincrono,
+    }
@@ -0,0 +1,221 @@
+"""
+Generador de teselas AQI precalculadas (XYZ Web Mercator) para /api/tiles.
+
+Se ejecuta una vez por cada granulo TEMPO nuevo (p. ej. desde cron):
+
+    python api/_teselas.py --zoom-max 7
+
+Lee el último granulo de NO2, O3TOT y HCHO, calcula el AQI de toda la rejilla
+L3 con calcular_indice_realista_array y escribe, por tesela, un PNG coloreado
+y la matriz AQI uint16. Si los granulos no han cambiado desde la última
+ejecución no hace nada. Para pruebas sin red se pueden pasar los archivos:
+
+    python api/_teselas.py --no2 a.nc --o3 b.nc --hcho c.nc
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import struct
+import sys
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _rejilla  # noqa: E402
+import tempo  # noqa: E402
+from _granulo import GranuloTempo  # noqa: E402
+
+TAMANO_TESELA = 256
+SIN_DATOS = np.uint16(65535)
+FILAS_POR_FRANJA = 256
+ALFA = 180
+VERSIONES_A_CONSERVAR = 2
+
+def _hex_a_rgba(color):
+    return [int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16), ALFA]
+
+# RGBA lookup table indexed by AQI 0-500; the extra last entry is transparent (no data)
+PALETA = np.array(
+    [_hex_a_rgba(tempo.get_color_from_score(aqi)) for aqi in range(501)] + [[0, 0, 0, 0]],
+    dtype=np.uint8
+)
+
+def calcular_aqi_rejilla(rutas, filas_por_franja=FILAS_POR_FRANJA, procesos=1):
+    """
+    AQI de toda la rejilla L3 a partir de {contaminante: ruta local}.
+    Procesa por franjas de filas para que la memoria dependa de la franja y
+    no de la rejilla; con procesos > 1 las franjas se reparten con _rejilla.
+    Devuelve (latitudes, longitudes, aqi uint16).
+    """
+    if procesos > 1:
+        return _rejilla.calcular_aqi_rejilla(rutas, procesos, filas_por_franja)
+
+    granulos = {contaminante: GranuloTempo(ruta) for contaminante, ruta in rutas.items()}
+    try:
+        referencia = next(iter(granulos.values()))
+        lat_arr = referencia.latitudes
+        lon_arr = referencia.longitudes
+
+        productos = {}
+        for contaminante, granulo in granulos.items():
+            if granulo.forma != referencia.forma:
+                print(f"  ✗ {contaminante}: rejilla distinta a la de referencia, se omite")
+                continue
+            productos[contaminante] = granulo
+
+        aqi = np.full((lat_arr.size, lon_arr.size), SIN_DATOS, dtype=np.uint16)
+        for i0 in range(0, lat_arr.size, filas_por_franja):
+            i1 = min(i0 + filas_por_franja, lat_arr.size)
+            aqi[i0:i1] = _rejilla.aqi_franja(productos, i0, i1)
+        return lat_arr, lon_arr, aqi
+    finally:
+        for granulo in granulos.values():
+            granulo.close()
+
+def _tesela_x(lon, z):
+    return int((lon + 180.0) / 360.0 * 2 ** z)
+
+def _tesela_y(lat, z):
+    lat = max(min(lat, 85.0511), -85.0511)
+    return int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * 2 ** z)
+
+def _centros_tesela(z, x, y):
+    """Lat/lon de los centros de píxel de una tesela Web Mercator."""
+    n = 2 ** z * TAMANO_TESELA
+    px = (x * TAMANO_TESELA + np.arange(TAMANO_TESELA) + 0.5) / n
+    py = (y * TAMANO_TESELA + np.arange(TAMANO_TESELA) + 0.5) / n
+    lons = px * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * py))))
+    return lats, lons
+
+def _fuera_de_eje(eje, valores):
+    """True donde el valor cae fuera de la cobertura del eje (más medio píxel)."""
+    medio_paso = abs(float(eje[-1] - eje[0])) / max(eje.size - 1, 1) / 2
+    return (valores < eje.min() - medio_paso) | (valores > eje.max() + medio_paso)
+
+def png_rgba(rgba):
+    """Codifica un array (alto, ancho, 4) uint8 como PNG sin dependencias externas."""
+    alto, ancho, _ = rgba.shape
+    filas = np.concatenate([np.zeros((alto, 1), dtype=np.uint8), rgba.reshape(alto, -1)], axis=1)
+
+    def bloque(tipo, datos):
+        return (struct.pack('>I', len(datos)) + tipo + datos
+                + struct.pack('>I', zlib.crc32(tipo + datos) & 0xffffffff))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + bloque(b'IHDR', struct.pack('>IIBBBBB', ancho, alto, 8, 6, 0, 0, 0))
+            + bloque(b'IDAT', zlib.compress(filas.tobytes(), 6))
+            + bloque(b'IEND', b''))
+
+def escribir_teselas(lat_arr, lon_arr, aqi, destino, zoom_min=0, zoom_max=7):
+    """Escribe {z}/{x}/{y}.png y .bin para todas las teselas que tocan la rejilla."""
+    escritas = 0
+    indice = tempo.IndiceRejilla(lat_arr, lon_arr)
+    for z in range(zoom_min, zoom_max + 1):
+        x0, x1 = _tesela_x(lon_arr.min(), z), _tesela_x(lon_arr.max(), z)
+        y0, y1 = _tesela_y(lat_arr.max(), z), _tesela_y(lat_arr.min(), z)
+        for x in range(x0, min(x1, 2 ** z - 1) + 1):
+            for y in range(y0, min(y1, 2 ** z - 1) + 1):
+                lats, lons = _centros_tesela(z, x, y)
+                filas, columnas = indice.indices(lats, lons)
+                tesela = aqi[np.ix_(filas, columnas)]
+                fuera = _fuera_de_eje(lat_arr, lats)[:, None] | _fuera_de_eje(lon_arr, lons)[None, :]
+                tesela = np.where(fuera, SIN_DATOS, tesela)
+                if np.all(tesela == SIN_DATOS):
+                    continue
+
+                carpeta = os.path.join(destino, str(z), str(x))
+                os.makedirs(carpeta, exist_ok=True)
+                with open(os.path.join(carpeta, f'{y}.bin'), 'wb') as f:
+                    f.write(tesela.astype('<u2').tobytes())
+                indices_paleta = np.where(tesela == SIN_DATOS, 501, np.minimum(tesela, 500))
+                with open(os.path.join(carpeta, f'{y}.png'), 'wb') as f:
+                    f.write(png_rgba(PALETA[indices_paleta]))
+                escritas += 1
+    return escritas
+
+def _publicar(directorio, version, granulos):
+    """Apunta actual.json a la nueva versión (reemplazo atómico) y borra las antiguas."""
+    manifiesto = {
+        'version': version,
+        'granulos': granulos,
+        'generado': datetime.now(timezone.utc).isoformat(),
+    }
+    temporal = os.path.join(directorio, '.actual.json.tmp')
+    with open(temporal, 'w') as f:
+        json.dump(manifiesto, f)
+    os.replace(temporal, os.path.join(directorio, 'actual.json'))
+
+    # Keep the previous build around so clients holding its ETag are not cut off mid-pan
+    versiones = sorted(d for d in os.listdir(directorio) if d.startswith('v') and d != version)
+    sobrantes = len(versiones) - (VERSIONES_A_CONSERVAR - 1)
+    for antigua in versiones[:max(sobrantes, 0)]:
+        shutil.rmtree(os.path.join(directorio, antigua), ignore_errors=True)
+
+def _leer_manifiesto(directorio):
+    try:
+        with open(os.path.join(directorio, 'actual.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _rutas_ultimos_granulos(directorio):
+    """Descarga (o reutiliza) el último granulo de cada producto."""
+    almacen = tempo.almacen_granulos or tempo.AlmacenGranulos(
+        os.path.join(directorio, '.granulos'), int(tempo.GRANULOS_MAX_MB * 1024 * 1024)
+    )
+    temporal = tempo._ventana_temporal()
+    rutas, granulos = {}, {}
+    for config in tempo.DATASETS_CONFIG:
+        # Any point inside the TEMPO field of regard finds the same hourly granule
+        encontrados = tempo.buscar_granulos(config, 40.0, -95.0, temporal)
+        if not encontrados: continue
+        ruta = almacen.ruta_local(encontrados[0])
+        if ruta:
+            rutas[config["contaminante"]] = ruta
+            granulos[config["contaminante"]] = tempo.id_granulo(encontrados[0])
+    return rutas, granulos
+
+def generar(directorio=tempo.TESELAS_DIR, zoom_min=0, zoom_max=7, rutas=None, forzar=False, procesos=1):
+    os.makedirs(directorio, exist_ok=True)
+    if rutas:
+        granulos = {contaminante: os.path.basename(ruta) for contaminante, ruta in rutas.items()}
+    else:
+        rutas, granulos = _rutas_ultimos_granulos(directorio)
+    if not rutas:
+        print("✗ No se encontraron granulos")
+        return None
+
+    manifiesto = _leer_manifiesto(directorio)
+    if manifiesto and manifiesto.get('granulos') == granulos and not forzar:
+        print("✓ Teselas al día, no hay granulos nuevos")
+        return manifiesto['version']
+
+    print(f"🛰️ Calculando AQI de la rejilla completa: {granulos}")
+    lat_arr, lon_arr, aqi = calcular_aqi_rejilla(rutas, procesos=procesos)
+
+    version = 'v' + datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    destino = os.path.join(directorio, version)
+    escritas = escribir_teselas(lat_arr, lon_arr, aqi, destino, zoom_min, zoom_max)
+    _publicar(directorio, version, granulos)
+    print(f"✓ {escritas} teselas escritas en {destino}")
+    return version
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Genera teselas AQI para /api/tiles')
+    parser.add_argument('--directorio', default=tempo.TESELAS_DIR)
+    parser.add_argument('--zoom-min', type=int, default=0)
+    parser.add_argument('--zoom-max', type=int, default=7)
+    parser.add_argument('--forzar', action='store_true', help='Regenerar aunque los granulos no hayan cambiado')
+    parser.add_argument('--procesos', type=int, default=_rejilla.PROCESOS, help='Procesos para el AQI de la rejilla')
+    parser.add_argument('--no2', help='Archivo local de NO2 (omite la búsqueda en CMR)')
+    parser.add_argument('--o3', help='Archivo local de O3TOT')
+    parser.add_argument('--hcho', help='Archivo local de HCHO')
+    args = parser.parse_args()
+
+    rutas = {c: r for c, r in (('NO2', args.no2), ('O3', args.o3), ('HCHO', args.hcho)) if r}
+    generar(args.directorio, args.zoom_min, args.zoom_max, rutas or None, args.forzar, args.procesos)
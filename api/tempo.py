@@ -1,14 +1,35 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import earthaccess
-import xarray as xr
 import numpy as np
 from datetime import datetime, timedelta
-import random
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+import base64
+import hmac
 import math
 import os
-import traceback
 import json
+import time
+import sqlite3
+import shutil
+import tempfile
+import threading
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _granulo import (  # noqa: E402
+    VARIABLES_A_EXTRAER, ArchivoContado, GranuloTempo, indices_mas_cercanos,
+)
+from _metricas import enviar, log, peticion, registro, tramo  # noqa: E402
+from _binario import TIPO_COLUMNAR, acepta_columnar, codificar  # noqa: E402
+from _regiones import CatalogoRegiones, anillos as anillos_region, caja, centroide, huella, rasterizar  # noqa: E402
+import _sesiones  # noqa: E402
+import _instantanea  # noqa: E402
+# EXACT SAME FUNCTIONS AS ORIGINAL App.py, kept importable without Flask for the grid workers
+from _indice import (  # noqa: E402
+    BANDAS_O3, LIMITES_BANDAS_AQI, SUBINDICE_O3_FUERA, SUBINDICES_HCHO, SUBINDICES_NO2, UMBRALES_HCHO, UMBRALES_NO2,
+    banda_aqi_array, calcular_indice_realista, calcular_indice_realista_array, get_categoria, get_color_from_score,
+)
 
 # Load credentials from vercel.json
 def load_credentials_from_vercel():
@@ -29,250 +50,2179 @@ def load_credentials_from_vercel():
             password = env_vars.get('EARTHDATA_PASSWORD', '').replace('@', '')
             return username, password
     except Exception as e:
-        print(f"Error loading credentials: {e}")
+        log.warning("Error loading credentials: %s", e)
         return None, None
 
-# Initialize authentication once (with better error handling for serverless)
+# earthaccess (and its requests/fsspec/pandas stack) is imported and logged in
+# on first use, not at import time, so a cold start only pays for it when a
+# request actually needs CMR. The session is then reused by every invocation
+# served by the same container, and so are its HTTP connections: _sesiones
+# replaces earthaccess' per-search requests session and its fsspec client with
+# shared keep-alive pools.
 auth = None
-username, password = load_credentials_from_vercel()
-if username and password:
-    try:
-        # Set environment variables for earthaccess
-        os.environ['EARTHDATA_USERNAME'] = username
-        os.environ['EARTHDATA_PASSWORD'] = password
-        auth = earthaccess.login(strategy="environment")
-    except Exception as e:
-        print(f"Error initializing Earthdata authentication: {e}")
+_earthaccess = None
+_lock_auth = threading.Lock()
+_proximo_intento_auth = 0.0
+REINTENTO_AUTH = float(os.environ.get('TEMPO_REINTENTO_AUTH', '60'))
+
+def obtener_earthaccess():
+    """Módulo earthaccess con la sesión de Earthdata iniciada (una vez por proceso)."""
+    global auth, _earthaccess, _proximo_intento_auth
+    if auth is not None:
+        return _earthaccess
+    with _lock_auth:
+        if _earthaccess is None:
+            import earthaccess
+            _earthaccess = earthaccess
+        # A failed login is retried after REINTENTO_AUTH seconds, not on every request
+        if auth is None and time.time() >= _proximo_intento_auth:
+            username, password = load_credentials_from_vercel()
+            if username and password:
+                try:
+                    # Set environment variables for earthaccess
+                    os.environ['EARTHDATA_USERNAME'] = username
+                    os.environ['EARTHDATA_PASSWORD'] = password
+                    auth = _earthaccess.login(strategy="environment")
+                    _sesiones.instalar(_earthaccess)
+                except Exception as e:
+                    log.warning("Error initializing Earthdata authentication: %s", e)
+            if auth is None:
+                _proximo_intento_auth = time.time() + REINTENTO_AUTH
+    return _earthaccess
+
+
+DATASETS_CONFIG = [
+    {"short_name": "TEMPO_NO2_L3", "version": "V03", "contaminante": "NO2"},
+    {"short_name": "TEMPO_O3TOT_L3", "version": "V03", "contaminante": "O3"},
+    {"short_name": "TEMPO_HCHO_L3", "version": "V03", "contaminante": "HCHO"},
+]
 
+# Concurrent fetch: each product pipeline (search -> open -> read) runs in its
+# own worker so a click costs roughly the slowest product, not the sum of all three.
+CONSULTA_CONCURRENTE = os.environ.get('TEMPO_CONSULTA_CONCURRENTE', '1') != '0'
+# Whole-request budget: vercel.json's maxDuration for api/**. The product deadline
+# (queue wait + read) is capped below it, leaving room for scoring and the response.
+DURACION_MAXIMA = float(os.environ.get('TEMPO_DURACION_MAXIMA', '30'))
+TIMEOUT_PRODUCTO = min(float(os.environ.get('TEMPO_TIMEOUT_PRODUCTO', '20')), DURACION_MAXIMA - 5)
+MAX_WORKERS = int(os.environ.get('TEMPO_MAX_WORKERS', '6'))
 
-# EXACT SAME FUNCTIONS AS ORIGINAL App.py
-def calcular_indice_realista(contaminantes):
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='tempo')
+
+PRODUCTOS_EXPIRADOS = registro.contador(
+    'tempo_productos_expirados_total', 'Productos que superaron TIMEOUT_PRODUCTO (en cola o leyendo)',
+    ('producto', 'fase')
+)
+PRODUCTOS_FALLIDOS = registro.contador(
+    'tempo_productos_fallidos_total', 'Productos cuya consulta terminó con una excepción', ('producto',)
+)
+
+# Granule lookup cache: the "latest granule" only changes about once an hour, so
+# CMR searches are memoized per (short_name, version, 1° tile, hour bucket).
+CACHE_GRANULOS_TTL = float(os.environ.get('TEMPO_CACHE_GRANULOS_TTL', '3600'))
+CACHE_GRANULOS_MAX = int(os.environ.get('TEMPO_CACHE_GRANULOS_MAX', '512'))
+CACHE_GRANULOS_DB = os.environ.get('TEMPO_CACHE_GRANULOS_DB')  # e.g. /tmp/tempo_granulos.sqlite
+
+class CacheGranulos:
     """
-    Índice compuesto 0-500 (escala EPA-style) usando 12 variables.
-    Pesos basados en impacto y confiabilidad del dato satelital.
+    Cache LRU con TTL para resultados de earthaccess.search_data.
+    Opcionalmente respaldado en SQLite para sobrevivir a cold starts.
     """
-    for nombre, vars in contaminantes.items():
-        if vars.get('quality_flag', 0) > 0:
+
+    def __init__(self, max_entradas=CACHE_GRANULOS_MAX, ttl=CACHE_GRANULOS_TTL, ruta_db=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.aciertos_disco = 0
+        self._db = None
+        if ruta_db:
+            try:
+                self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS granulos (clave TEXT PRIMARY KEY, expira REAL, datos TEXT)'
+                )
+                self._db.execute('DELETE FROM granulos WHERE expira < ?', (time.time(),))
+                self._db.commit()
+            except sqlite3.Error as e:
+                log.warning("Error abriendo cache de granulos en %s: %s", ruta_db, e)
+                self._db = None
+
+    @staticmethod
+    def clave(short_name, version, lat, lon, count=1, ahora=None, temporal=None):
+        ahora = time.time() if ahora is None else ahora
+        rango = '|'.join(temporal) if temporal else ''
+        return f"{short_name}|{version}|{math.floor(lat)}|{math.floor(lon)}|{int(ahora // 3600)}|{count}|{rango}"
+
+    def obtener(self, clave):
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                expira, granulos = entrada
+                if expira > ahora:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return granulos
+                del self._entradas[clave]
+
+            if self._db is not None:
+                fila = self._db.execute(
+                    'SELECT expira, datos FROM granulos WHERE clave = ?', (clave,)
+                ).fetchone()
+                if fila and fila[0] > ahora:
+                    granulos = _deserializar_granulos(fila[1])
+                    self._insertar(clave, fila[0], granulos)
+                    self.aciertos += 1
+                    self.aciertos_disco += 1
+                    return granulos
+
+            self.fallos += 1
             return None
+
+    def guardar(self, clave, granulos):
+        expira = time.time() + self.ttl
+        with self._lock:
+            self._insertar(clave, expira, granulos)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO granulos (clave, expira, datos) VALUES (?, ?, ?)',
+                        (clave, expira, _serializar_granulos(granulos))
+                    )
+                    self._db.commit()
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    log.warning("Error guardando granulos en disco: %s", e)
+
+    def _insertar(self, clave, expira, granulos):
+        self._entradas[clave] = (expira, granulos)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'aciertos_disco': self.aciertos_disco,
+                'tasa_aciertos': self.aciertos / total if total else 0.0,
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'ttl': self.ttl,
+                'persistente': self._db is not None,
+            }
+
+def _serializar_granulos(granulos):
+    return json.dumps([
+        {'datos': dict(g), 'cloud_hosted': getattr(g, 'cloud_hosted', None)} for g in granulos
+    ])
+
+def _deserializar_granulos(texto):
+    from earthaccess.results import DataGranule
+    granulos = []
+    for item in json.loads(texto):
+        if item['cloud_hosted'] is None:
+            granulos.append(item['datos'])
+        else:
+            granulos.append(DataGranule(item['datos'], cloud_hosted=item['cloud_hosted']))
+    return granulos
+
+cache_granulos = CacheGranulos(ruta_db=CACHE_GRANULOS_DB)
+
+# CMR lists granules oldest-first by default, so count=1 would return the start of
+# the search window instead of the latest scan
+ORDEN_RECIENTES = '-start_date'
+
+def buscar_granulos(config, lat, lon, temporal, count=1):
+    """earthaccess.search_data con cache por tesela de 1° y hora; del más reciente al más antiguo."""
+    clave = CacheGranulos.clave(config["short_name"], config["version"], lat, lon, count, temporal=temporal)
+    granulos = cache_granulos.obtener(clave)
+    if granulos is not None:
+        log.debug("Cache de granulos: acierto para %s", config["short_name"])
+        return granulos
+
+    # Search the whole 1° tile so every point that shares the key gets the same answer
+    lon_tesela, lat_tesela = math.floor(lon), math.floor(lat)
+    with tramo('busqueda', config["contaminante"]):
+        granulos = list(obtener_earthaccess().search_data(
+            short_name=config["short_name"], version=config["version"],
+            temporal=temporal, bounding_box=(lon_tesela, lat_tesela, lon_tesela + 1, lat_tesela + 1),
+            count=count, sort_key=ORDEN_RECIENTES
+        ))
+    # Stable, so reprocessed granules of the same hour keep CMR's order
+    granulos.sort(key=lambda granulo: hora_granulo(granulo) or '', reverse=True)
+    cache_granulos.guardar(clave, granulos)
+    return granulos
+
+# Local granule store: granules are downloaded once into a directory keyed by
+# granule ID and read from disk afterwards (OS page cache instead of HTTPS).
+GRANULOS_DIR = os.environ.get('TEMPO_GRANULOS_DIR')  # e.g. /tmp/tempo_granulos
+GRANULOS_MAX_MB = float(os.environ.get('TEMPO_GRANULOS_MAX_MB', '2048'))
+GRANULOS_DESCARGAR = os.environ.get('TEMPO_GRANULOS_DESCARGAR', '1') != '0'
+
+def id_granulo(granulo):
+    try:
+        granule_ur = granulo['umm']['GranuleUR']
+    except (KeyError, TypeError):
+        granule_ur = os.path.basename(granulo.data_links()[0])
+    return os.path.basename(granule_ur)
+
+class AlmacenGranulos:
+    """
+    Almacén local de archivos de granulos con desalojo LRU por tamaño.
+    Sirve también con un directorio de archivos pre-cargados (descargar=False).
+    """
+
+    def __init__(self, directorio, max_bytes, descargar=True):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.descargar = descargar
+        self._lock = threading.Lock()
+        self._locks_descarga = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.descargas = 0
+        self.desalojos = 0
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, id_granulo):
+        return os.path.join(self.directorio, id_granulo)
+
+    def ruta_local(self, granulo):
+        """Ruta local del granulo, descargándolo si hace falta. None si no está disponible."""
+        identificador = id_granulo(granulo)
+        ruta = self._ruta(identificador)
+        if os.path.exists(ruta):
+            os.utime(ruta)  # mtime is the LRU clock
+            with self._lock: self.aciertos += 1
+            return ruta
+
+        with self._lock:
+            self.fallos += 1
+            if not self.descargar: return None
+            lock_descarga = self._locks_descarga.setdefault(identificador, threading.Lock())
+
+        # One download per granule even when several products/requests race for it
+        with lock_descarga:
+            if not os.path.exists(ruta):
+                temporal = tempfile.mkdtemp(dir=self.directorio, prefix='.descarga-')
+                try:
+                    archivos = obtener_earthaccess().download([granulo], local_path=temporal)
+                    if not archivos: return None
+                    os.replace(str(archivos[0]), ruta)
+                    with self._lock: self.descargas += 1
+                finally:
+                    shutil.rmtree(temporal, ignore_errors=True)
+        with self._lock:
+            self._locks_descarga.pop(identificador, None)
+        self._desalojar(conservar=ruta)
+        return ruta
+
+    def _desalojar(self, conservar=None):
+        with self._lock:
+            archivos = []
+            for nombre in os.listdir(self.directorio):
+                ruta = self._ruta(nombre)
+                if nombre.startswith('.') or not os.path.isfile(ruta): continue
+                estado = os.stat(ruta)
+                archivos.append((estado.st_mtime, estado.st_size, ruta))
+            total = sum(tamano for _, tamano, _ in archivos)
+            for _, tamano, ruta in sorted(archivos):
+                if total <= self.max_bytes: break
+                if ruta == conservar: continue
+                try:
+                    os.remove(ruta)
+                    total -= tamano
+                    self.desalojos += 1
+                except OSError:
+                    pass
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'descargas': self.descargas,
+                'desalojos': self.desalojos,
+                'max_bytes': self.max_bytes,
+                'directorio': self.directorio,
+            }
+
+almacen_granulos = (
+    AlmacenGranulos(GRANULOS_DIR, int(GRANULOS_MAX_MB * 1024 * 1024), GRANULOS_DESCARGAR)
+    if GRANULOS_DIR else None
+)
+
+METROS_POR_GRADO = 111320.0
+
+class IndiceRejilla:
+    """
+    Índice de píxel más cercano para una rejilla lat/lon rectilínea (como la L3
+    de TEMPO). Ejes regulares: aritmética O(1); irregulares: búsqueda binaria.
+    """
+
+    def __init__(self, lat_arr, lon_arr):
+        self.latitudes = np.asarray(lat_arr, dtype=np.float64)
+        self.longitudes = np.asarray(lon_arr, dtype=np.float64)
+        self.forma = (self.latitudes.size, self.longitudes.size)
+        self._lat_regular = self._eje_regular(self.latitudes)
+        self._lon_regular = self._eje_regular(self.longitudes)
+
+    @staticmethod
+    def _eje_regular(eje):
+        if eje.size < 2: return None
+        paso = (eje[-1] - eje[0]) / (eje.size - 1)
+        # Loose tolerance: TEMPO stores the axes as float32, so steps jitter by a few ulp
+        if paso != 0 and np.allclose(np.diff(eje), paso, rtol=1e-2, atol=0):
+            return float(eje[0]), float(paso)
+        return None
+
+    @staticmethod
+    def _indices_eje(eje, regular, valores):
+        valores = np.atleast_1d(np.asarray(valores, dtype=np.float64))
+        if regular is None:
+            return indices_mas_cercanos(eje, valores)
+        origen, paso = regular
+        # ceil(x - 0.5) resolves exact midpoints to the lower index, like argmin
+        return np.clip(np.ceil((valores - origen) / paso - 0.5), 0, eje.size - 1).astype(np.intp)
+
+    def indices(self, lats, lons):
+        """(filas, columnas) del píxel más cercano a cada punto."""
+        return (self._indices_eje(self.latitudes, self._lat_regular, lats),
+                self._indices_eje(self.longitudes, self._lon_regular, lons))
+
+    def vecinos(self, lat, lon, k=4):
+        """Los k píxeles más cercanos a un punto: (filas, columnas, distancias en grados)."""
+        i, j = (int(v[0]) for v in self.indices(lat, lon))
+        r = int(math.ceil(math.sqrt(k))) + 1
+        filas = np.arange(max(i - r, 0), min(i + r + 1, self.forma[0]))
+        columnas = np.arange(max(j - r, 0), min(j + r + 1, self.forma[1]))
+        ff, cc = np.meshgrid(filas, columnas, indexing='ij')
+        dlat = self.latitudes[ff] - lat
+        dlon = (self.longitudes[cc] - lon) * math.cos(math.radians(lat))
+        distancias = np.hypot(dlat, dlon).ravel()
+        orden = np.argsort(distancias, kind='stable')[:k]
+        return ff.ravel()[orden], cc.ravel()[orden], distancias[orden]
+
+    def ventana(self, lat, lon, radio):
+        """
+        Rectángulo de píxeles que cubre el círculo de `radio` metros alrededor de
+        (lat, lon): ((i0, i1, j0, j1), máscara booleana (i1-i0, j1-j0) de los
+        píxeles cuyo centro cae dentro). El píxel más cercano siempre cuenta,
+        así un radio menor que un píxel equivale a la consulta puntual.
+        """
+        dlat = radio / METROS_POR_GRADO
+        dlon = radio / (METROS_POR_GRADO * max(math.cos(math.radians(lat)), 1e-6))
+        filas, columnas = self.indices([lat - dlat, lat + dlat, lat], [lon - dlon, lon + dlon, lon])
+        i0, i1 = int(filas[:2].min()), int(filas[:2].max()) + 1
+        j0, j1 = int(columnas[:2].min()), int(columnas[:2].max()) + 1
+        dy = (self.latitudes[i0:i1, None] - lat) * METROS_POR_GRADO
+        dx = (self.longitudes[None, j0:j1] - lon) * METROS_POR_GRADO * math.cos(math.radians(lat))
+        mascara = dy ** 2 + dx ** 2 <= radio ** 2
+        mascara[filas[2] - i0, columnas[2] - j0] = True
+        return (i0, i1, j0, j1), mascara
+
+    @staticmethod
+    def _fraccion(eje, valores):
+        indices = np.arange(eje.size, dtype=np.float64)
+        if eje[0] > eje[-1]:
+            return np.interp(valores, eje[::-1], indices[::-1])
+        return np.interp(valores, eje, indices)
+
+    def bilineal(self, lats, lons):
+        """
+        Los 4 píxeles que rodean cada punto y sus pesos bilineales:
+        (filas, columnas, pesos), cada uno de forma (n_puntos, 4).
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        fi = self._fraccion(self.latitudes, lats)
+        fj = self._fraccion(self.longitudes, lons)
+        i0 = np.clip(np.floor(fi), 0, max(self.forma[0] - 2, 0)).astype(np.intp)
+        j0 = np.clip(np.floor(fj), 0, max(self.forma[1] - 2, 0)).astype(np.intp)
+        ti, tj = np.clip(fi - i0, 0, 1), np.clip(fj - j0, 0, 1)
+        i1 = np.minimum(i0 + 1, self.forma[0] - 1)
+        j1 = np.minimum(j0 + 1, self.forma[1] - 1)
+        filas = np.stack([i0, i0, i1, i1], axis=1)
+        columnas = np.stack([j0, j1, j0, j1], axis=1)
+        pesos = np.stack([(1 - ti) * (1 - tj), (1 - ti) * tj, ti * (1 - tj), ti * tj], axis=1)
+        return filas, columnas, pesos
+
+# One IndiceRejilla per product grid, shared by every request in the process
+_indices_rejilla = {}
+_lock_indices_rejilla = threading.Lock()
+
+def indice_rejilla(clave, forma, leer_ejes):
+    """
+    Índice cacheado por producto. leer_ejes() (que lee latitude/longitude del
+    archivo) sólo se llama la primera vez o si la forma de la rejilla cambia.
+    """
+    if clave is not None:
+        with _lock_indices_rejilla:
+            indice = _indices_rejilla.get(clave)
+        if indice is not None and indice.forma == forma:
+            return indice
+    indice = IndiceRejilla(*leer_ejes())
+    if clave is not None:
+        with _lock_indices_rejilla:
+            _indices_rejilla[clave] = indice
+    return indice
+
+def _leer_puntos_granulo_abierto(granulo, lats, lons, clave_rejilla=None, producto='', granulo_id=None):
+    """
+    Lee los píxeles más cercanos a varios puntos de un GranuloTempo abierto. Cada
+    variable se lee con una sola petición de la ventana que cubre los puntos,
+    así HDF5 sólo toca los chunks que la contienen.
+    Devuelve (columnas, lat_pixeles, lon_pixeles) o None.
+    """
+    if not granulo.tiene_coordenadas():
+        log.info("No se encontraron coordenadas 'latitude'/'longitude' en el archivo")
+        return None
+    with tramo('coordenadas', producto, granulo_id):
+        indice = indice_rejilla(clave_rejilla, granulo.forma, lambda: (granulo.latitudes, granulo.longitudes))
+        lat_idx, lon_idx = indice.indices(lats, lons)
+    with tramo('lectura', producto, granulo_id):
+        columnas = granulo.leer_puntos(lat_idx, lon_idx)
+    return columnas, indice.latitudes[lat_idx], indice.longitudes[lon_idx]
+
+def leer_granulo_local(ruta, leer, clave_rejilla=None):
+    """
+    Abre un granulo local (datasets contiguos vía memmap) y devuelve
+    leer(granulo, producto, granulo_id) + (bytes_leidos,), o None. Un archivo
+    local no genera tráfico de red, así que bytes_leidos es 0.
+    """
+    producto, granulo_id = _producto_rejilla(clave_rejilla), os.path.basename(ruta)
+    with tramo('apertura', producto, granulo_id):
+        granulo = GranuloTempo(ruta)
+    with granulo:
+        lectura = leer(granulo, producto, granulo_id)
+    return None if lectura is None else lectura + (0,)
+
+def leer_puntos_local(ruta, lats, lons, clave_rejilla=None):
+    """Varios puntos de un granulo local: (columnas, lat_pixeles, lon_pixeles, bytes_leidos) o None."""
+    return leer_granulo_local(
+        ruta, lambda granulo, producto, granulo_id: _leer_puntos_granulo_abierto(
+            granulo, lats, lons, clave_rejilla, producto, granulo_id), clave_rejilla
+    )
+
+# Remote reads: small fsspec blocks so a pixel read fetches the HDF5 chunk it
+# lives in (plus metadata), not earthaccess' default 4-16 MB read-ahead blocks.
+BLOQUE_REMOTO_KB = int(os.environ.get('TEMPO_BLOQUE_REMOTO_KB', '64'))
+CACHE_REMOTO = os.environ.get('TEMPO_CACHE_REMOTO', 'blockcache')
+
+estadisticas_lectura = {'lecturas_remotas': 0, 'bytes_remotos': 0}
+_lock_estadisticas_lectura = threading.Lock()
+
+def abrir_remoto(granulo):
+    """earthaccess.open con la cache de bloques ajustada para lecturas de píxeles."""
+    opciones = {'cache_type': CACHE_REMOTO, 'block_size': BLOQUE_REMOTO_KB * 1024}
+    try:
+        return obtener_earthaccess().open([granulo], open_kwargs=opciones)
+    except TypeError:
+        # earthaccess < 0.10 has no open_kwargs
+        return obtener_earthaccess().open([granulo])
+
+def leer_granulo_remoto(granulo, leer, clave_rejilla=None):
+    """
+    Igual que leer_granulo_local sobre el archivo remoto, leído a través de
+    fsspec. Con la rejilla ya indexada no se leen latitude/longitude.
+    """
+    producto, granulo_id = _producto_rejilla(clave_rejilla), id_granulo(granulo)
+    with tramo('apertura', producto, granulo_id):
+        files = abrir_remoto(granulo)
+        if not files: return None
+        archivo = ArchivoContado(files[0])
+        try:
+            abierto = GranuloTempo(archivo)
+        except Exception:
+            archivo.close()
+            raise
+
+    try:
+        with abierto:
+            lectura = leer(abierto, producto, granulo_id)
+    finally:
+        archivo.close()
     
-    subindices = []
-    confianzas = []
+    bytes_leidos = archivo.bytes_red()
+    with _lock_estadisticas_lectura:
+        estadisticas_lectura['lecturas_remotas'] += 1
+        estadisticas_lectura['bytes_remotos'] += bytes_leidos
+    log.debug("%s: %.0f KB en %d lecturas", granulo_id, bytes_leidos / 1024, archivo.lecturas)
+    return None if lectura is None else lectura + (bytes_leidos,)
+
+def leer_granulo(granulo, leer, clave_rejilla=None):
+    """leer_granulo_local si el granulo está en el almacén local; si no, leer_granulo_remoto."""
+    ruta = almacen_granulos.ruta_local(granulo) if almacen_granulos else None
+    if ruta:
+        log.debug("Granulo local: %s", os.path.basename(ruta))
+        return leer_granulo_local(ruta, leer, clave_rejilla)
+    return leer_granulo_remoto(granulo, leer, clave_rejilla)
+
+def leer_puntos_granulo(granulo, lats, lons, clave_rejilla=None):
+    """
+    Lee varios puntos de un granulo, desde el almacén local si está disponible.
+    clave_rejilla identifica la rejilla del producto para reutilizar su índice.
+    Devuelve (columnas, lat_pixeles, lon_pixeles, bytes_leidos) o None.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    return leer_granulo(
+        granulo, lambda abierto, producto, granulo_id: _leer_puntos_granulo_abierto(
+            abierto, lats, lons, clave_rejilla, producto, granulo_id), clave_rejilla
+    )
+
+def _leer_ventana_granulo_abierto(granulo, lat, lon, radio, clave_rejilla=None, producto='', granulo_id=None):
+    """
+    Píxeles de un GranuloTempo abierto dentro de `radio` metros de (lat, lon):
+    una lectura del rectángulo que cubre el círculo por variable.
+    Devuelve ({variable: array 2D}, máscara del círculo) o None.
+    """
+    if not granulo.tiene_coordenadas():
+        log.info("No se encontraron coordenadas 'latitude'/'longitude' en el archivo")
+        return None
+    with tramo('coordenadas', producto, granulo_id):
+        indice = indice_rejilla(clave_rejilla, granulo.forma, lambda: (granulo.latitudes, granulo.longitudes))
+        (i0, i1, j0, j1), mascara = indice.ventana(lat, lon, radio)
+    with tramo('lectura', producto, granulo_id):
+        ventana = {
+            nombre_interno: granulo.leer_franja(nombre_tempo, i0, i1, j0, j1)
+            for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items()
+            if granulo.variable(nombre_tempo) is not None
+        }
+    return ventana, mascara
+
+def leer_ventana_granulo(granulo, lat, lon, radio, clave_rejilla=None):
+    """Como leer_puntos_granulo para un vecindario: (ventana, máscara, bytes_leidos) o None."""
+    return leer_granulo(
+        granulo, lambda abierto, producto, granulo_id: _leer_ventana_granulo_abierto(
+            abierto, lat, lon, radio, clave_rejilla, producto, granulo_id), clave_rejilla
+    )
+
+def _leer_region_granulo_abierto(granulo, pixeles, clave_rejilla=None, producto='', granulo_id=None):
+    """
+    Valores de un GranuloTempo abierto en los píxeles pixeles(indice) ->
+    (filas, columnas): una lectura del rectángulo que los cubre por variable
+    y un gather. Devuelve ({variable: array 1D},) o None.
+    """
+    if not granulo.tiene_coordenadas():
+        log.info("No se encontraron coordenadas 'latitude'/'longitude' en el archivo")
+        return None
+    with tramo('coordenadas', producto, granulo_id):
+        indice = indice_rejilla(clave_rejilla, granulo.forma, lambda: (granulo.latitudes, granulo.longitudes))
+        filas, columnas = pixeles(indice)
+        if not filas.size:
+            # Region off this product's grid: nothing to read, estadisticas_region reports 0 pixels
+            return ({nombre_interno: np.empty(0) for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items()
+                     if granulo.variable(nombre_tempo) is not None},)
+        i0, j0 = int(filas.min()), int(columnas.min())
+    with tramo('lectura', producto, granulo_id):
+        valores = {
+            nombre_interno: granulo.leer_franja(nombre_tempo, i0, int(filas.max()) + 1, j0, int(columnas.max()) + 1)[
+                filas - i0, columnas - j0]
+            for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items()
+            if granulo.variable(nombre_tempo) is not None
+        }
+    return (valores,)
+
+def leer_region_granulo(granulo, pixeles, clave_rejilla=None):
+    """Como leer_puntos_granulo para una región: (valores, bytes_leidos) o None."""
+    return leer_granulo(
+        granulo, lambda abierto, producto, granulo_id: _leer_region_granulo_abierto(
+            abierto, pixeles, clave_rejilla, producto, granulo_id), clave_rejilla
+    )
+
+def _clave_rejilla(config):
+    return (config["short_name"], config["version"])
+
+_CONTAMINANTE_POR_PRODUCTO = {config["short_name"]: config["contaminante"] for config in DATASETS_CONFIG}
+
+def _producto_rejilla(clave_rejilla):
+    """Etiqueta de producto (NO2, O3, HCHO) de una clave de rejilla, para las métricas."""
+    return _CONTAMINANTE_POR_PRODUCTO.get(clave_rejilla[0], clave_rejilla[0]) if clave_rejilla else ''
+
+# Columnar store written by api/_ingesta.py: the latest granule of each product
+# pre-extracted into one .npy per variable under an hourly partition
+# ({hora}/{contaminante}/), with actual.json pointing at the partition to serve.
+# Point lookups are a memmap index, with no CMR search or granule open.
+ALMACEN_DIR = os.environ.get('TEMPO_ALMACEN_DIR')  # e.g. /tmp/tempo_almacen
+# Partitions older than this are ignored (ingestion stalled) and requests go live
+ALMACEN_MAX_EDAD_H = float(os.environ.get('TEMPO_ALMACEN_MAX_EDAD_H', '3'))
+# Latest-hour snapshot written by api/_instantanea.py: one file with every
+# product that all workers map read-only; takes precedence over TEMPO_ALMACEN_DIR
+INSTANTANEA = os.environ.get('TEMPO_INSTANTANEA')  # e.g. /dev/shm/tempo_instantanea.bin
+
+def _edad_horas(hora):
+    """Horas transcurridas desde una partición '2025-09-01T14'."""
+    return (datetime.utcnow() - datetime.strptime(hora, '%Y-%m-%dT%H')).total_seconds() / 3600
+
+class AlmacenColumnar:
+    """Lectura de las particiones horarias del almacén columnar (np.load con mmap_mode)."""
+
+    def __init__(self, directorio, max_edad_h=ALMACEN_MAX_EDAD_H, variables=tuple(VARIABLES_A_EXTRAER)):
+        self.directorio = directorio
+        self.max_edad_h = max_edad_h
+        self.variables = variables
+        self._manifiesto = {'mtime': None, 'datos': {}}
+        self._particiones = {}
+        self._lock = threading.Lock()
+        self.lecturas = 0
+        self.sin_particion = 0
+        self.caducadas = 0
+
+    def _actual(self):
+        ruta = os.path.join(self.directorio, 'actual.json')
+        try:
+            mtime = os.stat(ruta).st_mtime
+            if mtime != self._manifiesto['mtime']:
+                with open(ruta, 'r') as f:
+                    self._manifiesto = {'mtime': mtime, 'datos': json.load(f)}
+        except (OSError, ValueError):
+            self._manifiesto = {'mtime': None, 'datos': {}}
+        return self._manifiesto['datos']
+
+    def _cargar(self, carpeta):
+        lat_arr = np.load(os.path.join(carpeta, 'latitude.npy'))
+        lon_arr = np.load(os.path.join(carpeta, 'longitude.npy'))
+        variables = {
+            nombre_interno: np.load(os.path.join(carpeta, f'{nombre_interno}.npy'), mmap_mode='r')
+            for nombre_interno in self.variables
+            if os.path.exists(os.path.join(carpeta, f'{nombre_interno}.npy'))
+        }
+        return IndiceRejilla(lat_arr, lon_arr), variables
+
+    def particion(self, contaminante):
+        """{'hora', 'granulo', 'indice', 'variables'} de la partición vigente o None."""
+        with self._lock:
+            entrada = self._actual().get(contaminante)
+            if not entrada:
+                self.sin_particion += 1
+                return None
+            if self.max_edad_h and _edad_horas(entrada['hora']) > self.max_edad_h:
+                self.caducadas += 1
+                return None
+            carpeta = os.path.join(self.directorio, entrada['hora'], contaminante)
+            particion = self._particiones.get(contaminante)
+            if particion is None or particion['carpeta'] != carpeta:
+                try:
+                    indice, variables = self._cargar(carpeta)
+                except (OSError, ValueError) as e:
+                    log.warning("Partición %s ilegible: %s", carpeta, e)
+                    self.sin_particion += 1
+                    return None
+                # Older memmaps stay valid for in-flight readers even if the ingester deletes their files
+                particion = self._particiones[contaminante] = {
+                    'carpeta': carpeta, 'hora': entrada['hora'], 'granulo': entrada['granulo'],
+                    'indice': indice, 'variables': variables,
+                    # Rolling-window stores also publish the hours covered
+                    'horas': entrada.get('horas'), 'completa': entrada.get('completa'),
+                }
+            self.lecturas += 1
+            return particion
+
+    def leer_puntos(self, contaminante, lats, lons):
+        """Igual que leer_puntos_granulo: (columnas, lat_pixeles, lon_pixeles, 0) o None."""
+        particion = self.particion(contaminante)
+        if particion is None: return None
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        indice = particion['indice']
+        filas, columnas = indice.indices(lats, lons)
+        valores = {
+            nombre: np.asarray(datos[filas, columnas], dtype=np.float64)
+            for nombre, datos in particion['variables'].items()
+        }
+        return valores, indice.latitudes[filas], indice.longitudes[columnas], 0
+
+    def hora_particion(self, contaminante):
+        """Hora ('2025-09-01T14:00:00Z') de la última partición servida de un contaminante, o None."""
+        with self._lock:
+            particion = self._particiones.get(contaminante)
+        return particion['hora'] + ':00:00Z' if particion else None
+
+    def cobertura_particion(self, contaminante):
+        """{'horas', 'completa'} de la última partición servida de un almacén de acumulados."""
+        with self._lock:
+            particion = self._particiones.get(contaminante) or {}
+        # Stores published before completeness was tracked count as incomplete
+        return {'horas': len(particion.get('horas') or []), 'completa': bool(particion.get('completa'))}
+
+    def leer_ventana(self, contaminante, lat, lon, radio):
+        """Igual que leer_ventana_granulo: (ventana, máscara, 0) o None."""
+        particion = self.particion(contaminante)
+        if particion is None: return None
+        (i0, i1, j0, j1), mascara = particion['indice'].ventana(lat, lon, radio)
+        ventana = {
+            nombre: np.asarray(datos[i0:i1, j0:j1], dtype=np.float64)
+            for nombre, datos in particion['variables'].items()
+        }
+        return ventana, mascara, 0
+
+    def leer_pixeles(self, contaminante, pixeles):
+        """Igual que leer_region_granulo: pixeles(indice) -> (filas, columnas); ({variable: array 1D}, 0) o None."""
+        particion = self.particion(contaminante)
+        if particion is None: return None
+        filas, columnas = pixeles(particion['indice'])
+        valores = {
+            nombre: np.asarray(datos[filas, columnas], dtype=np.float64)
+            for nombre, datos in particion['variables'].items()
+        }
+        return valores, 0
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'lecturas': self.lecturas,
+                'sin_particion': self.sin_particion,
+                'caducadas': self.caducadas,
+                'particiones': {c: p['hora'] for c, p in self._particiones.items()},
+                'directorio': self.directorio,
+            }
+
+class InstantaneaCompartida(AlmacenColumnar):
+    """
+    El almacén columnar servido desde la instantánea de api/_instantanea.py.
+    Cada consulta hace un stat del archivo; si el cargador ha publicado otra
+    versión se mapea la nueva y la anterior sigue viva para quien la esté leyendo.
+    Un archivo ilegible no se reintenta hasta que cambie.
+    """
+
+    def __init__(self, ruta, max_edad_h=ALMACEN_MAX_EDAD_H):
+        super().__init__(os.path.dirname(ruta), max_edad_h)
+        self.ruta = ruta
+        self._instantanea = None
+        # (inode, mtime, size) of the file last mapped or found unreadable
+        self._firma = None
+        self.versiones = 0
+
+    def _vigente(self):
+        try:
+            estado = os.stat(self.ruta)
+            firma = (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+        except OSError:
+            firma = None
+        if firma != self._firma:
+            self._instantanea, self._particiones, self._firma = None, {}, firma
+            if firma is not None:
+                try:
+                    self._instantanea = _instantanea.Instantanea(self.ruta)
+                    # The loader may have swapped the file between the stat and the open
+                    self._firma = self._instantanea.firma
+                except (OSError, ValueError, KeyError) as e:
+                    log.warning("Instantánea %s ilegible: %s", self.ruta, e)
+                self.versiones += 1
+        return self._instantanea
+
+    def particion(self, contaminante):
+        with self._lock:
+            instantanea = self._vigente()
+            producto = instantanea.productos.get(contaminante) if instantanea else None
+            if not producto:
+                self.sin_particion += 1
+                return None
+            if self.max_edad_h and _edad_horas(producto['hora']) > self.max_edad_h:
+                self.caducadas += 1
+                return None
+            particion = self._particiones.get(contaminante)
+            if particion is None:
+                particion = self._particiones[contaminante] = {
+                    'carpeta': self.ruta, 'hora': producto['hora'], 'granulo': producto['granulo'],
+                    'indice': IndiceRejilla(producto['latitudes'], producto['longitudes']),
+                    'variables': producto['variables'],
+                }
+            self.lecturas += 1
+            return particion
+
+    def estadisticas(self):
+        estadisticas = super().estadisticas()
+        with self._lock:
+            instantanea = self._instantanea
+            estadisticas.update({
+                'instantanea': self.ruta,
+                'generada': instantanea.cabecera['generado'] if instantanea else None,
+                'bytes_mapeados': instantanea.bytes if instantanea else 0,
+                'versiones': self.versiones,
+            })
+        return estadisticas
+
+if INSTANTANEA:
+    almacen_columnar = InstantaneaCompartida(INSTANTANEA)
+else:
+    almacen_columnar = AlmacenColumnar(ALMACEN_DIR) if ALMACEN_DIR else None
+
+def _leer_almacen_columnar(config, lats, lons):
+    if almacen_columnar is None: return None
+    lectura = almacen_columnar.leer_puntos(config["contaminante"], lats, lons)
+    if lectura is not None:
+        log.debug("%s: almacén columnar", config["short_name"])
+    return lectura
+
+def _filas(columnas, n):
+    """Columnas {variable: array} -> lista de n dicts {variable: float}."""
+    return [{nombre: float(valores[k]) for nombre, valores in columnas.items()} for k in range(n)]
+
+def _es_valido(vars_dict):
+    return bool(vars_dict) and not np.isnan(vars_dict.get('troposphere', np.nan))
+
+def agregar_vecindario(ventana, mascara):
+    """
+    Agrega los píxeles de un vecindario en un solo vars_dict. Cuentan los
+    píxeles del círculo con troposphere finito y sin quality_flag > 0 (los que
+    calcular_indice_realista aceptaría); se promedian con pesos 1/uncertainty²
+    (iguales si ninguno trae incertidumbre). La incertidumbre devuelta es la
+    media ponderada, no la del promedio: los errores de píxeles vecinos de
+    TEMPO están correlacionados y no se cancelan al promediar.
+    Devuelve (vars_dict o None si no hay ningún píxel válido, {'validos', 'en_radio'}).
+    """
+    trop = ventana.get('troposphere')
+    pixeles = {'validos': 0, 'en_radio': int(mascara.sum())}
+    if trop is None: return None, pixeles
+    validos = mascara & np.isfinite(trop)
+    if 'quality_flag' in ventana:
+        validos &= ~(ventana['quality_flag'] > 0)
+    pixeles['validos'] = int(validos.sum())
+    if not pixeles['validos']: return None, pixeles
     
-    # --- NO2 (PESO 50%) ---
-    if 'NO2' in contaminantes:
-        no2_vars = contaminantes['NO2']
-        trop = no2_vars.get('troposphere', 0)
-        unc = no2_vars.get('uncertainty', 0)
-        strat = no2_vars.get('stratosphere', 0)
-        confianza_no2 = max(0, 1 - (unc / trop if trop > 0 else 1))
-        
-        if trop < 5e14: aqi_no2 = 25
-        elif trop < 1e15: aqi_no2 = 50
-        elif trop < 2e15: aqi_no2 = 75
-        elif trop < 4e15: aqi_no2 = 100
-        elif trop < 7e15: aqi_no2 = 125
-        elif trop < 1e16: aqi_no2 = 150
-        elif trop < 1.5e16: aqi_no2 = 175
-        elif trop < 2e16: aqi_no2 = 200
-        elif trop < 3e16: aqi_no2 = 250
-        elif trop < 5e16: aqi_no2 = 300
-        else: aqi_no2 = 400
-        
-        if strat < 2e15 or strat > 4e15: aqi_no2 += 15
-        
-        subindices.append(aqi_no2)
-        confianzas.append(confianza_no2 * 0.5)
+    unc = ventana.get('uncertainty', np.full(trop.shape, np.nan))
+    with np.errstate(divide='ignore'):
+        pesos = np.where(validos & np.isfinite(unc) & (unc > 0), 1.0 / unc ** 2, 0.0)
+    if not pesos.any():
+        pesos = validos.astype(np.float64)
     
-    # --- HCHO (PESO 35%) ---
-    if 'HCHO' in contaminantes:
-        hcho_vars = contaminantes['HCHO']
-        trop = hcho_vars.get('troposphere', 0)
-        unc = hcho_vars.get('uncertainty', 0)
-        confianza_hcho = max(0, 1 - (unc / trop if trop > 0 else 1))
-        
-        if trop < 5e14: aqi_hcho = 30
-        elif trop < 1e15: aqi_hcho = 50
-        elif trop < 2e15: aqi_hcho = 75
-        elif trop < 3e15: aqi_hcho = 100
-        elif trop < 5e15: aqi_hcho = 150
-        elif trop < 8e15: aqi_hcho = 200
-        elif trop < 1.2e16: aqi_hcho = 250
-        elif trop < 1.5e16: aqi_hcho = 300
-        else: aqi_hcho = 400
+    vars_dict = {}
+    for nombre, valores in ventana.items():
+        if nombre == 'quality_flag': continue
+        usados = np.where(np.isfinite(valores), pesos, 0.0)
+        total = usados.sum()
+        vars_dict[nombre] = float(np.dot(usados.ravel(), np.nan_to_num(valores).ravel()) / total) if total else float('nan')
+    vars_dict['quality_flag'] = 0.0
+    return vars_dict, pixeles
+
+def _ventana_temporal():
+    fecha_fin = datetime.now()
+    fecha_inicio = fecha_fin - timedelta(days=30)
+    return (fecha_inicio.strftime('%Y-%m-%d'), fecha_fin.strftime('%Y-%m-%d'))
+
+def _consultar_producto(config, lat, lon, temporal, relleno=False):
+    """
+    Pipeline completo de un producto: búsqueda, apertura y lectura del píxel.
+    Con relleno=True, si el píxel del último granulo es NaN o tiene
+    quality_flag > 0 se prueban los anteriores (ver rellenar_producto).
+    Devuelve ((vars_dict o None si no hay datos válidos, hora del granulo usado), bytes leídos).
+    """
+    lectura = _leer_almacen_columnar(config, lat, lon)
+    if lectura is not None:
+        hora = almacen_columnar.hora_particion(config["contaminante"])
+    else:
+        results = buscar_granulos(config, lat, lon, temporal)
+        log.debug("%s: %d granulos encontrados", config["short_name"], len(results))
+        if not results: return (None, None), 0
         
-        subindices.append(aqi_hcho)
-        confianzas.append(confianza_hcho * 0.35)
+        hora = hora_granulo(results[0])
+        lectura = leer_puntos_granulo(results[0], lat, lon, _clave_rejilla(config))
+        if lectura is None: return (None, None), 0
+    columnas, lat_pixeles, lon_pixeles, bytes_leidos = lectura
     
-    # --- O3 (PESO 15%) ---
-    if 'O3' in contaminantes:
-        total = contaminantes['O3'].get('troposphere', 0)
-        
-        if 7.5e18 < total < 8.5e18: aqi_o3 = 50
-        elif 7e18 < total < 9e18: aqi_o3 = 75
-        elif 6.5e18 < total < 9.5e18: aqi_o3 = 100
-        elif 6e18 < total < 1e19: aqi_o3 = 125
-        else: aqi_o3 = 150
-        
-        subindices.append(aqi_o3)
-        confianzas.append(0.15)
+    vars_dict = _filas(columnas, 1)[0]
+    log.debug("%s: píxel %.4f, %.4f -> %s", config["short_name"], lat_pixeles[0], lon_pixeles[0], vars_dict)
+    if not _es_valido(vars_dict):
+        vars_dict = None
+    if not relleno or _es_utilizable(vars_dict):
+        return (vars_dict, hora if vars_dict else None), bytes_leidos
+    relleno_dict, hora_relleno, bytes_relleno = rellenar_producto(config, lat, lon, hora)
+    if relleno_dict is not None:
+        return (relleno_dict, hora_relleno), bytes_leidos + bytes_relleno
+    return (vars_dict, hora if vars_dict else None), bytes_leidos + bytes_relleno
+
+# Temporal gap-fill: when the latest granule is NaN or flagged at the pixel
+# (night, cloud), walk back through the granules of the last few hours, newest
+# first, reading one while the next one is prefetched on its own pool (a
+# product worker waiting on its own pool could deadlock it).
+RELLENO_MAX_EDAD_H = float(os.environ.get('TEMPO_RELLENO_MAX_EDAD_H', '12'))
+RELLENO_MAX_GRANULOS = int(os.environ.get('TEMPO_RELLENO_MAX_GRANULOS', '24'))
+RELLENO_POR_DEFECTO = os.environ.get('TEMPO_RELLENO', '0') == '1'
+
+_executor_relleno = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='tempo-relleno')
+
+RELLENOS = registro.contador(
+    'tempo_rellenos_total', 'Productos sin dato en el último granulo, por resultado del relleno', ('producto', 'resultado')
+)
+
+def _es_utilizable(vars_dict):
+    """Válido y sin quality_flag > 0, es decir, un píxel que calcular_indice_realista puntúa."""
+    return vars_dict is not None and _es_valido(vars_dict) and not vars_dict.get('quality_flag', 0) > 0
+
+def _leer_candidato(config, granulo, lat, lon):
+    vars_dict, bytes_leidos = _leer_punto_historial(config, granulo, lat, lon)
+    return (vars_dict if _es_utilizable(vars_dict) else None), bytes_leidos
+
+def _ventana_relleno():
+    # Whole hours, so the granule search cache key only changes once an hour
+    ahora = datetime.utcnow()
+    inicio = ahora - timedelta(hours=RELLENO_MAX_EDAD_H)
+    return (inicio.strftime('%Y-%m-%dT%H:00:00'), ahora.strftime('%Y-%m-%dT%H:59:59'))
+
+def candidatos_relleno(config, lat, lon, antes_de=None):
+    """[(hora, granulo)] de las últimas RELLENO_MAX_EDAD_H horas anteriores a `antes_de`, del más nuevo al más viejo."""
+    granulos = buscar_granulos(config, lat, lon, _ventana_relleno(), count=RELLENO_MAX_GRANULOS)
+    candidatos = [(hora_granulo(granulo), granulo) for granulo in granulos]
+    candidatos = [(hora, granulo) for hora, granulo in candidatos if hora and (antes_de is None or hora < antes_de)]
+    return sorted(candidatos, key=lambda candidato: candidato[0], reverse=True)
+
+def rellenar_producto(config, lat, lon, antes_de=None):
+    """
+    Primer granulo anterior a `antes_de` con dato utilizable en (lat, lon). Lee
+    uno mientras precarga el siguiente, y para en cuanto encuentra un valor.
+    Devuelve (vars_dict o None, hora del granulo, bytes leídos).
+    """
+    candidatos = candidatos_relleno(config, lat, lon, antes_de)
+    bytes_leidos = 0
+    futuro = None
+    for k, (hora, granulo) in enumerate(candidatos):
+        siguiente = None
+        if k + 1 < len(candidatos):
+            siguiente = enviar(_executor_relleno, _leer_candidato, config, candidatos[k + 1][1], lat, lon)
+        vars_dict, leidos = futuro.result() if futuro is not None else _leer_candidato(config, granulo, lat, lon)
+        bytes_leidos += leidos
+        if vars_dict is not None:
+            if siguiente is not None: siguiente.cancel()
+            log.debug("%s: relleno con %s (%d candidatos probados)", config["short_name"], hora, k + 1)
+            RELLENOS.inc(producto=config["contaminante"], resultado='relleno')
+            return vars_dict, hora, bytes_leidos
+        futuro = siguiente
+    RELLENOS.inc(producto=config["contaminante"], resultado='sin_dato')
+    return None, None, bytes_leidos
+
+def _fallido(config, e):
+    log.warning("Error al procesar %s: %s - %s", config["short_name"], type(e).__name__, e, exc_info=True)
+    PRODUCTOS_FALLIDOS.inc(producto=config["contaminante"])
+
+def _ejecutar_por_producto(funcion, args, concurrente=None, timeout_producto=None, vacio=None):
+    """
+    Ejecuta funcion(config, *args) para cada producto de DATASETS_CONFIG.
+    Devuelve ([(config, salida)], [contaminantes expirados], [contaminantes fallidos]);
+    un producto cuya función lanza una excepción se devuelve con `vacio` y se
+    lista en fallidos, para que un error pasajero no pase por "sin datos".
+
+    Un único plazo por petición, contado desde el envío: cubre tanto la espera
+    en la cola del pool compartido como la lectura, así que la petición nunca
+    tarda más de timeout_producto en esta fase. Los productos que siguen en
+    cola al vencer se cancelan; los que están leyendo siguen en segundo plano.
+    """
+    if concurrente is None: concurrente = CONSULTA_CONCURRENTE
+    if timeout_producto is None: timeout_producto = TIMEOUT_PRODUCTO
     
-    if not subindices: return None
+    salidas, expirados, fallidos = [], [], []
+    if not concurrente:
+        for config in DATASETS_CONFIG:
+            try:
+                salidas.append((config, funcion(config, *args)))
+            except Exception as e:
+                _fallido(config, e)
+                salidas.append((config, vacio))
+                fallidos.append(config["contaminante"])
+        return salidas, expirados, fallidos
     
-    suma_ponderada = sum(idx * conf for idx, conf in zip(subindices, confianzas))
-    suma_confianzas = sum(confianzas)
+    limite = time.monotonic() + timeout_producto
+    futuros = [(config, enviar(_executor, funcion, config, *args)) for config in DATASETS_CONFIG]
+    for config, futuro in futuros:
+        try:
+            salidas.append((config, futuro.result(timeout=max(0.0, limite - time.monotonic()))))
+        except FuturesTimeoutError:
+            # cancel() only succeeds while the product is still waiting for a worker
+            if futuro.cancel():
+                fase = 'cola'
+                log.warning("%s expiró en cola tras %.0fs (pool de %d workers ocupado)",
+                            config["short_name"], timeout_producto, MAX_WORKERS)
+            else:
+                fase = 'lectura'
+                log.warning("%s superó el plazo de %.0fs", config["short_name"], timeout_producto)
+            expirados.append(config["contaminante"])
+            PRODUCTOS_EXPIRADOS.inc(producto=config["contaminante"], fase=fase)
+        except Exception as e:
+            _fallido(config, e)
+            salidas.append((config, vacio))
+            fallidos.append(config["contaminante"])
+    return salidas, expirados, fallidos
+
+def consultar_tempo_coordenada(lat, lon, concurrente=None, timeout_producto=None, relleno=False):
+    """
+    Consulta NO2, O3 y HCHO para una coordenada.
+
+    En modo concurrente los tres productos se procesan en paralelo con un plazo
+    común; los que no terminan a tiempo se listan en 'productos_expirados', los
+    que fallan (CMR, HTTP, HDF5) en 'productos_fallidos', y el resto se devuelve
+    igualmente (resultado parcial). 'horas_granulo' da la
+    hora del granulo del que sale cada contaminante (anterior al último si
+    relleno=True tuvo que retroceder).
+    """
+    log.debug("Consultando datos para %.6f, %.6f", lat, lon)
     
-    if suma_confianzas == 0: return None
+    salidas, expirados, fallidos = _ejecutar_por_producto(
+        _consultar_producto, (lat, lon, _ventana_temporal(), relleno), concurrente, timeout_producto,
+        vacio=((None, None), 0)
+    )
     
-    indice_final = suma_ponderada / suma_confianzas
+    resultados = {'tiene_datos': False, 'contaminantes': {}, 'productos_expirados': expirados,
+                  'productos_fallidos': fallidos, 'bytes_leidos': {}, 'horas_granulo': {}}
+    for config, ((vars_dict, hora), bytes_leidos) in salidas:
+        resultados['bytes_leidos'][config["contaminante"]] = bytes_leidos
+        if vars_dict:
+            resultados['contaminantes'][config["contaminante"]] = vars_dict
+            resultados['horas_granulo'][config["contaminante"]] = hora
+            resultados['tiene_datos'] = True
     
-    num_altos = sum(1 for idx in subindices if idx > 150)
-    if num_altos >= 2:
-        indice_final *= 1.15
+    return resultados
+
+def _consultar_producto_lote(config, lats, lons, temporal):
+    """
+    Un producto para muchos puntos: agrupa los puntos por granulo, abre cada
+    granulo una sola vez y extrae todos sus puntos con una lectura por variable.
+    """
+    lectura = _leer_almacen_columnar(config, lats, lons)
+    if lectura is not None:
+        return [vars_dict if _es_valido(vars_dict) else None for vars_dict in _filas(lectura[0], len(lats))], 0
     
-    return min(500, max(0, int(indice_final)))
-
-def get_color_from_score(aqi):
-    if aqi is None: return '#808080'
-    if aqi <= 50: return '#00E400'
-    if aqi <= 100: return '#FFFF00'
-    if aqi <= 150: return '#FF7E00'
-    if aqi <= 200: return '#FF0000'
-    if aqi <= 300: return '#8F3F97'
-    return '#7E0023'
-
-def get_categoria(aqi):
-    if aqi is None: return "Sin datos"
-    if aqi <= 50: return "Bueno"
-    if aqi <= 100: return "Moderado"
-    if aqi <= 150: return "Poco saludable para sensibles"
-    if aqi <= 200: return "Poco saludable"
-    if aqi <= 300: return "Muy poco saludable"
-    return "Peligroso"
-
-def consultar_tempo_coordenada(lat, lon):
-    print(f"\n--- Consultando datos para {lat:.6f}, {lon:.6f} ---")
+    grupos = {}
+    for k in range(len(lats)):
+        granulos = buscar_granulos(config, lats[k], lons[k], temporal)
+        if granulos:
+            grupos.setdefault(id_granulo(granulos[0]), (granulos[0], []))[1].append(k)
     
-    fecha_fin = datetime.now()
-    fecha_inicio = fecha_fin - timedelta(days=30)
-    temporal = (fecha_inicio.strftime('%Y-%m-%d'), fecha_fin.strftime('%Y-%m-%d'))
+    log.debug("%s: %d puntos en %d granulos", config["short_name"], len(lats), len(grupos))
     
-    datasets_config = [
-        {"short_name": "TEMPO_NO2_L3", "version": "V03", "contaminante": "NO2"},
-        {"short_name": "TEMPO_O3TOT_L3", "version": "V03", "contaminante": "O3"},
-        {"short_name": "TEMPO_HCHO_L3", "version": "V03", "contaminante": "HCHO"},
-    ]
+    salida = [None] * len(lats)
+    bytes_leidos = 0
+    for granulo, indices in grupos.values():
+        lectura = leer_puntos_granulo(granulo, lats[indices], lons[indices], _clave_rejilla(config))
+        if lectura is None: continue
+        bytes_leidos += lectura[3]
+        for k, vars_dict in zip(indices, _filas(lectura[0], len(indices))):
+            if _es_valido(vars_dict): salida[k] = vars_dict
+    return salida, bytes_leidos
+
+def consultar_tempo_lote(coordenadas, concurrente=None, timeout_producto=None):
+    """
+    Consulta NO2, O3 y HCHO para muchas coordenadas a la vez.
+    Devuelve (lista con el mismo formato que consultar_tempo_coordenada,
+    bytes leídos por producto).
+    """
+    log.debug("Consultando datos para %d coordenadas", len(coordenadas))
     
-    resultados = {'tiene_datos': False, 'contaminantes': {}}
+    lats = np.array([float(c['lat']) for c in coordenadas])
+    lons = np.array([float(c['lon']) for c in coordenadas])
+    salidas, expirados, fallidos = _ejecutar_por_producto(
+        _consultar_producto_lote, (lats, lons, _ventana_temporal()), concurrente, timeout_producto,
+        vacio=([None] * len(lats), 0)
+    )
     
-    for config in datasets_config:
-        print(f"\n  [DEBUG] Buscando {config['short_name']}...")
-        
-        try:
-            results = earthaccess.search_data(
-                short_name=config["short_name"], version=config["version"],
-                temporal=temporal, bounding_box=(lon - 0.5, lat - 0.5, lon + 0.5, lat + 0.5),
-                count=1
-            )
-            
-            print(f"  [DEBUG] Granules encontrados: {len(results)}")
-            if not results: continue
-            
-            files = earthaccess.open(results[:1])
-            print(f"  [DEBUG] Archivos abiertos: {len(files)}")
-            if not files: continue
+    lote = [{'tiene_datos': False, 'contaminantes': {}, 'productos_expirados': expirados,
+             'productos_fallidos': fallidos} for _ in coordenadas]
+    bytes_leidos = {}
+    for config, (por_punto, bytes_producto) in salidas:
+        bytes_leidos[config["contaminante"]] = bytes_producto
+        for resultados, vars_dict in zip(lote, por_punto):
+            if vars_dict:
+                resultados['contaminantes'][config["contaminante"]] = vars_dict
+                resultados['tiene_datos'] = True
+    return lote, bytes_leidos
 
-            ds_root = xr.open_dataset(files[0], engine='h5netcdf')
-            ds_product = xr.open_dataset(files[0], engine='h5netcdf', group='product')
-            
-            if 'latitude' not in ds_root.coords or 'longitude' not in ds_root.coords:
-                print("  [DEBUG] ✗ No se encontraron coordenadas 'latitude'/'longitude' en el archivo.")
-                ds_root.close(); ds_product.close(); continue
-            
-            lat_arr = ds_root['latitude'].values
-            lon_arr = ds_root['longitude'].values
-            lat_idx = np.abs(lat_arr - lat).argmin()
-            lon_idx = np.abs(lon_arr - lon).argmin()
-            
-            print(f"  [DEBUG] Coordenada de píxel más cercano: {lat_arr[lat_idx]:.4f}, {lon_arr[lon_idx]:.4f}")
-            
-            vars_dict = {}
-            variables_a_extraer = {
-                'troposphere': 'vertical_column_troposphere',
-                'uncertainty': 'vertical_column_troposphere_uncertainty',
-                'stratosphere': 'vertical_column_stratosphere',
-                'quality_flag': 'main_data_quality_flag'
+# Neighbourhood mode: instead of the single nearest pixel (often NaN or
+# flagged), aggregate every valid pixel within 'radio' metres of the point.
+MAX_RADIO_VECINDARIO = float(os.environ.get('TEMPO_MAX_RADIO_VECINDARIO', '50000'))
+
+def _consultar_producto_vecindario(config, lat, lon, radio, temporal):
+    """Como _consultar_producto sobre un vecindario: ((vars_dict o None, píxeles), bytes leídos)."""
+    lectura = almacen_columnar.leer_ventana(config["contaminante"], lat, lon, radio) if almacen_columnar else None
+    if lectura is None:
+        results = buscar_granulos(config, lat, lon, temporal)
+        if not results: return (None, None), 0
+        lectura = leer_ventana_granulo(results[0], lat, lon, radio, _clave_rejilla(config))
+        if lectura is None: return (None, None), 0
+    ventana, mascara, bytes_leidos = lectura
+    vars_dict, pixeles = agregar_vecindario(ventana, mascara)
+    log.debug("%s: %d/%d píxeles válidos -> %s", config["short_name"], pixeles['validos'], pixeles['en_radio'], vars_dict)
+    return (vars_dict, pixeles), bytes_leidos
+
+def consultar_tempo_vecindario(lat, lon, radio, concurrente=None, timeout_producto=None):
+    """
+    consultar_tempo_coordenada agregando los píxeles válidos dentro de `radio`
+    metros. Añade 'pixeles': {contaminante: {'validos', 'en_radio'}}.
+    """
+    log.debug("Consultando vecindario de %.0f m en %.6f, %.6f", radio, lat, lon)
+    
+    salidas, expirados, fallidos = _ejecutar_por_producto(
+        _consultar_producto_vecindario, (lat, lon, radio, _ventana_temporal()), concurrente, timeout_producto,
+        vacio=((None, None), 0)
+    )
+    
+    resultados = {'tiene_datos': False, 'contaminantes': {}, 'productos_expirados': expirados,
+                  'productos_fallidos': fallidos, 'bytes_leidos': {}, 'pixeles': {}}
+    for config, ((vars_dict, pixeles), bytes_leidos) in salidas:
+        resultados['bytes_leidos'][config["contaminante"]] = bytes_leidos
+        if pixeles is not None:
+            resultados['pixeles'][config["contaminante"]] = pixeles
+        if vars_dict:
+            resultados['contaminantes'][config["contaminante"]] = vars_dict
+            resultados['tiene_datos'] = True
+    
+    return resultados
+
+# Zonal statistics: a polygon (GeoJSON, or a named region from the
+# TEMPO_REGIONES FeatureCollection) is rasterized onto each product grid once
+# and its pixel indices kept in an LRU, so a repeated region costs one gather
+# per product instead of a new rasterization.
+REGIONES_ARCHIVO = os.environ.get('TEMPO_REGIONES')  # e.g. data/regiones.geojson
+# Bounding-box area limit in square degrees (25 ≈ 60k TEMPO pixels)
+MAX_AREA_REGION = float(os.environ.get('TEMPO_MAX_AREA_REGION', '25'))
+CACHE_MASCARAS_MAX = int(os.environ.get('TEMPO_CACHE_MASCARAS_MAX', '128'))
+PERCENTIL_REGION = 90
+
+catalogo_regiones = CatalogoRegiones(REGIONES_ARCHIVO) if REGIONES_ARCHIVO else None
+
+class CacheMascaras:
+    """LRU de los píxeles (filas, columnas) de cada región por rejilla de producto."""
+
+    def __init__(self, max_entradas=CACHE_MASCARAS_MAX):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def pixeles(self, clave_region, anillos, clave_rejilla, indice):
+        clave = (clave_rejilla, indice.forma, clave_region)
+        with self._lock:
+            pixeles = self._entradas.get(clave)
+            if pixeles is not None:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return pixeles
+            self.fallos += 1
+        with tramo('rasterizado', _producto_rejilla(clave_rejilla)):
+            pixeles = rasterizar(anillos, indice.latitudes, indice.longitudes)
+        with self._lock:
+            self._entradas[clave] = pixeles
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return pixeles
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
             }
 
-            for nombre_interno, nombre_tempo in variables_a_extraer.items():
-                if nombre_tempo in ds_product.data_vars:
-                    var = ds_product[nombre_tempo]
-                    selector = {'latitude': lat_idx, 'longitude': lon_idx}
-                    if 'time' in var.dims: selector['time'] = 0
-                    valor = var.isel(**selector).values
-                    vars_dict[nombre_interno] = float(valor)
-                    print(f"    - {nombre_interno}: {float(valor):.2e}")
+cache_mascaras = CacheMascaras()
 
-            if vars_dict and not np.isnan(vars_dict.get('troposphere', np.nan)):
-                resultados['contaminantes'][config["contaminante"]] = vars_dict
-                resultados['tiene_datos'] = True
-                print("  [DEBUG] ✓ Datos válidos guardados.")
-            else:
-                print("  [DEBUG] ✗ El valor principal es NaN o no hay datos.")
+def estadisticas_region(valores, percentil=PERCENTIL_REGION):
+    """
+    Agrega los píxeles de una región con troposphere finito y sin
+    quality_flag > 0. Devuelve (vars_dict con las medias o None si no hay
+    ninguno válido, {'validos', 'en_region', 'media', 'maximo', 'p{percentil}'}).
+    """
+    trop = valores.get('troposphere')
+    resumen = {'validos': 0, 'en_region': 0 if trop is None else int(trop.size)}
+    if trop is None: return None, resumen
+    validos = np.isfinite(trop)
+    if 'quality_flag' in valores:
+        validos &= ~(valores['quality_flag'] > 0)
+    resumen['validos'] = int(validos.sum())
+    if not resumen['validos']: return None, resumen
 
-            
-            ds_root.close()
-            ds_product.close()
+    vars_dict = {
+        nombre: float(np.nanmean(datos[validos])) if np.isfinite(datos[validos]).any() else float('nan')
+        for nombre, datos in valores.items() if nombre != 'quality_flag'
+    }
+    vars_dict['quality_flag'] = 0.0
+    resumen['media'] = vars_dict['troposphere']
+    resumen['maximo'] = float(trop[validos].max())
+    resumen[f'p{percentil:g}'] = float(np.percentile(trop[validos], percentil))
+    return vars_dict, resumen
+
+def _consultar_producto_region(config, clave_region, anillos, percentil, temporal):
+    """Como _consultar_producto sobre una región: ((vars_dict o None, resumen), bytes leídos)."""
+    clave_rejilla = _clave_rejilla(config)
+    def pixeles(indice):
+        return cache_mascaras.pixeles(clave_region, anillos, clave_rejilla, indice)
+
+    lectura = almacen_columnar.leer_pixeles(config["contaminante"], pixeles) if almacen_columnar else None
+    if lectura is None:
+        lat, lon = centroide(anillos)
+        results = buscar_granulos(config, lat, lon, temporal)
+        if not results: return (None, None), 0
+        lectura = leer_region_granulo(results[0], pixeles, clave_rejilla)
+        if lectura is None: return (None, None), 0
+    valores, bytes_leidos = lectura
+    vars_dict, resumen = estadisticas_region(valores, percentil)
+    log.debug("%s: %d/%d píxeles válidos en la región", config["short_name"], resumen['validos'], resumen['en_region'])
+    return (vars_dict, resumen), bytes_leidos
+
+def consultar_tempo_region(clave_region, anillos, percentil=PERCENTIL_REGION, concurrente=None, timeout_producto=None):
+    """
+    Estadísticas zonales de los tres productos sobre un polígono. 'contaminantes'
+    lleva las medias (de ellas sale el AQI de la región) y 'pixeles' el resumen
+    de estadisticas_region por contaminante.
+    """
+    salidas, expirados, fallidos = _ejecutar_por_producto(
+        _consultar_producto_region, (clave_region, anillos, percentil, _ventana_temporal()),
+        concurrente, timeout_producto, vacio=((None, None), 0)
+    )
+
+    resultados = {'tiene_datos': False, 'contaminantes': {}, 'productos_expirados': expirados,
+                  'productos_fallidos': fallidos, 'bytes_leidos': {}, 'pixeles': {}}
+    for config, ((vars_dict, resumen), bytes_leidos) in salidas:
+        resultados['bytes_leidos'][config["contaminante"]] = bytes_leidos
+        if resumen is not None:
+            resultados['pixeles'][config["contaminante"]] = resumen
+        if vars_dict:
+            resultados['contaminantes'][config["contaminante"]] = vars_dict
+            resultados['tiene_datos'] = True
 
-        except Exception as e:
-            print(f"  [DEBUG] ‼️ ERROR al procesar {config['short_name']}: {type(e).__name__} - {e}")
-            traceback.print_exc() # Imprime el traceback completo para más detalles
-            continue
-    
     return resultados
 
+# Rolling aggregates: api/_acumulados.py keeps per-pixel 8-hour and daily
+# running sums from the columnar store and publishes each window as another
+# columnar store (mean of each variable plus 'maximo' and 'cuenta', the number
+# of valid hours). A window is served while its last hour is within the window
+# length of now; modes '8h' and 'diario' are then a memmap lookup.
+ACUMULADOS_DIR = os.environ.get('TEMPO_ACUMULADOS_DIR')  # e.g. /tmp/tempo_acumulados
+VENTANAS_ACUMULADO = {'8h': 8, 'diario': 24}
+MAX_PIXELES_CAJA = int(os.environ.get('TEMPO_MAX_PIXELES_CAJA', '10000'))
+
+almacenes_acumulados = {
+    ventana: AlmacenColumnar(
+        os.path.join(ACUMULADOS_DIR, ventana), max_edad_h=horas,
+        variables=tuple(VARIABLES_A_EXTRAER) + ('maximo', 'cuenta')
+    )
+    for ventana, horas in VENTANAS_ACUMULADO.items()
+} if ACUMULADOS_DIR else {}
+
+def _vars_acumulado(valores, k):
+    """vars_dict de la posición k de unas columnas del almacén de acumulados, o None sin horas válidas."""
+    if not np.isfinite(valores['troposphere'][k]): return None
+    vars_dict = {nombre: float(columna[k]) for nombre, columna in valores.items() if nombre != 'cuenta'}
+    vars_dict['quality_flag'] = 0.0
+    vars_dict['cuenta'] = int(valores['cuenta'][k]) if 'cuenta' in valores else 0
+    return vars_dict
+
+def consultar_tempo_acumulado(ventana, lats, lons):
+    """
+    Medias móviles de `ventana` en cada punto: una lectura del memmap por
+    producto. Devuelve (lista de datos por punto como consultar_tempo_lote,
+    {contaminante: hora final de la ventana}, {contaminante: {'horas', 'completa'}}).
+    """
+    almacen = almacenes_acumulados[ventana]
+    lote = [{'tiene_datos': False, 'contaminantes': {}, 'productos_expirados': []} for _ in lats]
+    horas, cobertura, columnas = {}, {}, {}
+    for config in DATASETS_CONFIG:
+        contaminante = config["contaminante"]
+        lectura = almacen.leer_puntos(contaminante, lats, lons)
+        if lectura is None: continue
+        horas[contaminante] = almacen.hora_particion(contaminante)
+        cobertura[contaminante] = almacen.cobertura_particion(contaminante)
+        valores = lectura[0]
+        columnas[contaminante] = {nombre: valores[nombre] for nombre in VARIABLES_A_EXTRAER if nombre in valores}
+        columnas[contaminante]['quality_flag'] = np.zeros(len(lats))
+        for k, datos in enumerate(lote):
+            vars_dict = _vars_acumulado(valores, k)
+            if vars_dict:
+                datos['contaminantes'][contaminante] = vars_dict
+                datos['tiene_datos'] = True
+    # Scored once for every point; _armar_resultado uses it instead of the scalar path
+    aqi = calcular_indice_realista_array(columnas, nan_como_ausente=True) if columnas else np.full(len(lats), np.nan)
+    for datos, valor in zip(lote, np.broadcast_to(aqi, (len(lats),))):
+        datos['aqi'] = None if np.isnan(valor) else int(valor)
+    return lote, horas, cobertura
+
+def pixeles_caja(ventana, lat_min, lon_min, lat_max, lon_max):
+    """Centros (lats, lons) de los píxeles de la rejilla de la ventana dentro de la caja, o None sin datos."""
+    almacen = almacenes_acumulados[ventana]
+    for config in DATASETS_CONFIG:
+        particion = almacen.particion(config["contaminante"])
+        if particion is None: continue
+        indice = particion['indice']
+        filas = np.flatnonzero((indice.latitudes >= lat_min) & (indice.latitudes <= lat_max))
+        columnas = np.flatnonzero((indice.longitudes >= lon_min) & (indice.longitudes <= lon_max))
+        mallas = np.meshgrid(indice.latitudes[filas], indice.longitudes[columnas], indexing='ij')
+        return mallas[0].ravel(), mallas[1].ravel()
+    return None
+
+MAX_PUNTOS_LOTE = int(os.environ.get('TEMPO_MAX_PUNTOS_LOTE', '1000'))
+# TEMPO L3 field of regard (lat_min, lat_max, lon_min, lon_max); points outside it
+# would otherwise be snapped silently to the grid's edge pixel
+DOMINIO_TEMPO = tuple(float(v) for v in os.environ.get('TEMPO_DOMINIO', '14,73,-168,-13').split(','))
+
+def coordenadas_fuera_de_dominio(lats, lons):
+    """Mensaje de error si alguna coordenada no es finita o cae fuera de DOMINIO_TEMPO; None si todas valen."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    lat_min, lat_max, lon_min, lon_max = DOMINIO_TEMPO
+    if not (np.isfinite(lats).all() and np.isfinite(lons).all()):
+        return 'Coordenadas no finitas'
+    if ((lats < lat_min) | (lats > lat_max) | (lons < lon_min) | (lons > lon_max)).any():
+        return f'Coordenadas fuera del área de TEMPO (lat {lat_min:g}..{lat_max:g}, lon {lon_min:g}..{lon_max:g})'
+    return None
+
+def parsear_bandera(valor, por_defecto=False):
+    """true/false de JSON o de un formulario ('true', '1', 'false', '0'); ValueError con cualquier otra cosa."""
+    if valor is None: return por_defecto
+    if isinstance(valor, bool): return valor
+    if isinstance(valor, int) and valor in (0, 1): return bool(valor)
+    if isinstance(valor, str) and valor.strip().lower() in ('true', '1', 'false', '0'):
+        return valor.strip().lower() in ('true', '1')
+    raise ValueError(f'valor booleano inválido: {valor!r}')
+
+def generar_coordenadas(lat, lon, num_coordenadas, radio):
+    """Centro más (num_coordenadas - 1) puntos repartidos en un círculo de `radio` metros."""
+    coordenadas = [{'lat': lat, 'lon': lon}]
+    n_anillo = num_coordenadas - 1
+    dlat = radio / METROS_POR_GRADO
+    dlon = radio / (METROS_POR_GRADO * max(math.cos(math.radians(lat)), 1e-6))
+    for k in range(n_anillo):
+        angulo = 2 * math.pi * k / n_anillo
+        coordenadas.append({
+            'lat': lat + dlat * math.sin(angulo),
+            'lon': lon + dlon * math.cos(angulo),
+        })
+    return coordenadas
+
+def _armar_resultado(lat, lon, datos):
+    aqi = datos['aqi'] if 'aqi' in datos else calcular_indice_realista(datos['contaminantes'])
+    resultado = {
+        'lat': lat, 'lon': lon,
+        'tiene_datos': datos['tiene_datos'],
+        'contaminantes': datos['contaminantes'],
+        'productos_expirados': datos.get('productos_expirados', []),
+        'productos_fallidos': datos.get('productos_fallidos', []),
+        'aqi_satelital': aqi,
+        'categoria': get_categoria(aqi),
+        'color': get_color_from_score(aqi)
+    }
+    if 'pixeles' in datos:
+        resultado['pixeles'] = datos['pixeles']
+    if datos.get('horas_granulo'):
+        resultado['horas_granulo'] = datos['horas_granulo']
+    return resultado
+
+# Response cache: results of consultar_tempo_coordenada keyed by the TEMPO pixel
+# each product resolves to and the granule it was read from, so every point in
+# the same pixel shares one entry. A new granule changes the key by itself; the
+# TTL (one hourly TEMPO scan by default) only bounds how long stale keys live.
+CACHE_RESPUESTAS = os.environ.get('TEMPO_CACHE_RESPUESTAS', '1') != '0'
+CACHE_RESPUESTAS_TTL = int(os.environ.get('TEMPO_CACHE_RESPUESTAS_TTL', '3600'))
+CACHE_RESPUESTAS_MAX = int(os.environ.get('TEMPO_CACHE_RESPUESTAS_MAX', '4096'))
+
+class CacheRespuestas:
+    """
+    Cache LRU con TTL de resultados por píxel, con coalescencia: las peticiones
+    concurrentes de una clave que se está calculando esperan a ese único cálculo.
+    """
+
+    def __init__(self, max_entradas=CACHE_RESPUESTAS_MAX, ttl=CACHE_RESPUESTAS_TTL):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._en_curso = {}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.coalescidas = 0
+
+    def _vigente(self, clave):
+        entrada = self._entradas.get(clave)
+        if entrada is None: return None
+        expira, datos = entrada
+        if expira <= time.time():
+            del self._entradas[clave]
+            return None
+        self._entradas.move_to_end(clave)
+        return datos
+
+    def obtener(self, clave):
+        with self._lock:
+            datos = self._vigente(clave)
+            if datos is None:
+                self.fallos += 1
+            else:
+                self.aciertos += 1
+            return datos
+
+    def guardar(self, clave, datos):
+        with self._lock:
+            self._entradas[clave] = (time.time() + self.ttl, datos)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def obtener_o_calcular(self, clave, calcular, cacheable=lambda datos: True):
+        """Devuelve (datos, 'HIT' | 'MISS' | 'COALESCED'); calcular() sólo corre en el primero."""
+        with self._lock:
+            datos = self._vigente(clave)
+            if datos is not None:
+                self.aciertos += 1
+                return datos, 'HIT'
+            futuro = self._en_curso.get(clave)
+            lider = futuro is None
+            if lider:
+                futuro = self._en_curso[clave] = Future()
+                self.fallos += 1
+            else:
+                self.coalescidas += 1
+        if not lider:
+            return futuro.result(), 'COALESCED'
+
+        try:
+            datos = calcular()
+        except BaseException as e:
+            with self._lock:
+                del self._en_curso[clave]
+            futuro.set_exception(e)
+            raise
+        if cacheable(datos):
+            self.guardar(clave, datos)
+        with self._lock:
+            del self._en_curso[clave]
+        futuro.set_result(datos)
+        return datos, 'MISS'
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos + self.coalescidas
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'coalescidas': self.coalescidas,
+                'tasa_aciertos': (self.aciertos + self.coalescidas) / total if total else 0.0,
+                'entradas': len(self._entradas),
+                'en_curso': len(self._en_curso),
+                'max_entradas': self.max_entradas,
+                'ttl': self.ttl,
+            }
+
+cache_respuestas = CacheRespuestas()
+
+def _partes_clave(config, lats, lons, temporal):
+    """(contaminante, granulo, fila, columna) de cada punto, o None si la rejilla aún no está indexada."""
+    particion = almacen_columnar.particion(config["contaminante"]) if almacen_columnar else None
+    if particion is not None:
+        filas, columnas = particion['indice'].indices(lats, lons)
+        return [(config["contaminante"], particion['granulo'], int(i), int(j)) for i, j in zip(filas, columnas)]
+    with _lock_indices_rejilla:
+        indice = _indices_rejilla.get(_clave_rejilla(config))
+    partes = []
+    for k in range(len(lats)):
+        granulos = buscar_granulos(config, lats[k], lons[k], temporal)
+        if not granulos:
+            partes.append((config["contaminante"], None))
+        elif indice is None:
+            partes.append(None)
+        else:
+            filas, columnas = indice.indices(lats[k:k + 1], lons[k:k + 1])
+            partes.append((config["contaminante"], id_granulo(granulos[0]), int(filas[0]), int(columnas[0])))
+    return partes
+
+def claves_respuesta(lats, lons):
+    """
+    Clave de cache de cada punto: el píxel y el granulo de cada producto. None
+    para los puntos que todavía no se pueden situar (rejilla sin indexar, error
+    o plazo agotado en la búsqueda); esos puntos se consultan sin cache.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    try:
+        salidas, expirados, fallidos = _ejecutar_por_producto(_partes_clave, (lats, lons, _ventana_temporal()))
+    except Exception as e:
+        log.info("Cache de respuestas: no se pudo calcular la clave (%s - %s)", type(e).__name__, e)
+        return [None] * len(lats)
+    if expirados or fallidos:
+        return [None] * len(lats)
+    claves = []
+    for k in range(len(lats)):
+        partes = tuple(por_punto[k] for _, por_punto in salidas)
+        claves.append(None if None in partes else partes)
+    return claves
+
+def _cacheable(datos):
+    # Partial results (a product hit its deadline or failed upstream) are not worth pinning for an hour
+    return not datos.get('productos_expirados') and not datos.get('productos_fallidos')
+
+def _sin_bytes(datos):
+    return {clave: valor for clave, valor in datos.items() if clave != 'bytes_leidos'}
+
+def consultar_tempo_coordenada_cacheada(lat, lon, radio=None, relleno=False):
+    """
+    consultar_tempo_coordenada (o consultar_tempo_vecindario si se da `radio`)
+    detrás de cache_respuestas. Devuelve (datos, estado de cache).
+    """
+    def consultar():
+        if radio: return consultar_tempo_vecindario(lat, lon, radio)
+        return consultar_tempo_coordenada(lat, lon, relleno=relleno)
+
+    def clave_respuesta():
+        # A neighbourhood is keyed by its centre pixel plus the radius; gap-filled
+        # answers apart from plain ones, since they may come from older granules
+        clave = claves_respuesta(lat, lon)[0]
+        if clave is None: return None
+        if radio: return clave + (('vecindario', radio),)
+        return clave + (('relleno',),) if relleno else clave
+
+    if not CACHE_RESPUESTAS:
+        return consultar(), 'BYPASS'
+
+    clave = clave_respuesta()
+    if clave is None:
+        # Cold grid index: compute directly, then file the result under its real key
+        datos = consultar()
+        clave = clave_respuesta()
+        if clave is not None and _cacheable(datos):
+            cache_respuestas.guardar(clave, _sin_bytes(datos))
+        return datos, 'MISS'
+
+    calculados = {}
+    def calcular():
+        calculados['datos'] = consultar()
+        return _sin_bytes(calculados['datos'])
+
+    datos, estado = cache_respuestas.obtener_o_calcular(clave, calcular, _cacheable)
+    if estado == 'MISS':
+        return calculados['datos'], estado
+    # Served from memory: nothing was read for this request
+    return dict(datos, bytes_leidos={config["contaminante"]: 0 for config in DATASETS_CONFIG}), estado
+
+def consultar_tempo_lote_cacheado(coordenadas):
+    """
+    consultar_tempo_lote consultando sólo los puntos que no están en cache.
+    Devuelve (lote, bytes leídos, estado: 'HIT' | 'MISS' | 'PARTIAL' | 'BYPASS', puntos en cache).
+    """
+    if not CACHE_RESPUESTAS:
+        return consultar_tempo_lote(coordenadas) + ('BYPASS', 0)
+
+    lats = [c['lat'] for c in coordenadas]
+    lons = [c['lon'] for c in coordenadas]
+    claves = claves_respuesta(lats, lons)
+    lote = [cache_respuestas.obtener(clave) if clave is not None else None for clave in claves]
+    faltan = [k for k, datos in enumerate(lote) if datos is None]
+    en_cache = len(coordenadas) - len(faltan)
+
+    bytes_leidos = {config["contaminante"]: 0 for config in DATASETS_CONFIG}
+    if faltan:
+        calculados, bytes_leidos = consultar_tempo_lote([coordenadas[k] for k in faltan])
+        if any(claves[k] is None for k in faltan):
+            nuevas = claves_respuesta([lats[k] for k in faltan], [lons[k] for k in faltan])
+            for k, clave in zip(faltan, nuevas):
+                claves[k] = clave
+        for k, datos in zip(faltan, calculados):
+            lote[k] = datos
+            if claves[k] is not None and _cacheable(datos):
+                cache_respuestas.guardar(claves[k], datos)
+
+    estado = 'HIT' if not faltan else ('MISS' if not en_cache else 'PARTIAL')
+    return lote, bytes_leidos, estado, en_cache
+
 # EXACT SAME BUSINESS LOGIC AS ORIGINAL get_tempo_data() function
 def process_tempo_request(data):
-    """Same logic as original get_tempo_data route"""
+    """
+    Same logic as original get_tempo_data route.
+
+    Batch mode: pass 'puntos' ([{lat, lon}, ...]) or 'num_coordenadas' > 1 with
+    'radio' in metres around lat/lon; every granule is then opened only once.
+
+    Neighbourhood mode: 'modo': 'vecindario' with 'radio' aggregates every
+    valid pixel within the radius into one result (see agregar_vecindario).
+
+    Gap-fill: 'relleno': true makes a single point fall back to older granules
+    when the latest one has no valid pixel (see rellenar_producto).
+
+    Region mode: 'modo': 'region' with 'geometria' (GeoJSON Polygon,
+    MultiPolygon or Feature) or 'region' (a name in TEMPO_REGIONES) returns
+    quality-masked zonal statistics and the AQI of the regional means.
+
+    Rolling modes: 'modo': '8h' or 'diario' score the per-pixel 8-hour or
+    daily means at lat/lon, or at every pixel of 'bbox' (see api/_acumulados.py).
+    """
+    puntos = data.get('puntos')
     lat_centro = data.get('lat')
     lon_centro = data.get('lon')
     
-    if not lat_centro or not lon_centro:
-        return {'error': 'Coordenadas requeridas'}, 400
+    if data.get('modo') == 'vecindario':
+        return _procesar_vecindario(data)
+    if data.get('modo') == 'region':
+        return _procesar_region(data)
+    if data.get('modo') in VENTANAS_ACUMULADO:
+        return _procesar_acumulado(data)
     
-    coordenadas = [{'lat': lat_centro, 'lon': lon_centro}]
+    if puntos:
+        if not isinstance(puntos, list):
+            return {'error': 'Formato de puntos inválido'}, 400
+        if len(puntos) > MAX_PUNTOS_LOTE:
+            return {'error': f'Máximo {MAX_PUNTOS_LOTE} coordenadas por petición'}, 400
+        try:
+            coordenadas = [{'lat': float(p['lat']), 'lon': float(p['lon'])} for p in puntos]
+        except (KeyError, TypeError, ValueError):
+            return {'error': 'Formato de puntos inválido'}, 400
+    else:
+        if lat_centro is None or lon_centro is None:
+            return {'error': 'Coordenadas requeridas'}, 400
+        try:
+            lat_centro, lon_centro = float(lat_centro), float(lon_centro)
+        except (TypeError, ValueError):
+            return {'error': 'Coordenadas inválidas'}, 400
+        try:
+            num_coordenadas = int(data.get('num_coordenadas') or 1)
+            radio = float(data.get('radio') or 0)
+        except (TypeError, ValueError):
+            return {'error': "'num_coordenadas' y 'radio' deben ser numéricos"}, 400
+        # Checked before generating anything: the ring is built point by point
+        if num_coordenadas > MAX_PUNTOS_LOTE:
+            return {'error': f'Máximo {MAX_PUNTOS_LOTE} coordenadas por petición'}, 400
+        if not math.isfinite(radio) or radio < 0:
+            return {'error': "'radio' debe ser un número de metros no negativo"}, 400
+        if num_coordenadas > 1 and radio > 0:
+            coordenadas = generar_coordenadas(lat_centro, lon_centro, num_coordenadas, radio)
+        else:
+            coordenadas = [{'lat': lat_centro, 'lon': lon_centro}]
     
-    resultados = []
+    error = coordenadas_fuera_de_dominio([c['lat'] for c in coordenadas], [c['lon'] for c in coordenadas])
+    if error:
+        return {'error': error}, 400
+    try:
+        relleno = parsear_bandera(data.get('relleno'), RELLENO_POR_DEFECTO)
+    except ValueError:
+        return {'error': "'relleno' debe ser true o false"}, 400
     
-    for coord in coordenadas:
-        lat, lon = coord['lat'], coord['lon']
-        datos = consultar_tempo_coordenada(lat, lon)
-        
-        aqi = calcular_indice_realista(datos['contaminantes'])
-        color = get_color_from_score(aqi)
-        categoria = get_categoria(aqi)
-        
-        resultado = {
-            'lat': lat, 'lon': lon,
-            'tiene_datos': datos['tiene_datos'],
-            'contaminantes': datos['contaminantes'],
-            'aqi_satelital': aqi,
-            'categoria': categoria,
-            'color': color
-        }
-        resultados.append(resultado)
+    if len(coordenadas) == 1:
+        lat, lon = coordenadas[0]['lat'], coordenadas[0]['lon']
+        datos, estado_cache = consultar_tempo_coordenada_cacheada(lat, lon, relleno=relleno)
+        bytes_leidos = datos['bytes_leidos']
+        with tramo('puntuacion'):
+            resultados = [_armar_resultado(lat, lon, datos)]
+    else:
+        lote, bytes_leidos, estado_cache, puntos_en_cache = consultar_tempo_lote_cacheado(coordenadas)
+        with tramo('puntuacion'):
+            resultados = [_armar_resultado(c['lat'], c['lon'], datos) for c, datos in zip(coordenadas, lote)]
+    
+    puntos_con_datos = sum(1 for r in resultados if r['tiene_datos'])
+    
+    if len(resultados) > 1:
+        log.info("Resultado: %d/%d puntos con datos", puntos_con_datos, len(resultados))
+    else:
+        log.info("Resultado: AQI %s (%s)", resultados[0]['aqi_satelital'], resultados[0]['categoria'])
+
+    if len(resultados) == 1:
+        return {'resultados': resultados, 'bytes_leidos': bytes_leidos, 'cache': estado_cache}, 200
+
+    respuesta = {
+        'total_puntos': len(resultados),
+        'puntos_con_datos': puntos_con_datos,
+        'resultados': resultados,
+        'bytes_leidos': bytes_leidos,
+        'cache': estado_cache,
+        'puntos_en_cache': puntos_en_cache,
+    }
+    if not puntos:
+        respuesta['coordenada_central'] = {'lat': lat_centro, 'lon': lon_centro}
+        respuesta['radio_metros'] = radio
+    return respuesta, 200
+
+def _procesar_vecindario(data):
+    try:
+        lat, lon = float(data['lat']), float(data['lon'])
+        radio = float(data.get('radio') or 0)
+    except (KeyError, TypeError, ValueError):
+        return {'error': 'Coordenadas requeridas'}, 400
+    error = coordenadas_fuera_de_dominio(lat, lon)
+    if error:
+        return {'error': error}, 400
+    if not 0 < radio <= MAX_RADIO_VECINDARIO:
+        return {'error': f"'radio' debe estar entre 0 y {MAX_RADIO_VECINDARIO:.0f} metros"}, 400
     
-    print("\n--- Resultado Final Enviado ---")
-    if aqi:
-        print(f"  AQI Calculado: {aqi} ({categoria})")
+    datos, estado_cache = consultar_tempo_coordenada_cacheada(lat, lon, radio)
+    with tramo('puntuacion'):
+        resultado = _armar_resultado(lat, lon, datos)
+    log.info("Resultado: AQI %s (%s), vecindario de %.0f m", resultado['aqi_satelital'], resultado['categoria'], radio)
+    return {
+        'resultados': [resultado],
+        'bytes_leidos': datos['bytes_leidos'],
+        'cache': estado_cache,
+        'modo': 'vecindario',
+        'radio_metros': radio,
+    }, 200
+
+def _procesar_region(data):
+    nombre = data.get('region')
+    if nombre is not None:
+        if catalogo_regiones is None:
+            return {'error': 'No hay regiones con nombre configuradas (TEMPO_REGIONES)'}, 503
+        if not isinstance(nombre, str) or not nombre.strip():
+            return {'error': "'region' debe ser un nombre"}, 400
+        try:
+            region = catalogo_regiones.obtener(nombre)
+        except (OSError, ValueError) as e:
+            log.warning("No se pudo cargar el catálogo de regiones %s: %s", catalogo_regiones.ruta, e)
+            return {'error': 'Catálogo de regiones no disponible (TEMPO_REGIONES)'}, 503
+        if region is None:
+            return {'error': f"Región desconocida: {nombre}"}, 404
+        nombre, geometria = region
+        clave_region = ('region', nombre)
     else:
-        print("  No se pudo calcular el AQI (sin datos válidos).")
-    print("-----------------------------\n")
+        geometria = data.get('geometria')
+        clave_region = None
+    if geometria is None:
+        return {'error': "'geometria' o 'region' requeridos"}, 400
+    try:
+        anillos = anillos_region(geometria)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    try:
+        percentil = float(data.get('percentil', PERCENTIL_REGION))
+    except (TypeError, ValueError):
+        percentil = -1
+    if not 0 <= percentil <= 100:
+        return {'error': "'percentil' debe estar entre 0 y 100"}, 400
+    lat_min, lat_max, lon_min, lon_max = caja(anillos)
+    if (lat_max - lat_min) * (lon_max - lon_min) > MAX_AREA_REGION:
+        return {'error': f'Región demasiado grande (máximo {MAX_AREA_REGION:g} grados cuadrados)'}, 400
+
+    datos = consultar_tempo_region(clave_region or ('geometria', huella(geometria)), anillos, percentil)
+    lat, lon = centroide(anillos)
+    with tramo('puntuacion'):
+        resultado = _armar_resultado(lat, lon, datos)
+    log.info("Resultado: AQI %s (%s), región %s", resultado['aqi_satelital'], resultado['categoria'], nombre or '-')
+    return {
+        'resultados': [resultado],
+        'bytes_leidos': datos['bytes_leidos'],
+        'modo': 'region',
+        'region': nombre,
+        'percentil': percentil,
+    }, 200
+
+def _procesar_acumulado(data):
+    ventana = data['modo']
+    if ventana not in almacenes_acumulados:
+        return {'error': 'Promedios móviles no disponibles (TEMPO_ACUMULADOS_DIR)'}, 503
+    bbox = data.get('bbox')
+    try:
+        if bbox is not None:
+            lat_min, lon_min, lat_max, lon_max = (float(v) for v in bbox)
+        else:
+            lats, lons = np.array([float(data['lat'])]), np.array([float(data['lon'])])
+    except (KeyError, TypeError, ValueError):
+        return {'error': "Coordenadas requeridas ('lat'/'lon' o 'bbox': [lat_min, lon_min, lat_max, lon_max])"}, 400
+    if bbox is None:
+        error = coordenadas_fuera_de_dominio(lats, lons)
+        if error:
+            return {'error': error}, 400
+    else:
+        pixeles = pixeles_caja(ventana, lat_min, lon_min, lat_max, lon_max)
+        if pixeles is None:
+            lats = lons = np.empty(0)
+        else:
+            lats, lons = pixeles
+        if lats.size > MAX_PIXELES_CAJA:
+            return {'error': f'Máximo {MAX_PIXELES_CAJA} píxeles por caja'}, 400
+
+    lote, horas, cobertura = consultar_tempo_acumulado(ventana, lats, lons)
+    with tramo('puntuacion'):
+        resultados = [_armar_resultado(float(lat), float(lon), datos) for lat, lon, datos in zip(lats, lons, lote)]
+    respuesta = {
+        'resultados': resultados,
+        'modo': ventana,
+        'ventana_horas': VENTANAS_ACUMULADO[ventana],
+        'hasta': horas,
+        # Fewer hours than the window (ingest retention, first hours after start): the mean is partial
+        'horas_cubiertas': {c: v['horas'] for c, v in cobertura.items()},
+        'ventana_completa': bool(cobertura) and all(v['completa'] for v in cobertura.values()),
+    }
+    if bbox is not None:
+        respuesta['total_puntos'] = len(resultados)
+        respuesta['puntos_con_datos'] = sum(1 for r in resultados if r['tiene_datos'])
+        respuesta['bbox'] = [lat_min, lon_min, lat_max, lon_max]
+    return respuesta, 200
+
+# Hourly history for one point: every granule in the range is read (one pixel
+# each) on a dedicated bounded pool, so a long range cannot starve /api/tempo.
+HISTORIAL_CONCURRENCIA = int(os.environ.get('TEMPO_HISTORIAL_CONCURRENCIA', '8'))
+HISTORIAL_MAX_DIAS = int(os.environ.get('TEMPO_HISTORIAL_MAX_DIAS', '31'))
+# Upper bound on granules per product (TEMPO scans roughly hourly in daylight)
+HISTORIAL_MAX_GRANULOS = int(os.environ.get('TEMPO_HISTORIAL_MAX_GRANULOS', '800'))
+_executor_historial = ThreadPoolExecutor(max_workers=HISTORIAL_CONCURRENCIA, thread_name_prefix='tempo-historial')
+
+def hora_granulo(granulo):
+    """Inicio del escaneo del granulo truncado a la hora ('2025-09-01T14:00:00Z') o None."""
+    try:
+        inicio = granulo['umm']['TemporalExtent']['RangeDateTime']['BeginningDateTime']
+        return inicio[:13] + ':00:00Z'
+    except (KeyError, TypeError):
+        pass
+    # Fall back to the scan time in the granule ID: TEMPO_NO2_L3_V03_20250901T140045Z_S005.nc
+    for parte in id_granulo(granulo).split('_'):
+        if len(parte) == 16 and parte[8] == 'T' and parte.endswith('Z') and parte[:8].isdigit():
+            return f"{parte[0:4]}-{parte[4:6]}-{parte[6:8]}T{parte[9:11]}:00:00Z"
+    return None
 
-    return {'resultados': resultados}, 200
+def _parsear_fecha(texto):
+    texto = str(texto).rstrip('Z')
+    for formato in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+    raise ValueError(f'Fecha inválida: {texto}')
+
+def validar_historial(data):
+    """Devuelve ((lat, lon, (inicio, fin)), None) o (None, (error, status))."""
+    try:
+        lat, lon = float(data['lat']), float(data['lon'])
+    except (KeyError, TypeError, ValueError):
+        return None, ({'error': 'Coordenadas requeridas'}, 400)
+    try:
+        fin = _parsear_fecha(data['fin']) if data.get('fin') else datetime.utcnow()
+        inicio = _parsear_fecha(data['inicio']) if data.get('inicio') else fin - timedelta(days=1)
+    except ValueError as e:
+        return None, ({'error': str(e)}, 400)
+    if inicio >= fin:
+        return None, ({'error': "'inicio' debe ser anterior a 'fin'"}, 400)
+    if fin - inicio > timedelta(days=HISTORIAL_MAX_DIAS):
+        return None, ({'error': f'Rango máximo de {HISTORIAL_MAX_DIAS} días'}, 400)
+    temporal = (inicio.strftime('%Y-%m-%dT%H:%M:%S'), fin.strftime('%Y-%m-%dT%H:%M:%S'))
+    return (lat, lon, temporal), None
+
+def _leer_punto_historial(config, granulo, lat, lon):
+    """(vars_dict o None, bytes leídos) del píxel de (lat, lon) en un granulo."""
+    try:
+        lectura = leer_puntos_granulo(granulo, lat, lon, _clave_rejilla(config))
+    except Exception as e:
+        log.warning("Historial %s: %s - %s", id_granulo(granulo), type(e).__name__, e)
+        return None, 0
+    if lectura is None: return None, 0
+    vars_dict = _filas(lectura[0], 1)[0]
+    return (vars_dict if _es_valido(vars_dict) else None), lectura[3]
+
+def serie_columnar(horas):
+    """
+    {hora: {contaminante: vars_dict}} -> serie columnar ordenada por hora:
+    {'tiempos': [...], 'contaminantes': {c: {variable: [...]}}, 'aqi': [...]},
+    con None donde una hora no tiene datos. El AQI se calcula de una vez con
+    calcular_indice_realista_array.
+    """
+    tiempos = sorted(horas)
+    columnas = {}
+    for config in DATASETS_CONFIG:
+        contaminante = config["contaminante"]
+        columnas[contaminante] = {
+            nombre_interno: np.array([
+                horas[t].get(contaminante, {}).get(nombre_interno, np.nan) for t in tiempos
+            ], dtype=np.float64)
+            for nombre_interno in VARIABLES_A_EXTRAER
+        }
+    aqi = calcular_indice_realista_array(columnas, nan_como_ausente=True)
+
+    def lista(valores):
+        return [None if np.isnan(v) else float(v) for v in valores]
+
+    return {
+        'tiempos': tiempos,
+        'contaminantes': {
+            contaminante: {nombre: lista(valores) for nombre, valores in variables.items()}
+            for contaminante, variables in columnas.items()
+        },
+        'aqi': [None if np.isnan(v) else int(v) for v in aqi],
+    }
+
+def historial_tempo(lat, lon, temporal):
+    """
+    Generador de eventos del historial de un punto:
+    {'tipo': 'cabecera', ...}, un {'tipo': 'hora', ...} por cada hora en cuanto
+    sus productos terminan (en orden de llegada) y {'tipo': 'serie', ...} al
+    final con la serie columnar completa y ordenada.
+    """
+    inicio = time.perf_counter()
+    tareas = []
+    for config in DATASETS_CONFIG:
+        try:
+            granulos = buscar_granulos(config, lat, lon, temporal, count=HISTORIAL_MAX_GRANULOS)
+        except Exception as e:
+            log.warning("Historial: búsqueda de %s falló: %s - %s", config["short_name"], type(e).__name__, e)
+            granulos = []
+        for granulo in granulos:
+            hora = hora_granulo(granulo)
+            if hora: tareas.append((config, granulo, hora))
+
+    pendientes_por_hora = {}
+    for _, _, hora in tareas:
+        pendientes_por_hora[hora] = pendientes_por_hora.get(hora, 0) + 1
+
+    yield {
+        'tipo': 'cabecera', 'lat': lat, 'lon': lon,
+        'inicio': temporal[0], 'fin': temporal[1],
+        'granulos': len(tareas), 'horas': len(pendientes_por_hora),
+    }
+
+    horas = {hora: {} for hora in pendientes_por_hora}
+    bytes_leidos = {config["contaminante"]: 0 for config in DATASETS_CONFIG}
+    futuros = {
+        _executor_historial.submit(_leer_punto_historial, config, granulo, lat, lon): (config, hora)
+        for config, granulo, hora in tareas
+    }
+    try:
+        for futuro in as_completed(futuros):
+            config, hora = futuros[futuro]
+            vars_dict, bytes_granulo = futuro.result()
+            bytes_leidos[config["contaminante"]] += bytes_granulo
+            if vars_dict:
+                horas[hora][config["contaminante"]] = vars_dict
+            pendientes_por_hora[hora] -= 1
+            if pendientes_por_hora[hora] == 0:
+                aqi = calcular_indice_realista(horas[hora])
+                yield {'tipo': 'hora', 'tiempo': hora, 'contaminantes': horas[hora], 'aqi': aqi}
+    finally:
+        # Client went away (generator closed): drop the granules not started yet
+        for futuro in futuros:
+            futuro.cancel()
+
+    serie = serie_columnar(horas)
+    serie.update({
+        'tipo': 'serie',
+        'bytes_leidos': bytes_leidos,
+        'segundos': round(time.perf_counter() - inicio, 3),
+    })
+    yield serie
+
+# Optional pre-warm: TEMPO_PRECALENTAR=auth logs in at import time (in the
+# background), =1 also indexes every product grid. POST /api/tempo/warm does
+# the full pre-warm on demand (e.g. from a deploy hook or a cron ping); it
+# triggers a CMR search and a remote read per product, so it is disabled
+# unless TEMPO_TOKEN_PRECALENTAR is set and the caller sends that bearer token.
+PRECALENTAR = os.environ.get('TEMPO_PRECALENTAR', '0')
+TOKEN_PRECALENTAR = os.environ.get('TEMPO_TOKEN_PRECALENTAR')
+# Any point inside the TEMPO field of regard resolves the hourly granule
+PUNTO_PRECALENTAR = (40.0, -95.0)
+
+def _precalentar_producto(config, temporal):
+    inicio = time.perf_counter()
+    try:
+        granulos = buscar_granulos(config, *PUNTO_PRECALENTAR, temporal)
+        if granulos:
+            # Reading one pixel builds (and caches) the product's IndiceRejilla
+            leer_puntos_granulo(granulos[0], *PUNTO_PRECALENTAR, _clave_rejilla(config))
+    except Exception as e:
+        log.warning("Precalentamiento de %s: %s - %s", config["short_name"], type(e).__name__, e)
+    with _lock_indices_rejilla:
+        indice = _indices_rejilla.get(_clave_rejilla(config))
+    return {
+        'forma': list(indice.forma) if indice else None,
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+def precalentar(rejillas=True):
+    """
+    Resuelve la autenticación y, con rejillas=True, los índices de rejilla de
+    cada producto, para que la primera petición real no pague por ellos.
+    """
+    inicio = time.perf_counter()
+    obtener_earthaccess()
+    resultado = {'auth': auth is not None, 'segundos_auth': round(time.perf_counter() - inicio, 3)}
+    if rejillas:
+        salidas, expirados, fallidos = _ejecutar_por_producto(_precalentar_producto, (_ventana_temporal(),))
+        resultado['rejillas'] = {config["contaminante"]: salida for config, salida in salidas}
+        resultado['productos_expirados'] = expirados
+        resultado['productos_fallidos'] = fallidos
+    resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+    log.info("Precalentamiento: %s", resultado)
+    return resultado
+
+def autorizar_precalentar(autorizacion):
+    """None si la cabecera Authorization trae TOKEN_PRECALENTAR; si no, (error, status)."""
+    if not TOKEN_PRECALENTAR:
+        return {'error': 'Precalentamiento deshabilitado (TEMPO_TOKEN_PRECALENTAR)'}, 404
+    esquema, _, token = (autorizacion or '').partition(' ')
+    if esquema.lower() != 'bearer' or not hmac.compare_digest(token.strip().encode(), TOKEN_PRECALENTAR.encode()):
+        return {'error': 'Token inválido'}, 403
+    return None
+
+if PRECALENTAR != '0':
+    threading.Thread(
+        target=precalentar, kwargs={'rejillas': PRECALENTAR != 'auth'}, name='tempo-precalentar', daemon=True
+    ).start()
+
+# Precomputed AQI tiles (written by api/_teselas.py). Each build lives in its own
+# version directory and actual.json points at the current one.
+TESELAS_DIR = os.environ.get('TEMPO_TESELAS_DIR', '/tmp/tempo_teselas')
+TESELAS_MAX_AGE = int(os.environ.get('TEMPO_TESELAS_MAX_AGE', '600'))
+TIPOS_TESELA = {'png': 'image/png', 'bin': 'application/octet-stream'}
+
+_manifiesto_teselas = {'mtime': None, 'datos': None}
+
+def manifiesto_teselas():
+    ruta = os.path.join(TESELAS_DIR, 'actual.json')
+    try:
+        mtime = os.stat(ruta).st_mtime
+        if mtime != _manifiesto_teselas['mtime']:
+            with open(ruta, 'r') as f:
+                _manifiesto_teselas['datos'] = json.load(f)
+            _manifiesto_teselas['mtime'] = mtime
+    except (OSError, ValueError):
+        return None
+    return _manifiesto_teselas['datos']
+
+def servir_tesela(z, x, y, formato='png', if_none_match=None):
+    """
+    Devuelve (status, headers, body) para la tesela z/x/y. formato 'png' es la
+    imagen coloreada y 'bin' la matriz AQI uint16 little-endian (65535 = sin datos).
+    """
+    if formato not in TIPOS_TESELA:
+        return 404, {}, b''
+    manifiesto = manifiesto_teselas()
+    if not manifiesto:
+        return 404, {}, b''
+    
+    version = manifiesto['version']
+    etag = f'"{version}-{z}-{x}-{y}-{formato}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={TESELAS_MAX_AGE}',
+    }
+    if if_none_match and etag in [e.strip() for e in if_none_match.split(',')]:
+        return 304, headers, b''
+    
+    ruta = os.path.join(TESELAS_DIR, version, str(z), str(x), f'{y}.{formato}')
+    try:
+        with open(ruta, 'rb') as f:
+            cuerpo = f.read()
+    except OSError:
+        # Tiles without any valid pixel are not written
+        return 204, headers, b''
+    headers['Content-Type'] = TIPOS_TESELA[formato]
+    return 200, headers, cuerpo
 
 # Vercel serverless function handler
+# Columnar response (Accept: application/vnd.tempo.columnar, see _binario):
+# one little-endian buffer per field instead of a JSON object per point.
+AQI_SIN_DATO = 65535
+
+def columnas_respuesta(respuesta):
+    """
+    (cabecera, columnas) de una respuesta de process_tempo_request: lat/lon
+    float64, aqi uint16 (AQI_SIN_DATO = sin dato), tiene_datos uint8 y una
+    columna float32 '{contaminante}.{variable}' por variable (NaN = sin dato).
+    Categoría y color se derivan del AQI en el cliente.
+    """
+    resultados = respuesta['resultados']
+    n = len(resultados)
+    columnas = {
+        'lat': np.array([r['lat'] for r in resultados], dtype='<f8'),
+        'lon': np.array([r['lon'] for r in resultados], dtype='<f8'),
+        'aqi': np.array([AQI_SIN_DATO if r['aqi_satelital'] is None else r['aqi_satelital'] for r in resultados], dtype='<u2'),
+        'tiene_datos': np.array([r['tiene_datos'] for r in resultados], dtype='u1'),
+    }
+    con_pixeles = any('pixeles' in r for r in resultados)
+    modo = respuesta.get('modo')
+    for config in DATASETS_CONFIG:
+        contaminante = config["contaminante"]
+        por_variable = {nombre: np.full(n, np.nan, dtype='<f4') for nombre in VARIABLES_A_EXTRAER}
+        for k, r in enumerate(resultados):
+            for nombre, valor in r['contaminantes'].get(contaminante, {}).items():
+                if nombre in por_variable: por_variable[nombre][k] = valor
+        columnas.update((f'{contaminante}.{nombre}', valores) for nombre, valores in por_variable.items())
+        if con_pixeles:
+            for campo in ('validos', 'en_region' if modo == 'region' else 'en_radio'):
+                columnas[f'{contaminante}.pixeles_{campo}'] = np.array(
+                    [r.get('pixeles', {}).get(contaminante, {}).get(campo, 0) for r in resultados], dtype='<u4'
+                )
+
+    cabecera = {clave: valor for clave, valor in respuesta.items() if clave != 'resultados'}
+    cabecera['n'] = n
+    cabecera['productos_expirados'] = sorted({c for r in resultados for c in r['productos_expirados']})
+    cabecera['productos_fallidos'] = sorted({c for r in resultados for c in r.get('productos_fallidos', [])})
+    if modo == 'region':
+        cabecera['estadisticas'] = [r.get('pixeles', {}) for r in resultados]
+    if any('horas_granulo' in r for r in resultados):
+        cabecera['horas_granulo'] = [r.get('horas_granulo', {}) for r in resultados]
+    return cabecera, columnas
+
+def respuesta_columnar(respuesta):
+    """Buffers del cuerpo columnar de una respuesta de process_tempo_request."""
+    return codificar(*columnas_respuesta(respuesta))
+
+# Metrics: the stage histograms and error counters of _metricas plus the
+# existing cache/store counters, read at scrape time. Server-Timing is off by
+# default since it discloses internal timings to any client.
+SERVER_TIMING = os.environ.get('TEMPO_SERVER_TIMING', '0') == '1'
+CABECERAS_EXPUESTAS = 'X-Cache, Server-Timing'
+
+PETICIONES = registro.contador('tempo_peticiones_total', 'Peticiones a /api/tempo', ('estado', 'cache'))
+
+@registro.coleccion
+def _metricas_caches():
+    granulos = cache_granulos.estadisticas()
+    respuestas = cache_respuestas.estadisticas()
+    aperturas = GranuloTempo.estadisticas()
+    mascaras = cache_mascaras.estadisticas()
+    with _lock_estadisticas_lectura:
+        lectura = dict(estadisticas_lectura)
+    muestras = [
+        ('tempo_cache_granulos_aciertos_total', 'counter', 'Búsquedas CMR servidas por la cache', granulos['aciertos']),
+        ('tempo_cache_granulos_aciertos_disco_total', 'counter', 'Aciertos servidos desde SQLite', granulos['aciertos_disco']),
+        ('tempo_cache_granulos_fallos_total', 'counter', 'Búsquedas CMR reales', granulos['fallos']),
+        ('tempo_cache_respuestas_aciertos_total', 'counter', 'Puntos servidos por la cache de respuestas', respuestas['aciertos']),
+        ('tempo_cache_respuestas_coalescidas_total', 'counter', 'Puntos que esperaron a un cálculo en curso', respuestas['coalescidas']),
+        ('tempo_cache_respuestas_fallos_total', 'counter', 'Puntos calculados', respuestas['fallos']),
+        ('tempo_cache_respuestas_entradas', 'gauge', 'Entradas en la cache de respuestas', respuestas['entradas']),
+        ('tempo_cache_mascaras_aciertos_total', 'counter', 'Regiones servidas con la máscara ya rasterizada', mascaras['aciertos']),
+        ('tempo_cache_mascaras_fallos_total', 'counter', 'Rasterizados de regiones', mascaras['fallos']),
+        ('tempo_granulos_abiertos_total', 'counter', 'Aperturas HDF5 de granulos', aperturas['aperturas']),
+        ('tempo_lecturas_remotas_total', 'counter', 'Granulos leídos por red', lectura['lecturas_remotas']),
+        ('tempo_bytes_remotos_total', 'counter', 'Bytes leídos por red', lectura['bytes_remotos']),
+    ]
+    if almacen_granulos:
+        almacen = almacen_granulos.estadisticas()
+        muestras += [
+            ('tempo_almacen_granulos_aciertos_total', 'counter', 'Granulos leídos del almacén local', almacen['aciertos']),
+            ('tempo_almacen_granulos_descargas_total', 'counter', 'Granulos descargados al almacén local', almacen['descargas']),
+        ]
+    if almacen_columnar:
+        columnar = almacen_columnar.estadisticas()
+        muestras += [
+            ('tempo_almacen_columnar_lecturas_total', 'counter', 'Consultas servidas por el almacén columnar', columnar['lecturas']),
+            ('tempo_almacen_columnar_caducadas_total', 'counter', 'Particiones ignoradas por antigüedad', columnar['caducadas']),
+        ]
+        if 'instantanea' in columnar:
+            muestras += [
+                ('tempo_instantanea_bytes', 'gauge', 'Bytes de la instantánea mapeada', columnar['bytes_mapeados']),
+                ('tempo_instantanea_versiones_total', 'counter', 'Versiones de la instantánea mapeadas por el worker', columnar['versiones']),
+            ]
+    conexiones = _sesiones.estadisticas()
+    if conexiones['instalado']:
+        muestras += [
+            ('tempo_http_conexiones_nuevas_total', 'counter', 'Conexiones (handshakes TLS) abiertas por la sesión de CMR', conexiones['requests']['conexiones_nuevas']),
+            ('tempo_http_peticiones_total', 'counter', 'Peticiones de la sesión de CMR', conexiones['requests']['peticiones']),
+            ('tempo_fsspec_conexiones_nuevas_total', 'counter', 'Conexiones abiertas por el cliente HTTPS de granulos', conexiones['fsspec']['conexiones_nuevas']),
+            ('tempo_fsspec_conexiones_reusadas_total', 'counter', 'Conexiones keep-alive reutilizadas por el cliente HTTPS de granulos', conexiones['fsspec']['conexiones_reusadas']),
+            ('tempo_fsspec_peticiones_total', 'counter', 'Peticiones del cliente HTTPS de granulos', conexiones['fsspec']['peticiones']),
+        ]
+    return muestras
+
+def procesar_con_tiempos(data):
+    """process_tempo_request midiendo sus etapas: (result, status_code, cabecera Server-Timing o None)."""
+    with peticion() as tiempos:
+        result, status_code = process_tempo_request(data)
+    PETICIONES.inc(estado=status_code, cache=result.get('cache', ''))
+    return result, status_code, (tiempos.server_timing() if SERVER_TIMING else None)
+
 def handler(req):
-    """Vercel serverless function entry point"""
+    """
+    Vercel serverless function entry point: only POST /api/tempo. The other
+    routes (/api/tempo/history, /api/tempo/stats, /api/tempo/warm,
+    /api/tiles/..., /metrics) are served by the Flask app below, and /stats
+    and /metrics also by api/_asgi.py; run one of those for them.
+    """
     try:
         # Handle CORS preflight
         if req.method == 'OPTIONS':
@@ -307,20 +2257,34 @@ def handler(req):
             }
         
         # Process using exact same logic as original
-        result, status_code = process_tempo_request(data)
+        result, status_code, server_timing = procesar_con_tiempos(data)
         
+        headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': CABECERAS_EXPUESTAS,
+            'Content-Type': 'application/json',
+            'Vary': 'Accept',
+        }
+        if 'cache' in result:
+            headers['X-Cache'] = result['cache']
+        if server_timing:
+            headers['Server-Timing'] = server_timing
+        if status_code == 200 and acepta_columnar((getattr(req, 'headers', None) or {}).get('Accept')):
+            headers['Content-Type'] = TIPO_COLUMNAR
+            return {
+                'statusCode': status_code,
+                'headers': headers,
+                'body': base64.b64encode(b''.join(respuesta_columnar(result))).decode('ascii'),
+                'isBase64Encoded': True,
+            }
         return {
             'statusCode': status_code,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
+            'headers': headers,
             'body': json.dumps(result)
         }
         
     except Exception as e:
-        print(f"Error in serverless handler: {e}")
-        traceback.print_exc()
+        log.error("Error in serverless handler: %s", e, exc_info=True)
         return {
             'statusCode': 500,
             'headers': {'Access-Control-Allow-Origin': '*'},
@@ -329,7 +2293,7 @@ def handler(req):
 
 # Flask app for local development
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Cache', 'Server-Timing'])
 
 @app.route('/api/tempo', methods=['POST', 'OPTIONS'])
 def get_tempo_data():
@@ -339,18 +2303,83 @@ def get_tempo_data():
     
     try:
         data = request.get_json()
-        result, status_code = process_tempo_request(data)
+        result, status_code, server_timing = procesar_con_tiempos(data)
+        headers = {'X-Cache': result['cache']} if 'cache' in result else {}
+        if server_timing:
+            headers['Server-Timing'] = server_timing
+        headers['Vary'] = 'Accept'
         
+        if status_code == 200 and acepta_columnar(request.headers.get('Accept')):
+            buffers = respuesta_columnar(result)
+            headers['Content-Length'] = str(sum(len(b) for b in buffers))
+            return Response(buffers, mimetype=TIPO_COLUMNAR, headers=headers)
         if status_code == 200:
-            return jsonify(result)
+            return jsonify(result), 200, headers
         else:
             return jsonify(result), status_code
             
     except Exception as e:
-        print(f"Error in Flask route: {e}")
-        traceback.print_exc()
+        log.error("Error in Flask route: %s", e, exc_info=True)
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/api/tempo/history', methods=['GET', 'POST'])
+def get_tempo_history():
+    """Hourly history of a point: NDJSON stream (default) or one columnar JSON (formato=json)"""
+    data = request.get_json(silent=True) or request.args.to_dict()
+    parametros, error = validar_historial(data)
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    eventos = historial_tempo(*parametros)
+    if data.get('formato') == 'json':
+        serie = None
+        for evento in eventos:
+            serie = evento
+        serie.pop('tipo')
+        return jsonify(serie)
+    
+    def ndjson():
+        for evento in eventos:
+            yield json.dumps(evento) + '\n'
+    return Response(ndjson(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+@app.route('/api/tempo/stats', methods=['GET'])
+def get_tempo_stats():
+    """Cache statistics for monitoring hit rates"""
+    return jsonify({
+        'cache_granulos': cache_granulos.estadisticas(),
+        'cache_respuestas': cache_respuestas.estadisticas(),
+        'almacen_granulos': almacen_granulos.estadisticas() if almacen_granulos else None,
+        'almacen_columnar': almacen_columnar.estadisticas() if almacen_columnar else None,
+        'lectura': dict(estadisticas_lectura),
+        'granulos_abiertos': GranuloTempo.estadisticas(),
+        'cache_mascaras': cache_mascaras.estadisticas(),
+        'acumulados': {ventana: almacen.estadisticas() for ventana, almacen in almacenes_acumulados.items()},
+        'conexiones': _sesiones.estadisticas(),
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of stage timings, errors and cache counters"""
+    return Response(registro.exponer(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/tempo/warm', methods=['POST'])
+def post_tempo_warm():
+    """Pre-warm auth and grid indices so the next request skips them (bearer TEMPO_TOKEN_PRECALENTAR)"""
+    error = autorizar_precalentar(request.headers.get('Authorization'))
+    if error:
+        return jsonify(error[0]), error[1]
+    return jsonify(precalentar())
+
+@app.route('/api/tiles/<int:z>/<int:x>/<y>', methods=['GET'])
+def get_tesela(z, x, y):
+    """Precomputed AQI tile: /api/tiles/{z}/{x}/{y}.png or .bin"""
+    y, _, formato = y.partition('.')
+    if not y.isdigit():
+        return jsonify({'error': 'Tesela inválida'}), 400
+    status, headers, cuerpo = servir_tesela(z, x, int(y), formato or 'png', request.headers.get('If-None-Match'))
+    return Response(cuerpo, status=status, headers=headers)
+
 # Local development server
 if __name__ == '__main__':
     print("🚀 Starting local development server...")
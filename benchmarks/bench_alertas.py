@@ -0,0 +1,90 @@
+"""
+Coste de evaluar N suscripciones de alerta por granulo (api/_alertas.py).
+
+    python benchmarks/bench_alertas.py --suscripciones 1000 10000 100000 --salida benchmarks/reportes/alertas.json
+
+Las rejillas son sintéticas y ya decodificadas en memoria (float32, como las
+particiones del almacén columnar), así que se mide el motor y no la lectura
+del granulo. 'indices_ms' es la primera evaluación de cada producto (calcula
+el píxel de cada punto); 'granulo_ms' la mediana de las siguientes: gather,
+AQI de todos los puntos y transiciones de categoría.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import tempo  # noqa: E402
+from _alertas import MotorAlertas  # noqa: E402
+from sintetico import ESCALAS, FRACCION_MALA_CALIDAD  # noqa: E402
+
+LAT0, LON0, PASO = 14.01, -120.99, 0.02
+
+def rejilla_sintetica(forma, escala, rng):
+    n_lat, n_lon = forma
+    variables = {
+        'troposphere': (rng.random(forma, dtype=np.float32) * 2 * escala).astype(np.float32),
+        'uncertainty': (rng.random(forma, dtype=np.float32) * 0.2 * escala).astype(np.float32),
+        'stratosphere': (rng.random(forma, dtype=np.float32) * 2 * escala).astype(np.float32),
+        'quality_flag': (rng.random(forma, dtype=np.float32) < FRACCION_MALA_CALIDAD).astype(np.float32),
+    }
+    variables['troposphere'][rng.random(forma) < 0.05] = np.nan
+    indice = tempo.IndiceRejilla(LAT0 + PASO * np.arange(n_lat), LON0 + PASO * np.arange(n_lon))
+    return variables, indice
+
+def medir(n, forma, granulos, rejillas, rng):
+    motor = MotorAlertas()
+    n_lat, n_lon = forma
+    motor.registro.agregar(rng.uniform(LAT0, LAT0 + PASO * n_lat, n), rng.uniform(LON0, LON0 + PASO * n_lon, n))
+
+    indices_ms, granulo_ms, transiciones = [], [], []
+    for k in range(granulos):
+        config = tempo.DATASETS_CONFIG[k % len(tempo.DATASETS_CONFIG)]
+        # Each product alternates between two grids so successive granules differ
+        variables, indice = rejillas[config["contaminante"]][(k // len(tempo.DATASETS_CONFIG)) % 2]
+        inicio = time.perf_counter()
+        cambios = motor.evaluar_rejilla(config["contaminante"], variables, indice, tempo._clave_rejilla(config), f'h{k}')
+        (indices_ms if k < len(tempo.DATASETS_CONFIG) else granulo_ms).append((time.perf_counter() - inicio) * 1000)
+        transiciones.append(int(cambios['ids'].size))
+    return {
+        'suscripciones': n,
+        'indices_ms': round(float(np.max(indices_ms)), 3),
+        'granulo_ms': {
+            'p50': round(float(np.percentile(granulo_ms, 50)), 3),
+            'p95': round(float(np.percentile(granulo_ms, 95)), 3),
+        },
+        'transiciones_por_granulo': int(np.median(transiciones[len(tempo.DATASETS_CONFIG):])),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluación masiva de alertas por granulo')
+    parser.add_argument('--suscripciones', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--forma', type=int, nargs=2, default=[1500, 3000], metavar=('N_LAT', 'N_LON'))
+    parser.add_argument('--granulos', type=int, default=24, help='Granulos evaluados por medida (repartidos entre productos)')
+    parser.add_argument('--salida', help='Guardar el informe JSON en este archivo')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    forma = tuple(args.forma)
+    rejillas = {
+        contaminante: [rejilla_sintetica(forma, escala, rng) for _ in range(2)]
+        for contaminante, escala in ESCALAS.items()
+    }
+    informe = {
+        'forma': list(forma),
+        'resultados': [medir(n, forma, max(args.granulos, 2 * len(rejillas)), rejillas, rng) for n in args.suscripciones],
+    }
+    texto = json.dumps(informe, indent=2)
+    print(texto)
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            f.write(texto + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Prueba de carga de POST /api/tempo: peticiones/segundo y latencias frente a
+concurrencia, para la app Flask (servidor con hilos) y la variante ASGI
+(api/_asgi.py sobre uvicorn), con el mismo backend simulado
+(falso_earthaccess: granulos sintéticos con latencia de red configurable).
+
+    python benchmarks/bench_carga.py --concurrencias 1 4 16 64 --segundos 10
+
+Cada punto pide un píxel distinto y la cache de respuestas está desactivada,
+así que cada petición abre los tres granulos. Imprime un JSON por servidor y
+concurrencia con rps, p50/p95 y cuántas respuestas fueron 503 o errores.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+API = os.path.join(os.path.dirname(BENCH), 'api')
+sys.path.insert(0, BENCH)
+import sintetico  # noqa: E402
+
+def servir(modo, puerto, fuente, latencia_busqueda, latencia_apertura):
+    """Proceso servidor: instala el falso earthaccess y arranca Flask o ASGI."""
+    import falso_earthaccess
+    falso_earthaccess.instalar(fuente, latencia_busqueda, latencia_apertura)
+    sys.path.insert(0, API)
+    if modo == 'flask':
+        import logging
+        import tempo
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        tempo.app.run(port=puerto, threaded=True)
+    else:
+        import uvicorn
+        import _asgi
+        uvicorn.run(_asgi.app, port=puerto, log_level='warning')
+
+def _esperar(puerto, plazo=30):
+    limite = time.time() + plazo
+    while time.time() < limite:
+        try:
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=1)
+            conexion.request('GET', '/api/tempo/stats')
+            if conexion.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'El servidor en el puerto {puerto} no arrancó')
+
+def _cliente(puerto, fin, rng, registro):
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=60)
+    while time.time() < fin:
+        # Random point inside the synthetic grid (14-18N, 121-115W)
+        cuerpo = json.dumps({'lat': float(rng.uniform(14.1, 17.9)), 'lon': float(rng.uniform(-120.9, -115.1))})
+        inicio = time.perf_counter()
+        try:
+            conexion.request('POST', '/api/tempo', cuerpo, {'Content-Type': 'application/json'})
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            estado = respuesta.status
+        except (OSError, http.client.HTTPException):
+            conexion.close()
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=60)
+            estado = 0
+        registro.append((estado, time.perf_counter() - inicio))
+
+def cargar(puerto, concurrencia, segundos):
+    registros = [[] for _ in range(concurrencia)]
+    fin = time.time() + segundos
+    hilos = [
+        threading.Thread(target=_cliente, args=(puerto, fin, np.random.default_rng(k), registros[k]))
+        for k in range(concurrencia)
+    ]
+    inicio = time.perf_counter()
+    for hilo in hilos: hilo.start()
+    for hilo in hilos: hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    todos = [r for registro in registros for r in registro]
+    correctas = np.array([t for estado, t in todos if estado == 200]) * 1000
+    return {
+        'concurrencia': concurrencia,
+        'peticiones': len(todos),
+        'rps': round(len(correctas) / duracion, 1),
+        'ms_p50': round(float(np.percentile(correctas, 50)), 1) if correctas.size else None,
+        'ms_p95': round(float(np.percentile(correctas, 95)), 1) if correctas.size else None,
+        'rechazadas_503': sum(1 for estado, _ in todos if estado == 503),
+        'errores': sum(1 for estado, _ in todos if estado not in (200, 503)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga de /api/tempo: Flask frente a ASGI')
+    parser.add_argument('--servir', choices=['flask', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--puerto', type=int, default=5077)
+    parser.add_argument('--fuente-dir', default=os.path.join(tempfile.gettempdir(), 'tempo_bench_fuente'))
+    parser.add_argument('--servidores', nargs='+', default=['flask', 'asgi'], choices=['flask', 'asgi'])
+    parser.add_argument('--concurrencias', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--latencia-busqueda', type=float, default=0.3, help='Segundos por búsqueda CMR simulada')
+    parser.add_argument('--latencia-apertura', type=float, default=0.2, help='Segundos por apertura remota simulada')
+    args = parser.parse_args()
+
+    if args.servir:
+        servir(args.servir, args.puerto, args.fuente_dir, args.latencia_busqueda, args.latencia_apertura)
+        return
+
+    hora = datetime.utcnow().replace(minute=0, second=45, microsecond=0) - timedelta(hours=1)
+    sintetico.crear_archivo_remoto(args.fuente_dir, hora, horas=1)
+    entorno = dict(os.environ, TEMPO_CACHE_RESPUESTAS='0')
+    informe = {'latencia_busqueda': args.latencia_busqueda, 'latencia_apertura': args.latencia_apertura,
+               'resultados': {}}
+    for modo in args.servidores:
+        proceso = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--servir', modo, '--puerto', str(args.puerto),
+             '--fuente-dir', args.fuente_dir, '--latencia-busqueda', str(args.latencia_busqueda),
+             '--latencia-apertura', str(args.latencia_apertura)],
+            env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            _esperar(args.puerto)
+            informe['resultados'][modo] = [cargar(args.puerto, c, args.segundos) for c in args.concurrencias]
+        finally:
+            proceso.terminate()
+            proceso.wait()
+    print(json.dumps(informe, indent=2))
+
+if __name__ == '__main__':
+    main()
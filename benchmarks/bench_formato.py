@@ -0,0 +1,114 @@
+"""
+Tamaño y tiempo de codificación de la respuesta de /api/tempo en JSON (lo que
+hacen handler y jsonify) frente al formato columnar binario
+(Accept: application/vnd.tempo.columnar, api/_binario.py).
+
+    python benchmarks/bench_formato.py --puntos 1 1000 100000 --salida benchmarks/reportes/formato.json
+
+Las respuestas se arman con _armar_resultado sobre valores sintéticos, sin
+leer granulos. 'columnar_ms' incluye pasar los resultados a columnas;
+'codificar_ms' es sólo la codificación de columnas ya armadas (el caso de
+resultados que ya vienen en arrays). También se mide la decodificación y el
+tamaño tras gzip, que es lo que viaja si el servidor comprime.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'api'))
+import tempo  # noqa: E402
+from _binario import codificar, decodificar  # noqa: E402
+
+ESCALAS = {'NO2': 6e15, 'O3': 8e18, 'HCHO': 1.5e16}
+
+def respuesta_sintetica(n, semilla=0):
+    """Respuesta de lote de n puntos con el mismo formato que process_tempo_request."""
+    rng = np.random.default_rng(semilla)
+    resultados = []
+    for k in range(n):
+        contaminantes = {
+            contaminante: {
+                'troposphere': float(rng.uniform(0.2, 2) * escala),
+                'uncertainty': float(rng.uniform(0.05, 0.3) * escala),
+                'stratosphere': float(rng.uniform(0.5, 1.5) * escala),
+                'quality_flag': float(rng.random() < 0.1),
+            }
+            for contaminante, escala in ESCALAS.items()
+        }
+        datos = {'tiene_datos': True, 'contaminantes': contaminantes, 'productos_expirados': []}
+        resultados.append(tempo._armar_resultado(float(rng.uniform(14, 58)), float(rng.uniform(-140, -50)), datos))
+    return {
+        'total_puntos': n,
+        'puntos_con_datos': n,
+        'resultados': resultados,
+        'bytes_leidos': {contaminante: 0 for contaminante in ESCALAS},
+        'cache': 'MISS',
+        'puntos_en_cache': 0,
+    }
+
+def _ms(funcion, repeticiones):
+    """Mediana en ms de `repeticiones` llamadas y el último valor devuelto."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return round(float(np.median(tiempos)) * 1000, 3), salida
+
+def medir(n, repeticiones):
+    respuesta = respuesta_sintetica(n)
+    repeticiones = max(1, repeticiones if n <= 1000 else repeticiones // 5)
+
+    json_ms, cuerpo_json = _ms(lambda: json.dumps(respuesta).encode(), repeticiones)
+    json_decodificar_ms, _ = _ms(lambda: json.loads(cuerpo_json), repeticiones)
+
+    columnar_ms, buffers = _ms(lambda: tempo.respuesta_columnar(respuesta), repeticiones)
+    cuerpo = b''.join(buffers)
+    cabecera, columnas = tempo.columnas_respuesta(respuesta)
+    codificar_ms, _ = _ms(lambda: codificar(cabecera, columnas), repeticiones)
+    decodificar_ms, (_, decodificadas) = _ms(lambda: decodificar(cuerpo), repeticiones)
+
+    # Same answer in both encodings
+    aqi = [r['aqi_satelital'] for r in json.loads(cuerpo_json)['resultados']]
+    assert [None if v == tempo.AQI_SIN_DATO else int(v) for v in decodificadas['aqi']] == aqi
+
+    return {
+        'puntos': n,
+        'json': {
+            'bytes': len(cuerpo_json),
+            'bytes_gzip': len(gzip.compress(cuerpo_json, 6)),
+            'codificar_ms': json_ms,
+            'decodificar_ms': json_decodificar_ms,
+        },
+        'columnar': {
+            'bytes': len(cuerpo),
+            'bytes_gzip': len(gzip.compress(cuerpo, 6)),
+            'codificar_ms': columnar_ms,
+            'codificar_columnas_ms': codificar_ms,
+            'decodificar_ms': decodificar_ms,
+        },
+        'reduccion_bytes': round(len(cuerpo_json) / len(cuerpo), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Tamaño y coste de codificación: JSON frente a columnar')
+    parser.add_argument('--puntos', type=int, nargs='+', default=[1, 1000, 100000])
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--salida', help='Guardar el informe JSON en este archivo')
+    args = parser.parse_args()
+
+    informe = {'resultados': [medir(n, args.repeticiones) for n in args.puntos]}
+    texto = json.dumps(informe, indent=2)
+    print(texto)
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            f.write(texto + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Aperturas y tiempo por granulo: lectura antigua (dos xr.open_dataset, raíz y
+'product') frente a GranuloTempo (un único handle h5py).
+
+    python benchmarks/bench_granulo.py --forma 1000 2000 --repeticiones 20
+
+Imprime un JSON con aperturas por granulo y percentiles del tiempo por
+granulo (abrir, localizar el píxel, leer las 4 variables y cerrar).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _granulo import VARIABLES_A_EXTRAER, GranuloTempo  # noqa: E402
+from sintetico import crear_granulo  # noqa: E402
+
+def leer_doble_apertura(ruta, lat, lon, contador):
+    """La lectura que hacía App.py: el archivo se abre una vez por grupo."""
+    import xarray as xr
+    ds_root = xr.open_dataset(ruta, engine='h5netcdf')
+    ds_product = xr.open_dataset(ruta, engine='h5netcdf', group='product')
+    contador['aperturas'] += 2
+    try:
+        lat_idx = np.abs(ds_root['latitude'].values - lat).argmin()
+        lon_idx = np.abs(ds_root['longitude'].values - lon).argmin()
+        valores = {}
+        for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items():
+            if nombre_tempo in ds_product.data_vars:
+                var = ds_product[nombre_tempo]
+                selector = {'latitude': lat_idx, 'longitude': lon_idx}
+                if 'time' in var.dims: selector['time'] = 0
+                valores[nombre_interno] = float(var.isel(**selector).values)
+        return valores
+    finally:
+        ds_root.close()
+        ds_product.close()
+
+def leer_granulo_tempo(ruta, lat, lon, contador):
+    with GranuloTempo(ruta) as granulo:
+        contador['aperturas'] += 1
+        lat_idx = np.abs(granulo.latitudes - lat).argmin()
+        lon_idx = np.abs(granulo.longitudes - lon).argmin()
+        columnas = granulo.leer_puntos([lat_idx], [lon_idx])
+        return {nombre: float(valores[0]) for nombre, valores in columnas.items()}
+
+def medir(lector, ruta, puntos):
+    contador = {'aperturas': 0}
+    tiempos = []
+    for lat, lon in puntos:
+        inicio = time.perf_counter()
+        lector(ruta, lat, lon, contador)
+        tiempos.append(time.perf_counter() - inicio)
+    ms = np.array(tiempos) * 1000
+    return {
+        'granulos': len(puntos),
+        'aperturas_por_granulo': contador['aperturas'] / len(puntos),
+        'ms_media': round(float(ms.mean()), 3),
+        'ms_p50': round(float(np.percentile(ms, 50)), 3),
+        'ms_p95': round(float(np.percentile(ms, 95)), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--forma', type=int, nargs=2, default=(1000, 2000), metavar=('LAT', 'LON'))
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--directorio', default=os.path.join(tempfile.gettempdir(), 'tempo_bench'))
+    args = parser.parse_args()
+
+    forma = tuple(args.forma)
+    ruta = crear_granulo(os.path.join(args.directorio, f'TEMPO_NO2_{forma[0]}x{forma[1]}_0.nc'), forma=forma)
+    rng = np.random.default_rng(1)
+    puntos = list(zip(14.01 + rng.random(args.repeticiones) * 0.02 * (forma[0] - 1),
+                      -120.99 + rng.random(args.repeticiones) * 0.02 * (forma[1] - 1)))
+
+    # Same pixels, same values: the benchmark only makes sense if both paths agree
+    for lat, lon in puntos[:3]:
+        antiguo = leer_doble_apertura(ruta, lat, lon, {'aperturas': 0})
+        nuevo = leer_granulo_tempo(ruta, lat, lon, {'aperturas': 0})
+        assert antiguo.keys() == nuevo.keys()
+        assert all(np.isclose(antiguo[k], nuevo[k], equal_nan=True) for k in antiguo)
+
+    resultado = {
+        'forma': list(forma),
+        'archivo_mb': round(os.path.getsize(ruta) / 1e6, 2),
+        'doble_apertura': medir(leer_doble_apertura, ruta, puntos),
+        'granulo_tempo': medir(leer_granulo_tempo, ruta, puntos),
+    }
+    print(json.dumps(resultado, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Coste de importar api/tempo.py en frío (lo que paga la primera petición de
+un contenedor de Vercel), con el desglose de `python -X importtime`.
+
+    python benchmarks/bench_importacion.py --salida benchmarks/reportes/importacion.json
+
+Cada repetición es un intérprete nuevo. El informe incluye el tiempo total,
+los módulos importados directamente por tempo ordenados por coste acumulado y
+qué dependencias pesadas quedaron cargadas tras el import.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API = os.path.join(RAIZ, 'api')
+PESADOS = ['earthaccess', 'h5py', 'xarray', 'fsspec', 'pandas', 'flask', 'numpy']
+
+CODIGO = (
+    "import time, sys, json\n"
+    "inicio = time.perf_counter()\n"
+    "import {modulo}\n"
+    "ms = (time.perf_counter() - inicio) * 1000\n"
+    "print(json.dumps({{'ms': ms, 'cargados': [m for m in {pesados!r} if m in sys.modules]}}))\n"
+)
+
+def _entorno():
+    entorno = dict(os.environ)
+    # Import cost only: no pre-warm thread and no credentials to pick up
+    for variable in ('TEMPO_PRECALENTAR', 'EARTHDATA_USERNAME', 'EARTHDATA_PASSWORD'):
+        entorno.pop(variable, None)
+    return entorno
+
+def _parsear_importtime(stderr, modulo):
+    """Líneas de -X importtime -> (acumulado del módulo en us, {hijo directo: acumulado us})."""
+    filas = []
+    for linea in stderr.splitlines():
+        if not linea.startswith('import time:') or 'imported package' in linea:
+            continue
+        propio, acumulado, nombre = linea.split(':', 1)[1].split('|')
+        propio, acumulado = int(propio), int(acumulado)
+        profundidad = (len(nombre) - len(nombre.lstrip())) // 2
+        filas.append((profundidad, nombre.strip(), propio, acumulado))
+
+    # importtime prints children before their parent, one level deeper
+    total, hijos = None, {}
+    for k, (profundidad, nombre, _, acumulado) in enumerate(filas):
+        if nombre == modulo:
+            total = acumulado
+            j = k - 1
+            while j >= 0 and filas[j][0] > profundidad:
+                if filas[j][0] == profundidad + 1:
+                    hijos[filas[j][1]] = filas[j][3]
+                j -= 1
+            break
+    return total, hijos
+
+def medir(modulo, repeticiones):
+    codigo = CODIGO.format(modulo=modulo, pesados=PESADOS)
+    tiempos, acumulados, hijos_por_rep, cargados = [], [], [], []
+    for _ in range(repeticiones):
+        salida = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', codigo],
+            cwd=API, env=_entorno(), capture_output=True, text=True, check=True
+        )
+        datos = json.loads(salida.stdout.strip().splitlines()[-1])
+        total, hijos = _parsear_importtime(salida.stderr, modulo)
+        tiempos.append(datos['ms'])
+        acumulados.append(total / 1000)
+        hijos_por_rep.append(hijos)
+        cargados = datos['cargados']
+
+    nombres = set().union(*hijos_por_rep)
+    mediana_hijos = {
+        nombre: round(float(np.median([h.get(nombre, 0) for h in hijos_por_rep])) / 1000, 2) for nombre in nombres
+    }
+    return {
+        'modulo': modulo,
+        'repeticiones': repeticiones,
+        'ms_import_p50': round(float(np.median(tiempos)), 1),
+        'ms_import_min': round(float(np.min(tiempos)), 1),
+        'ms_importtime_p50': round(float(np.median(acumulados)), 1),
+        'dependencias_ms_p50': dict(sorted(mediana_hijos.items(), key=lambda kv: -kv[1])[:15]),
+        'pesados_cargados': cargados,
+        'python': platform.python_version(),
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiempo de importación en frío de api/tempo.py')
+    parser.add_argument('--modulo', default='tempo')
+    parser.add_argument('--repeticiones', type=int, default=7)
+    parser.add_argument('--salida', help='Escribir también el informe JSON en este archivo')
+    args = parser.parse_args()
+
+    informe = medir(args.modulo, args.repeticiones)
+    texto = json.dumps(informe, indent=2)
+    print(texto)
+    if args.salida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+        with open(args.salida, 'w') as f:
+            f.write(texto + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Memoria por worker y latencia de consulta con la instantánea compartida
+(api/_instantanea.py) frente a que cada worker decodifique sus granulos.
+
+    python benchmarks/bench_instantanea.py --workers 1 2 4 8 --salida benchmarks/reportes/instantanea.json
+
+Se lanzan N procesos (spawn, para que no hereden la memoria del padre) que
+recorren la rejilla completa de cada producto, como haría un worker tras
+muchas consultas, y después miden consultas puntuales. De /proc/self/smaps_rollup
+se toman la memoria privada (USS) y la proporcional (PSS) de cada worker:
+con la instantánea la privada no depende del tamaño de la rejilla y la
+suma de PSS se mantiene aunque crezca N; con 'por_worker' cada worker
+añade su propia copia decodificada.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def _memoria_mb():
+    """{'uss', 'pss', 'compartida'} en MB del proceso actual."""
+    campos = {}
+    with open('/proc/self/smaps_rollup', 'r') as f:
+        for linea in f:
+            partes = linea.split()
+            if len(partes) == 3 and partes[2] == 'kB':
+                campos[partes[0].rstrip(':')] = int(partes[1]) / 1024
+    return {
+        'uss': round(campos.get('Private_Clean', 0) + campos.get('Private_Dirty', 0), 1),
+        'pss': round(campos.get('Pss', 0), 1),
+        'compartida': round(campos.get('Shared_Clean', 0) + campos.get('Shared_Dirty', 0), 1),
+    }
+
+class _Decodificado:
+    """Lo que hace hoy cada worker sin instantánea: su propia copia de cada granulo en memoria."""
+
+    def __init__(self, rutas):
+        import tempo
+        from _granulo import VARIABLES_A_EXTRAER, GranuloTempo
+        self.particiones = {}
+        for contaminante, ruta in rutas.items():
+            with GranuloTempo(ruta) as granulo:
+                self.particiones[contaminante] = {
+                    'indice': tempo.IndiceRejilla(granulo.latitudes, granulo.longitudes),
+                    'variables': {
+                        nombre_interno: granulo.leer_franja(nombre_tempo, 0, granulo.forma[0]).astype(np.float32)
+                        for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items()
+                    },
+                }
+
+    def particion(self, contaminante):
+        return self.particiones[contaminante]
+
+def _worker(modo, ruta, rutas, consultas, listo, cola):
+    import tempo
+    almacen = tempo.InstantaneaCompartida(ruta, max_edad_h=0) if modo == 'instantanea' else _Decodificado(rutas)
+    for contaminante in rutas:
+        for datos in almacen.particion(contaminante)['variables'].values():
+            np.nanmax(datos[:, :])
+    listo.wait()
+
+    rng = np.random.default_rng(os.getpid())
+    tiempos = []
+    for _ in range(consultas):
+        contaminante = list(rutas)[rng.integers(len(rutas))]
+        inicio = time.perf_counter()
+        particion = almacen.particion(contaminante)
+        indice = particion['indice']
+        filas, columnas = indice.indices(rng.uniform(indice.latitudes.min(), indice.latitudes.max(), 1),
+                                         rng.uniform(indice.longitudes.min(), indice.longitudes.max(), 1))
+        {nombre: float(datos[filas, columnas][0]) for nombre, datos in particion['variables'].items()}
+        tiempos.append(time.perf_counter() - inicio)
+    cola.put({'memoria': _memoria_mb(), 'consulta_us_p50': float(np.percentile(tiempos, 50)) * 1e6})
+
+def medir(modo, n, ruta, rutas, consultas):
+    contexto = multiprocessing.get_context('spawn')
+    listo, cola = contexto.Barrier(n + 1), contexto.Queue()
+    procesos = [contexto.Process(target=_worker, args=(modo, ruta, rutas, consultas, listo, cola)) for _ in range(n)]
+    for proceso in procesos:
+        proceso.start()
+    # All workers have the whole grid resident before anyone measures, so PSS splits fairly
+    listo.wait()
+    resultados = [cola.get() for _ in range(n)]
+    for proceso in procesos:
+        proceso.join()
+    return {
+        'modo': modo,
+        'workers': n,
+        'uss_mb_por_worker': round(float(np.mean([r['memoria']['uss'] for r in resultados])), 1),
+        'pss_mb_total': round(sum(r['memoria']['pss'] for r in resultados), 1),
+        'consulta_us_p50': round(float(np.median([r['consulta_us_p50'] for r in resultados])), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Instantánea compartida frente a granulos por worker')
+    parser.add_argument('--forma', type=int, nargs=2, default=[1000, 2000], metavar=('N_LAT', 'N_LON'))
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--consultas', type=int, default=2000)
+    parser.add_argument('--salida', help='Guardar el informe JSON en este archivo')
+    args = parser.parse_args()
+
+    import _instantanea
+    from sintetico import crear_juego
+
+    with tempfile.TemporaryDirectory() as directorio:
+        rutas = crear_juego(directorio, forma=tuple(args.forma))
+        ruta = os.path.join(directorio, 'instantanea.bin')
+        hora = time.strftime('%Y-%m-%dT%H', time.gmtime())
+        inicio = time.perf_counter()
+        _instantanea.escribir(ruta, {c: (hora, os.path.basename(r), r) for c, r in rutas.items()})
+        informe = {
+            'forma': args.forma,
+            'instantanea_mb': round(os.path.getsize(ruta) / 2 ** 20, 1),
+            'carga_s': round(time.perf_counter() - inicio, 3),
+            'resultados': [
+                medir(modo, n, ruta, rutas, args.consultas)
+                for modo in ('instantanea', 'por_worker') for n in args.workers
+            ],
+        }
+
+    texto = json.dumps(informe, indent=2)
+    print(texto)
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            f.write(texto + '\n')
+
+if __name__ == '__main__':
+    main()
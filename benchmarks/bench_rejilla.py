@@ -0,0 +1,87 @@
+"""
+Rendimiento del AQI de la rejilla completa (api/_rejilla.py) según el número
+de procesos y el tamaño de franja.
+
+    python benchmarks/bench_rejilla.py --forma 2000 4000 --procesos 1 2 4 8 --salida benchmarks/reportes/rejilla.json
+
+Los granulos son los sintéticos de sintetico.crear_juego (misma estructura
+que los reales). 'serie' es el camino de un solo proceso de _teselas; para
+cada configuración se da píxeles/s, píxeles/s por núcleo ocupado y la
+memoria máxima de un proceso del pool (USS, la privada, y PSS, con la
+compartida repartida; de /proc/self/smaps_rollup), que debe crecer con la
+franja y no con la rejilla. 'filas_por_franja' es la franja ya alineada con los chunks HDF5
+(100 filas en los sintéticos). El resultado de cada configuración se compara
+con el de 'serie'.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _rejilla  # noqa: E402
+import _teselas  # noqa: E402
+from sintetico import crear_juego  # noqa: E402
+
+def medir(funcion, repeticiones):
+    tiempos, salida = [], None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return float(np.median(tiempos)), salida
+
+def main():
+    parser = argparse.ArgumentParser(description='AQI de la rejilla completa en varios procesos')
+    parser.add_argument('--forma', type=int, nargs=2, default=[1000, 2000], metavar=('N_LAT', 'N_LON'))
+    parser.add_argument('--procesos', type=int, nargs='+', default=sorted({1, 2, _rejilla.PROCESOS}))
+    parser.add_argument('--filas', type=int, nargs='+', default=[32, _rejilla.FILAS_POR_FRANJA, 512])
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--salida', help='Guardar el informe JSON en este archivo')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        rutas = crear_juego(directorio, forma=tuple(args.forma))
+        pixeles = args.forma[0] * args.forma[1]
+
+        segundos, (_, _, referencia) = medir(lambda: _teselas.calcular_aqi_rejilla(rutas), args.repeticiones)
+        informe = {
+            'forma': args.forma,
+            'nucleos': os.cpu_count(),
+            'serie': {'s': round(segundos, 3), 'pixeles_s': round(pixeles / segundos)},
+            'resultados': [],
+        }
+        for filas in args.filas:
+            for procesos in args.procesos:
+                estadisticas = {}
+                segundos, (_, _, aqi) = medir(
+                    lambda: _rejilla.calcular_aqi_rejilla(rutas, procesos, filas, estadisticas), args.repeticiones
+                )
+                # A pool larger than the machine still only gets cpu_count cores
+                nucleos = min(estadisticas['procesos'], os.cpu_count() or 1)
+                informe['resultados'].append({
+                    'procesos': estadisticas['procesos'],
+                    'filas_por_franja': estadisticas['filas_por_franja'],
+                    's': round(segundos, 3),
+                    'pixeles_s': round(pixeles / segundos),
+                    'pixeles_s_por_nucleo': round(pixeles / segundos / nucleos),
+                    'aceleracion': round(informe['serie']['s'] / segundos, 2),
+                    'uss_max_mb_por_proceso': estadisticas['uss_max_mb_por_proceso'],
+                    'pss_max_mb_por_proceso': estadisticas['pss_max_mb_por_proceso'],
+                    'igual_a_serie': bool(np.array_equal(aqi, referencia)),
+                })
+
+    texto = json.dumps(informe, indent=2)
+    print(texto)
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            f.write(texto + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""
+Suite de benchmarks de /api/tempo sin red: earthaccess se sustituye por
+falso_earthaccess (granulos sintéticos con la estructura real) y se mide cada
+etapa del camino caliente:
+
+    busqueda       tempo.buscar_granulos (CMR + cache de granulos)
+    apertura       tempo.abrir_remoto + apertura h5py (GranuloTempo)
+    coordenadas    índice de rejilla y búsqueda del píxel más cercano
+    lectura        lectura de las variables (GranuloTempo.leer_puntos)
+    puntuacion     calcular_indice_realista
+    serializacion  json.dumps de la respuesta en handler()
+
+para los escenarios individual (en frío y en caliente), lote y concurrente,
+más la comparación de bench_granulo (doble xr.open_dataset frente a un único
+handle) sobre el mismo granulo.
+
+Por escenario: percentiles de latencia total y por etapa, bytes leídos y
+memoria asignada (tracemalloc, en una pasada aparte para no falsear los
+tiempos). La salida es JSON; con --comparar se añaden las variaciones de p50
+frente a un informe anterior:
+
+    python benchmarks/bench_suite.py --salida informe.json
+    python benchmarks/bench_suite.py --comparar informe.json
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(BENCH)
+sys.path.insert(0, BENCH)
+import bench_granulo  # noqa: E402
+import falso_earthaccess  # noqa: E402
+import sintetico  # noqa: E402
+
+# Synthetic grid covered by sintetico's default granules (14-18N, 121-115W)
+LAT_MIN, LAT_MAX, LON_MIN, LON_MAX = 14.1, 17.9, -120.9, -115.1
+
+class Etapas:
+    """Tiempos por etapa, registrados por envoltorios sobre las funciones de tempo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tiempos = {}
+        self.activo = True
+
+    def registrar(self, etapa, segundos):
+        if not self.activo: return
+        with self._lock:
+            self.tiempos.setdefault(etapa, []).append(segundos)
+
+    def reiniciar(self):
+        with self._lock:
+            self.tiempos = {}
+
+    def envolver(self, objeto, atributo, etapa):
+        original = getattr(objeto, atributo)
+
+        @functools.wraps(original)
+        def cronometrado(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.registrar(etapa, time.perf_counter() - inicio)
+
+        setattr(objeto, atributo, cronometrado)
+
+class _JsonCronometrado:
+    """Sustituye al módulo json dentro de tempo para medir json.dumps."""
+
+    def __init__(self, etapas):
+        self._etapas = etapas
+
+    def dumps(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return json.dumps(*args, **kwargs)
+        finally:
+            self._etapas.registrar('serializacion', time.perf_counter() - inicio)
+
+    def __getattr__(self, nombre):
+        return getattr(json, nombre)
+
+class Peticion:
+    """Lo mínimo que handler() usa de la petición de Vercel."""
+
+    def __init__(self, cuerpo):
+        self.method = 'POST'
+        self.body = json.dumps(cuerpo)
+
+def instrumentar(tempo, etapas):
+    etapas.envolver(tempo, 'buscar_granulos', 'busqueda')
+    etapas.envolver(tempo, 'abrir_remoto', 'apertura')
+    etapas.envolver(tempo.GranuloTempo, '__init__', 'apertura')
+    etapas.envolver(tempo, 'indice_rejilla', 'coordenadas')
+    etapas.envolver(tempo.IndiceRejilla, 'indices', 'coordenadas')
+    etapas.envolver(tempo.GranuloTempo, 'leer_puntos', 'lectura')
+    etapas.envolver(tempo, 'calcular_indice_realista', 'puntuacion')
+    tempo.json = _JsonCronometrado(etapas)
+
+def _percentiles(segundos):
+    ms = np.asarray(segundos) * 1000
+    if not ms.size: return None
+    return {
+        'n': int(ms.size),
+        'p50': round(float(np.percentile(ms, 50)), 3),
+        'p95': round(float(np.percentile(ms, 95)), 3),
+        'p99': round(float(np.percentile(ms, 99)), 3),
+        'total': round(float(ms.sum()), 3),
+    }
+
+def _bytes(respuesta):
+    return int(sum(respuesta.get('bytes_leidos', {}).values()))
+
+def _vaciar_caches(tempo):
+    tempo.cache_granulos._entradas.clear()
+    with tempo._lock_indices_rejilla:
+        tempo._indices_rejilla.clear()
+
+def _puntos(rng, n):
+    return [{'lat': float(a), 'lon': float(b)}
+            for a, b in zip(rng.uniform(LAT_MIN, LAT_MAX, n), rng.uniform(LON_MIN, LON_MAX, n))]
+
+def escenario_individual(tempo, puntos, frio):
+    """Una petición por punto a través de handler() (incluye la serialización)."""
+    latencias, bytes_leidos = [], 0
+    for punto in puntos:
+        if frio: _vaciar_caches(tempo)
+        inicio = time.perf_counter()
+        respuesta = tempo.handler(Peticion(punto))
+        latencias.append(time.perf_counter() - inicio)
+        bytes_leidos += _bytes(json.loads(respuesta['body']))
+    return latencias, bytes_leidos
+
+def escenario_lote(tempo, puntos, tamano):
+    latencias, bytes_leidos = [], 0
+    for k in range(0, len(puntos), tamano):
+        inicio = time.perf_counter()
+        respuesta = tempo.handler(Peticion({'puntos': puntos[k:k + tamano]}))
+        latencias.append(time.perf_counter() - inicio)
+        bytes_leidos += _bytes(json.loads(respuesta['body']))
+    return latencias, bytes_leidos
+
+def escenario_concurrente(tempo, puntos, hilos):
+    def una(punto):
+        inicio = time.perf_counter()
+        respuesta = tempo.handler(Peticion(punto))
+        return time.perf_counter() - inicio, _bytes(json.loads(respuesta['body']))
+
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        salidas = list(executor.map(una, puntos))
+    return [s[0] for s in salidas], sum(s[1] for s in salidas)
+
+def medir(tempo, etapas, nombre, ejecutar, con_memoria=True):
+    """Corre el escenario dos veces: una cronometrada y otra bajo tracemalloc."""
+    etapas.reiniciar()
+    etapas.activo = True
+    inicio = time.perf_counter()
+    latencias, bytes_leidos = ejecutar()
+    duracion = time.perf_counter() - inicio
+    resultado = {
+        'peticiones': len(latencias),
+        'segundos': round(duracion, 3),
+        'peticiones_por_segundo': round(len(latencias) / duracion, 2),
+        'latencia_ms': _percentiles(latencias),
+        'etapas_ms': {etapa: _percentiles(t) for etapa, t in sorted(etapas.tiempos.items())},
+        'bytes_leidos': bytes_leidos,
+    }
+    if con_memoria:
+        etapas.activo = False
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        antes = tracemalloc.take_snapshot()
+        ejecutar()
+        despues = tracemalloc.take_snapshot()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        asignado = sum(d.size_diff for d in despues.compare_to(antes, 'filename') if d.size_diff > 0)
+        resultado['memoria'] = {
+            'pico_kb': round(pico / 1024, 1),
+            'retenido_kb': round(asignado / 1024, 1),
+        }
+        etapas.activo = True
+    print(f"  {nombre}: p50 {resultado['latencia_ms']['p50']} ms, "
+          f"{resultado['peticiones_por_segundo']} pet/s", file=sys.stderr)
+    return resultado
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar(actual, anterior):
+    """Variación relativa de p50 (latencia total y por etapa) de cada escenario."""
+    variaciones = {}
+    for nombre, escenario in actual['escenarios'].items():
+        base = anterior.get('escenarios', {}).get(nombre)
+        if not base: continue
+        filas = {'total': (escenario['latencia_ms'], base['latencia_ms'])}
+        for etapa, valores in escenario['etapas_ms'].items():
+            filas[etapa] = (valores, base['etapas_ms'].get(etapa))
+        variaciones[nombre] = {
+            etapa: round((nuevo['p50'] - viejo['p50']) / viejo['p50'], 3)
+            for etapa, (nuevo, viejo) in filas.items() if nuevo and viejo and viejo['p50']
+        }
+    return {'commit_anterior': anterior.get('commit'), 'p50_relativo': variaciones}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks sin red del camino caliente de /api/tempo')
+    parser.add_argument('--forma', type=int, nargs=2, default=(1000, 2000), metavar=('LAT', 'LON'))
+    parser.add_argument('--puntos', type=int, default=50, help='Peticiones por escenario')
+    parser.add_argument('--lote', type=int, default=100, help='Puntos por petición en el escenario de lote')
+    parser.add_argument('--hilos', type=int, default=8, help='Hilos del escenario concurrente')
+    parser.add_argument('--latencia-busqueda', type=float, default=0.0)
+    parser.add_argument('--latencia-apertura', type=float, default=0.0)
+    parser.add_argument('--sin-memoria', action='store_true', help='Omitir la pasada con tracemalloc')
+    parser.add_argument('--directorio', default=os.path.join(tempfile.gettempdir(), 'tempo_bench_suite'))
+    parser.add_argument('--salida', help='Escribir el informe JSON en este archivo')
+    parser.add_argument('--comparar', help='Informe JSON anterior con el que comparar')
+    args = parser.parse_args()
+
+    forma = tuple(args.forma)
+    fuente = os.path.join(args.directorio, f'{forma[0]}x{forma[1]}')
+    hora = datetime.utcnow().replace(minute=0, second=45, microsecond=0) - timedelta(hours=1)
+    sintetico.crear_archivo_remoto(fuente, hora, horas=1, forma=forma)
+    global LAT_MAX, LON_MAX
+    LAT_MAX = min(LAT_MAX, 14.01 + 0.02 * (forma[0] - 1))
+    LON_MAX = min(LON_MAX, -120.99 + 0.02 * (forma[1] - 1))
+
+    falso = falso_earthaccess.instalar(fuente, args.latencia_busqueda, args.latencia_apertura)
+    os.environ['TEMPO_CACHE_RESPUESTAS'] = '0'
+    os.environ.pop('TEMPO_GRANULOS_DIR', None)
+    os.environ.pop('TEMPO_ALMACEN_DIR', None)
+    sys.path.insert(0, os.path.join(RAIZ, 'api'))
+    import tempo
+    etapas = Etapas()
+    instrumentar(tempo, etapas)
+
+    rng = np.random.default_rng(0)
+    memoria = not args.sin_memoria
+    # The API logs to stderr through the 'tempo' logger at TEMPO_LOG_LEVEL (WARNING by default),
+    # so stdout carries only the report
+    escenarios = {
+        'individual_frio': medir(tempo, etapas, 'individual_frio',
+                                 lambda p=_puntos(rng, args.puntos): escenario_individual(tempo, p, True), memoria),
+        'individual_caliente': medir(tempo, etapas, 'individual_caliente',
+                                     lambda p=_puntos(rng, args.puntos): escenario_individual(tempo, p, False), memoria),
+        'lote': medir(tempo, etapas, 'lote',
+                      lambda p=_puntos(rng, args.lote * 5): escenario_lote(tempo, p, args.lote), memoria),
+        'concurrente': medir(tempo, etapas, 'concurrente',
+                             lambda p=_puntos(rng, args.puntos * 4): escenario_concurrente(tempo, p, args.hilos), memoria),
+    }
+    ruta = os.path.join(fuente, sorted(os.listdir(fuente))[0])
+    puntos = [(p['lat'], p['lon']) for p in _puntos(rng, args.puntos)]
+    try:
+        apertura = {
+            'doble_apertura': bench_granulo.medir(bench_granulo.leer_doble_apertura, ruta, puntos),
+            'granulo_tempo': bench_granulo.medir(bench_granulo.leer_granulo_tempo, ruta, puntos),
+        }
+    except ImportError as e:
+        # The legacy path needs xarray + h5netcdf
+        apertura = {'omitido': str(e)}
+
+    informe = {
+        'commit': _commit(),
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'parametros': {
+            'forma': list(forma), 'puntos': args.puntos, 'lote': args.lote, 'hilos': args.hilos,
+            'latencia_busqueda': args.latencia_busqueda, 'latencia_apertura': args.latencia_apertura,
+        },
+        'escenarios': escenarios,
+        'apertura_granulo': apertura,
+        'llamadas_earthaccess': falso.llamadas,
+        'granulos_abiertos': tempo.GranuloTempo.estadisticas(),
+    }
+    if args.comparar:
+        with open(args.comparar, 'r') as f:
+            informe['comparacion'] = comparar(informe, json.load(f))
+
+    texto = json.dumps(informe, indent=2)
+    print(texto)
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            f.write(texto + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Sustituto de earthaccess/CMR para benchmarks: sirve los granulos sintéticos de
+un directorio (sintetico.crear_archivo_remoto) con latencias simuladas y sin
+red ni credenciales. Se instala en sys.modules antes de que tempo lo importe:
+
+    import falso_earthaccess
+    falso_earthaccess.instalar('/tmp/fx', latencia_busqueda=0.3, latencia_apertura=0.2)
+"""
+import os
+import shutil
+import sys
+import threading
+import time
+import types
+
+class DataGranule(dict):
+    def __init__(self, datos, cloud_hosted=None):
+        super().__init__(datos)
+        self.cloud_hosted = cloud_hosted
+
+class EarthaccessFalso:
+    """search_data/open/download sobre un directorio, contando llamadas."""
+
+    def __init__(self, directorio, latencia_busqueda=0.0, latencia_apertura=0.0):
+        self.directorio = directorio
+        self.latencia_busqueda = latencia_busqueda
+        self.latencia_apertura = latencia_apertura
+        self._lock = threading.Lock()
+        self.llamadas = {'login': 0, 'search_data': 0, 'open': 0, 'download': 0}
+
+    def _contar(self, nombre):
+        with self._lock:
+            self.llamadas[nombre] += 1
+
+    def login(self, **kwargs):
+        self._contar('login')
+        return object()
+
+    def search_data(self, short_name, version, temporal=None, count=-1, bounding_box=None, sort_key=None, **kwargs):
+        self._contar('search_data')
+        time.sleep(self.latencia_busqueda)
+        prefijo = f"{short_name}_{version}_"
+        # Like CMR: oldest first unless sort_key='-start_date' (the scan time follows the prefix in the name)
+        nombres = sorted((n for n in os.listdir(self.directorio) if n.startswith(prefijo) and n.endswith('.nc')),
+                         reverse=sort_key == '-start_date')
+        if count and count > 0:
+            nombres = nombres[:count]
+        return [DataGranule({'umm': {'GranuleUR': nombre}}, cloud_hosted=True) for nombre in nombres]
+
+    def _ruta(self, granulo):
+        return os.path.join(self.directorio, granulo['umm']['GranuleUR'])
+
+    def open(self, granulos, open_kwargs=None, **kwargs):
+        self._contar('open')
+        time.sleep(self.latencia_apertura)
+        return [open(self._ruta(granulo), 'rb') for granulo in granulos]
+
+    def download(self, granulos, local_path=None, **kwargs):
+        self._contar('download')
+        time.sleep(self.latencia_apertura)
+        rutas = []
+        for granulo in granulos:
+            destino = os.path.join(local_path, granulo['umm']['GranuleUR'])
+            shutil.copy(self._ruta(granulo), destino)
+            rutas.append(destino)
+        return rutas
+
+def instalar(directorio, latencia_busqueda=0.0, latencia_apertura=0.0):
+    """Registra el falso como módulo `earthaccess` y lo devuelve (para leer `llamadas`)."""
+    falso = EarthaccessFalso(directorio, latencia_busqueda, latencia_apertura)
+    modulo = types.ModuleType('earthaccess')
+    for nombre in ('login', 'search_data', 'open', 'download'):
+        setattr(modulo, nombre, getattr(falso, nombre))
+    resultados = types.ModuleType('earthaccess.results')
+    resultados.DataGranule = DataGranule
+    modulo.results = resultados
+    sys.modules['earthaccess'] = modulo
+    sys.modules['earthaccess.results'] = resultados
+    os.environ.setdefault('EARTHDATA_USERNAME', 'benchmark')
+    os.environ.setdefault('EARTHDATA_PASSWORD', 'benchmark')
+    return falso
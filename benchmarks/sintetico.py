@@ -0,0 +1,94 @@
+"""
+Granulos TEMPO L3 sintéticos para los benchmarks (sin red ni credenciales).
+
+Reproduce la estructura de los archivos reales: coordenadas time/latitude/
+longitude en el grupo raíz (como dimension scales, para que xarray los lea
+igual) y las variables de VARIABLES_A_EXTRAER en el grupo 'product', en
+float64/int16 troceadas y con _FillValue.
+"""
+import os
+from datetime import timedelta
+
+import h5py
+import numpy as np
+
+VARIABLES = {
+    'vertical_column_troposphere': 1.0,
+    'vertical_column_troposphere_uncertainty': 0.1,
+    'vertical_column_stratosphere': 1.0,
+    'main_data_quality_flag': None,
+}
+
+# Column magnitudes (molecules/cm2) that spread the AQI over every band
+ESCALAS = {'NO2': 6e15, 'O3': 8e18, 'HCHO': 1.5e16}
+# Share of pixels flagged as low quality (main_data_quality_flag = 1)
+FRACCION_MALA_CALIDAD = 0.1
+RELLENO = -1.0e30
+
+def crear_granulo(ruta, forma=(200, 300), escala=6e15, semilla=0, lat0=14.01, lon0=-120.99,
+                  paso=0.02, chunks=(1, 100, 100), fraccion_nan=0.05):
+    """Escribe un granulo sintético en `ruta` (si no existe) y devuelve la ruta."""
+    if os.path.exists(ruta):
+        return ruta
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    rng = np.random.default_rng(semilla)
+    n_lat, n_lon = forma
+    temporal = ruta + '.tmp'
+    with h5py.File(temporal, 'w') as f:
+        ejes = {
+            'time': np.array([0.0]),
+            'latitude': (lat0 + paso * np.arange(n_lat)).astype(np.float32),
+            'longitude': (lon0 + paso * np.arange(n_lon)).astype(np.float32),
+        }
+        for nombre, valores in ejes.items():
+            f.create_dataset(nombre, data=valores)
+            f[nombre].make_scale(nombre)
+
+        producto = f.create_group('product')
+        faltantes = rng.random((1,) + forma) < fraccion_nan
+        for nombre, factor in VARIABLES.items():
+            if factor is None:
+                datos = (rng.random((1,) + forma) < FRACCION_MALA_CALIDAD).astype(np.int16)
+                ds = producto.create_dataset(nombre, data=datos, chunks=chunks, compression='gzip')
+            else:
+                datos = rng.random((1,) + forma) * escala * 2 * factor
+                datos[faltantes] = RELLENO
+                ds = producto.create_dataset(nombre, data=datos, chunks=chunks, compression='gzip',
+                                             fillvalue=RELLENO)
+                ds.attrs['_FillValue'] = np.float64(RELLENO)
+            for eje, dim in enumerate(('time', 'latitude', 'longitude')):
+                ds.dims[eje].attach_scale(f[dim])
+    os.replace(temporal, ruta)
+    return ruta
+
+def crear_juego(directorio, forma=(200, 300), semilla=0):
+    """Un granulo por contaminante: {'NO2': ruta, 'O3': ruta, 'HCHO': ruta}."""
+    return {
+        contaminante: crear_granulo(
+            os.path.join(directorio, f'TEMPO_{contaminante}_{forma[0]}x{forma[1]}_{semilla}.nc'),
+            forma=forma, escala=escala, semilla=semilla + i
+        )
+        for i, (contaminante, escala) in enumerate(ESCALAS.items())
+    }
+
+PRODUCTOS = {'NO2': 'TEMPO_NO2_L3', 'O3': 'TEMPO_O3TOT_L3', 'HCHO': 'TEMPO_HCHO_L3'}
+
+def nombre_granulo(short_name, inicio, escaneo=1, version='V03'):
+    """Nombre con el formato de los granulos reales: TEMPO_NO2_L3_V03_20250901T140045Z_S005.nc"""
+    return f"{short_name}_{version}_{inicio:%Y%m%dT%H%M%S}Z_S{escaneo:03d}.nc"
+
+def crear_archivo_remoto(directorio, inicio, horas=3, forma=(200, 300)):
+    """
+    Directorio que hace de archivo remoto: `horas` escaneos horarios
+    consecutivos desde `inicio` (datetime) para los tres productos, con nombres
+    reales. Devuelve las rutas creadas.
+    """
+    rutas = []
+    for h in range(horas):
+        hora = inicio + timedelta(hours=h)
+        for i, (contaminante, short_name) in enumerate(PRODUCTOS.items()):
+            rutas.append(crear_granulo(
+                os.path.join(directorio, nombre_granulo(short_name, hora, escaneo=h + 1)),
+                forma=forma, escala=ESCALAS[contaminante], semilla=100 * h + i
+            ))
+    return rutas
@@ -0,0 +1,31 @@
+"""
+Pruebas sin red ni credenciales sobre los granulos sintéticos de
+benchmarks/sintetico.py, servidos por benchmarks/falso_earthaccess.py:
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'api'))
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+import falso_earthaccess  # noqa: E402
+import sintetico  # noqa: E402
+
+# Registered as `earthaccess` before anything imports it; each test points it at its own directory
+FALSO = falso_earthaccess.instalar(tempfile.gettempdir())
+
+INICIO = datetime(2025, 9, 1, 14, 0, 45)
+
+@pytest.fixture
+def archivo_remoto(tmp_path):
+    """Cuatro horas de los tres productos servidas por el earthaccess falso; devuelve las rutas."""
+    rutas = sintetico.crear_archivo_remoto(str(tmp_path), INICIO, horas=4, forma=(120, 150))
+    FALSO.directorio = str(tmp_path)
+    return rutas
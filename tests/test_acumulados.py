@@ -0,0 +1,102 @@
+"""
+VentanaMovil (sumas y cuenta incrementales, máximo por bloques) frente al
+cálculo directo sobre las horas de la ventana, hora a hora durante 60 horas
+con huecos, NaN y píxeles marcados por quality_flag.
+"""
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from _acumulados import VARIABLES_MEDIA, VentanaMovil
+
+FORMA = (7, 9)
+HORAS_SERIE = 60
+INICIO = datetime(2025, 9, 1, 0)
+
+def _serie(semilla=11):
+    """{hora: variables} de 60 horas con huecos sueltos y uno de 10 horas seguidas."""
+    rng = np.random.default_rng(semilla)
+    serie = {}
+    for n in range(HORAS_SERIE):
+        if 35 <= n < 45 or (n % 7 != 0 and rng.random() < 0.15):
+            continue
+        trop = rng.uniform(1e15, 2e16, FORMA)
+        trop[rng.random(FORMA) < 0.1] = np.nan
+        serie[f'{INICIO + timedelta(hours=n):%Y-%m-%dT%H}'] = {
+            'troposphere': trop.astype(np.float32),
+            'uncertainty': rng.uniform(1e14, 1e15, FORMA).astype(np.float32),
+            'stratosphere': rng.uniform(2e15, 4e15, FORMA).astype(np.float32),
+            'quality_flag': (rng.random(FORMA) < 0.1).astype(np.float32),
+        }
+    return serie
+
+def _directo(serie, hora, horas):
+    """Media, máximo y cuenta de las horas de `serie` en la ventana de `horas` horas que termina en `hora`."""
+    fin = datetime.strptime(hora, '%Y-%m-%dT%H')
+    en_ventana = [v for h, v in serie.items()
+                  if timedelta(0) <= fin - datetime.strptime(h, '%Y-%m-%dT%H') < timedelta(hours=horas)]
+    validos = np.array([np.isfinite(v['troposphere']) & ~(v['quality_flag'] > 0) for v in en_ventana])
+    cuenta = validos.sum(axis=0)
+    esperado = {'cuenta': cuenta}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for nombre in VARIABLES_MEDIA:
+            suma = np.where(validos, np.array([v[nombre] for v in en_ventana], dtype=np.float64), 0.0).sum(axis=0)
+            esperado[nombre] = np.where(cuenta > 0, suma / cuenta, np.nan)
+    esperado['maximo'] = np.fmax.reduce(
+        np.where(validos, np.array([v['troposphere'] for v in en_ventana]), np.nan), axis=0)
+    return esperado
+
+def _escrito(ventana, destino):
+    os.makedirs(destino)
+    ventana.escribir(destino)
+    return {archivo[:-4]: np.load(os.path.join(destino, archivo)) for archivo in os.listdir(destino)}
+
+def _comparar(obtenido, esperado):
+    np.testing.assert_array_equal(obtenido['cuenta'], esperado['cuenta'])
+    np.testing.assert_array_equal(obtenido['maximo'], esperado['maximo'].astype(np.float32))
+    for nombre in VARIABLES_MEDIA:
+        np.testing.assert_allclose(obtenido[nombre], esperado[nombre], rtol=1e-6)
+
+@pytest.mark.parametrize('horas', [8, 24])
+def test_paridad_con_calculo_directo(tmp_path, horas):
+    serie = _serie()
+    ventana = VentanaMovil(str(tmp_path / 'estado'), horas)
+    agregadas = {}
+    for k, (hora, variables) in enumerate(serie.items()):
+        agregadas[hora] = variables
+        assert ventana.agregar(hora, variables, agregadas.get)
+        _comparar(_escrito(ventana, str(tmp_path / f'salida-{k}')), _directo(agregadas, hora, horas))
+    # Gaps alone never force a rebuild: every hour leaving the window was still readable
+    assert ventana.reconstrucciones == 0
+    # An hour that is not newer than the last one is refused
+    assert not ventana.agregar(next(iter(serie)), serie[next(iter(serie))], agregadas.get)
+
+def test_estado_persistente(tmp_path):
+    """Reabrir la ventana desde disco a mitad de la serie da el mismo resultado."""
+    serie = _serie(semilla=12)
+    agregadas = {}
+    for k, (hora, variables) in enumerate(serie.items()):
+        agregadas[hora] = variables
+        VentanaMovil(str(tmp_path / 'estado'), 8).agregar(hora, variables, agregadas.get)
+    ultima = next(reversed(serie))
+    _comparar(_escrito(VentanaMovil(str(tmp_path / 'estado'), 8), str(tmp_path / 'salida')),
+              _directo(agregadas, ultima, 8))
+
+def test_hora_perdida_rehace_la_ventana(tmp_path):
+    """Si una hora que sale ya no está, la ventana se rehace con las disponibles y queda incompleta."""
+    serie = _serie(semilla=13)
+    horas = list(serie)
+    ventana = VentanaMovil(str(tmp_path / 'estado'), 8)
+    disponibles = {}
+    for hora in horas[:20]:
+        disponibles[hora] = serie[hora]
+        ventana.agregar(hora, serie[hora], disponibles.get)
+    # Retention dropped every partition but the last three before the next hour arrives
+    for hora in horas[:17]:
+        del disponibles[hora]
+    disponibles[horas[20]] = serie[horas[20]]
+    ventana.agregar(horas[20], serie[horas[20]], disponibles.get)
+    assert ventana.reconstrucciones == 1 and not ventana.completa()
+    _comparar(_escrito(ventana, str(tmp_path / 'salida')), _directo(disponibles, horas[20], 8))
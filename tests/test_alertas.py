@@ -0,0 +1,110 @@
+"""
+Alertas sobre un archivo remoto sintético servido por el earthaccess falso:
+las transiciones emitidas coinciden con las calculadas punto a punto con el
+AQI escalar, incluyen subidas y bajadas de categoría y no se repiten al
+volver a pasar ni tras guardar y cargar el estado.
+"""
+import os
+from datetime import timedelta
+
+import h5py
+import numpy as np
+
+import sintetico
+import tempo
+from _alertas import MotorAlertas, RegistroSuscripciones, procesar
+from _granulo import VARIABLES_A_EXTRAER
+from _ingesta import FuenteCMR
+from conftest import INICIO
+
+ORDEN_CATEGORIAS = ['Bueno', 'Moderado', 'Poco saludable para sensibles', 'Poco saludable',
+                    'Muy poco saludable', 'Peligroso']
+
+def _suscripciones(n=300, semilla=5):
+    """Puntos dentro de la rejilla sintética (lat0=14.01, lon0=-120.99, paso 0.02, 120x150)."""
+    rng = np.random.default_rng(semilla)
+    registro = RegistroSuscripciones()
+    registro.agregar(14.01 + rng.random(n) * 0.02 * 119, -120.99 + rng.random(n) * 0.02 * 149)
+    return registro
+
+def _leer_pixeles(ruta, lats, lons):
+    """{variable: array} en el píxel más cercano a cada punto, leyendo el HDF5 directamente."""
+    with h5py.File(ruta, 'r') as f:
+        filas = [int(np.abs(f['latitude'][:] - lat).argmin()) for lat in lats]
+        columnas = [int(np.abs(f['longitude'][:] - lon).argmin()) for lon in lons]
+        valores = {}
+        for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items():
+            ds = f['product'][nombre_tempo]
+            datos = ds[0].astype(np.float64)[filas, columnas]
+            if '_FillValue' in ds.attrs:
+                datos[datos == ds.attrs['_FillValue']] = np.nan
+            valores[nombre_interno] = datos
+        return valores
+
+def _esperados(directorio, registro, horas, ultimos=None, categorias=None):
+    """
+    Eventos que debería emitir procesar() recorriendo, producto a producto,
+    `horas` (datetimes) del directorio. `ultimos` y `categorias` arrastran el
+    estado entre llamadas.
+    """
+    ultimos = {} if ultimos is None else ultimos
+    categorias = [None] * len(registro) if categorias is None else categorias
+    eventos = []
+    for config in tempo.DATASETS_CONFIG:
+        contaminante = config['contaminante']
+        for hora in horas:
+            prefijo = sintetico.nombre_granulo(config['short_name'], hora).rsplit('_S', 1)[0]
+            nombre = next(n for n in os.listdir(directorio) if n.startswith(prefijo))
+            ultimos[contaminante] = _leer_pixeles(os.path.join(directorio, nombre), registro.latitudes, registro.longitudes)
+            for k, id_ in enumerate(registro.ids):
+                presentes = {
+                    c: {v: float(valores[v][k]) for v in valores}
+                    for c, valores in ultimos.items() if not np.isnan(valores['troposphere'][k])
+                }
+                aqi = tempo.calcular_indice_realista(presentes) if presentes else None
+                categoria = tempo.get_categoria(aqi)
+                if categorias[k] is not None and categoria != categorias[k]:
+                    eventos.append({'id': int(id_), 'hora': f'{hora:%Y-%m-%dT%H}', 'producto': contaminante,
+                                    'aqi': aqi, 'categoria_anterior': categorias[k], 'categoria': categoria})
+                categorias[k] = categoria
+    return eventos, ultimos, categorias
+
+def test_transiciones_y_deduplicacion(archivo_remoto, tmp_path):
+    directorio = os.path.dirname(archivo_remoto[0])
+    motor = MotorAlertas(_suscripciones())
+    fuente = FuenteCMR()
+
+    emitidos = []
+    procesar(motor, fuente, emitidos.append)
+    horas = [INICIO + timedelta(hours=h) for h in range(4)]
+    esperados, ultimos, categorias = _esperados(directorio, motor.registro, horas)
+    assert emitidos == esperados
+
+    # Thresholds fire in both directions, not only when a point gets worse
+    saltos = [ORDEN_CATEGORIAS.index(e['categoria']) - ORDEN_CATEGORIAS.index(e['categoria_anterior'])
+              for e in emitidos if 'Sin datos' not in (e['categoria'], e['categoria_anterior'])]
+    assert any(salto > 0 for salto in saltos) and any(salto < 0 for salto in saltos)
+    assert any(e['categoria'] == 'Sin datos' for e in emitidos)
+
+    # A second pass over the same granules emits nothing
+    repetidos = []
+    procesar(motor, fuente, repetidos.append)
+    assert repetidos == []
+
+    # Neither does a restart from the saved state, which picks up only the new hour
+    estado = str(tmp_path / 'alertas.npz')
+    motor.registro.guardar(estado, horas=motor.horas)
+    registro, extra = RegistroSuscripciones.cargar(estado)
+    reanudado = MotorAlertas(registro)
+    reanudado.horas = extra['horas']
+    procesar(reanudado, fuente, repetidos.append)
+    assert repetidos == []
+
+    nueva = INICIO + timedelta(hours=4)
+    for i, (contaminante, short_name) in enumerate(sintetico.PRODUCTOS.items()):
+        sintetico.crear_granulo(os.path.join(directorio, sintetico.nombre_granulo(short_name, nueva, escaneo=5)),
+                                forma=(120, 150), escala=sintetico.ESCALAS[contaminante], semilla=400 + i)
+    nuevos = []
+    procesar(reanudado, fuente, nuevos.append)
+    esperados, _, _ = _esperados(directorio, motor.registro, [nueva], ultimos, categorias)
+    assert nuevos and nuevos == esperados
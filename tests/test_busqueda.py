@@ -0,0 +1,31 @@
+"""
+Orden de la búsqueda de granulos: el earthaccess falso devuelve, como CMR,
+del más antiguo al más nuevo salvo que se pida sort_key='-start_date', y
+buscar_granulos debe quedarse con el escaneo más reciente.
+"""
+from datetime import timedelta
+
+import pytest
+
+import tempo
+from conftest import FALSO, INICIO
+
+TEMPORAL = ('2025-09-01T00:00:00', '2025-09-01T23:59:59')
+
+@pytest.fixture
+def sin_cache(monkeypatch):
+    monkeypatch.setattr(tempo, 'cache_granulos', tempo.CacheGranulos())
+
+def test_falso_ordena_como_cmr(archivo_remoto):
+    horas = [tempo.hora_granulo(g) for g in FALSO.search_data('TEMPO_NO2_L3', 'V03', temporal=TEMPORAL)]
+    assert horas == sorted(horas) and len(horas) == 4
+    recientes = FALSO.search_data('TEMPO_NO2_L3', 'V03', temporal=TEMPORAL, count=1, sort_key='-start_date')
+    assert tempo.hora_granulo(recientes[0]) == f'{INICIO + timedelta(hours=3):%Y-%m-%dT%H}:00:00Z'
+
+def test_buscar_granulos_devuelve_el_mas_reciente(archivo_remoto, sin_cache):
+    ultima = f'{INICIO + timedelta(hours=3):%Y-%m-%dT%H}:00:00Z'
+    for config in tempo.DATASETS_CONFIG:
+        granulos = tempo.buscar_granulos(config, 30.0, -100.0, TEMPORAL)
+        assert [tempo.hora_granulo(g) for g in granulos] == [ultima]
+        horas = [tempo.hora_granulo(g) for g in tempo.buscar_granulos(config, 30.0, -100.0, TEMPORAL, count=10)]
+        assert horas == sorted(horas, reverse=True) and len(horas) == 4
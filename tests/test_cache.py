@@ -0,0 +1,137 @@
+"""
+Cache de respuestas por píxel: los resultados parciales (producto expirado o
+fallido) no se guardan, y las peticiones concurrentes de una misma clave
+esperan a un único cálculo.
+"""
+import threading
+import time
+
+import pytest
+
+import tempo
+
+CLAVE = (('NO2', 'g', 1, 2), ('O3', 'g', 1, 2), ('HCHO', 'g', 1, 2))
+VALORES = {'troposphere': 3e15, 'uncertainty': 1e14, 'stratosphere': 3e15, 'quality_flag': 0.0}
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = tempo.CacheRespuestas(max_entradas=16, ttl=60)
+    monkeypatch.setattr(tempo, 'cache_respuestas', cache)
+    monkeypatch.setattr(tempo, 'CACHE_RESPUESTAS', True)
+    monkeypatch.setattr(tempo, 'claves_respuesta', lambda lats, lons: [CLAVE])
+    return cache
+
+def test_producto_fallido_no_se_cachea(cache, monkeypatch):
+    fallan = {'O3'}
+    llamadas = []
+
+    def consultar_producto(config, lat, lon, temporal, relleno=False):
+        llamadas.append(config["contaminante"])
+        if config["contaminante"] in fallan:
+            raise OSError('HTTP 503 del servidor de granulos')
+        return (dict(VALORES), '2025-09-01T14:00:00Z'), 100
+
+    monkeypatch.setattr(tempo, '_consultar_producto', consultar_producto)
+
+    for _ in range(2):
+        datos, estado = tempo.consultar_tempo_coordenada_cacheada(30.0, -100.0)
+        assert estado == 'MISS'
+        assert datos['productos_fallidos'] == ['O3'] and datos['productos_expirados'] == []
+        assert set(datos['contaminantes']) == {'NO2', 'HCHO'}
+    assert len(cache._entradas) == 0 and llamadas.count('O3') == 2
+
+    # Once the upstream recovers the complete answer is cached and served from memory
+    fallan.clear()
+    datos, estado = tempo.consultar_tempo_coordenada_cacheada(30.0, -100.0)
+    assert estado == 'MISS' and datos['productos_fallidos'] == []
+    datos, estado = tempo.consultar_tempo_coordenada_cacheada(30.0, -100.0)
+    assert estado == 'HIT' and set(datos['contaminantes']) == {'NO2', 'O3', 'HCHO'}
+    assert datos['bytes_leidos'] == {'NO2': 0, 'O3': 0, 'HCHO': 0}
+
+def test_lote_con_producto_fallido_no_se_cachea(cache, monkeypatch):
+    def consultar_producto_lote(config, lats, lons, temporal):
+        if config["contaminante"] == 'HCHO':
+            raise ValueError('granulo truncado')
+        return [dict(VALORES) for _ in lats], 10
+
+    monkeypatch.setattr(tempo, '_consultar_producto_lote', consultar_producto_lote)
+    lote, _, estado, en_cache = tempo.consultar_tempo_lote_cacheado([{'lat': 30.0, 'lon': -100.0}])
+    assert estado == 'MISS' and en_cache == 0
+    assert lote[0]['productos_fallidos'] == ['HCHO']
+    assert len(cache._entradas) == 0
+
+def _en_paralelo(cache, n, calcular, cacheable=lambda datos: True):
+    resultados = [None] * n
+
+    def pedir(k):
+        try:
+            resultados[k] = cache.obtener_o_calcular(CLAVE, calcular, cacheable)
+        except Exception as e:
+            resultados[k] = e
+
+    hilos = [threading.Thread(target=pedir, args=(k,)) for k in range(n)]
+    for hilo in hilos:
+        hilo.start()
+    return hilos, resultados
+
+def _esperar_coalescidas(cache, n):
+    limite = time.monotonic() + 5
+    while cache.estadisticas()['coalescidas'] < n:
+        assert time.monotonic() < limite, 'las peticiones no llegaron a coalescer'
+        time.sleep(0.005)
+
+def test_coalescencia_un_solo_calculo(cache):
+    liberar = threading.Event()
+    calculos = []
+
+    def calcular():
+        calculos.append(1)
+        liberar.wait(5)
+        return {'tiene_datos': True, 'contaminantes': {}}
+
+    hilos, resultados = _en_paralelo(cache, 8, calcular)
+    _esperar_coalescidas(cache, 7)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(calculos) == 1
+    assert sorted(estado for _, estado in resultados) == ['COALESCED'] * 7 + ['MISS']
+    assert all(datos is resultados[0][0] for datos, _ in resultados)
+    assert cache.obtener_o_calcular(CLAVE, calcular)[1] == 'HIT'
+    assert cache.estadisticas()['en_curso'] == 0
+
+def test_coalescencia_propaga_errores_sin_cachear(cache):
+    liberar = threading.Event()
+
+    def calcular():
+        liberar.wait(5)
+        raise RuntimeError('CMR caído')
+
+    hilos, resultados = _en_paralelo(cache, 4, calcular)
+    _esperar_coalescidas(cache, 3)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert all(isinstance(r, RuntimeError) for r in resultados)
+    assert cache.estadisticas()['en_curso'] == 0 and len(cache._entradas) == 0
+    # The next request computes again instead of waiting on the failed one
+    assert cache.obtener_o_calcular(CLAVE, lambda: {'tiene_datos': False})[1] == 'MISS'
+
+def test_resultado_no_cacheable_se_comparte_pero_no_se_guarda(cache):
+    liberar = threading.Event()
+    parcial = {'tiene_datos': True, 'productos_fallidos': ['O3']}
+
+    def calcular():
+        liberar.wait(5)
+        return parcial
+
+    hilos, resultados = _en_paralelo(cache, 3, calcular, tempo._cacheable)
+    _esperar_coalescidas(cache, 2)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert all(datos is parcial for datos, _ in resultados)
+    assert len(cache._entradas) == 0
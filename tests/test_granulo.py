@@ -0,0 +1,90 @@
+"""
+GranuloTempo (un único handle h5py) frente a la lectura con xarray de App.py
+(raíz y grupo 'product' por separado) sobre el mismo granulo, abierto por
+ruta local y como objeto archivo de earthaccess.open, y lectura de puntos
+dispersos sin leer la ventana entera que los contiene.
+"""
+import os
+
+import numpy as np
+import pytest
+
+import _granulo
+from _granulo import VARIABLES_A_EXTRAER, ArchivoContado, GranuloTempo
+from conftest import FALSO
+
+xr = pytest.importorskip('xarray')
+pytest.importorskip('h5netcdf')
+
+def _abrir_xarray(ruta):
+    return (xr.open_dataset(ruta, engine='h5netcdf'),
+            xr.open_dataset(ruta, engine='h5netcdf', group='product'))
+
+def _fuentes(ruta):
+    """La ruta local y, después, el objeto archivo que devuelve earthaccess.open."""
+    yield ruta
+    with FALSO.open([{'umm': {'GranuleUR': os.path.basename(ruta)}}])[0] as archivo:
+        yield archivo
+
+def test_leer_puntos_igual_que_xarray(archivo_remoto):
+    rng = np.random.default_rng(3)
+    for ruta in archivo_remoto[:3]:
+        ds_root, ds_product = _abrir_xarray(ruta)
+        with ds_root, ds_product:
+            n_lat, n_lon = ds_root.sizes['latitude'], ds_root.sizes['longitude']
+            lat_idx = np.concatenate([[0, n_lat - 1], rng.integers(0, n_lat, 200)])
+            lon_idx = np.concatenate([[0, n_lon - 1], rng.integers(0, n_lon, 200)])
+            for fuente in _fuentes(ruta):
+                with GranuloTempo(fuente) as granulo:
+                    np.testing.assert_array_equal(granulo.latitudes, ds_root['latitude'].values)
+                    np.testing.assert_array_equal(granulo.longitudes, ds_root['longitude'].values)
+                    columnas = granulo.leer_puntos(lat_idx, lon_idx)
+                assert set(columnas) == set(VARIABLES_A_EXTRAER)
+                for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items():
+                    esperado = ds_product[nombre_tempo].isel(time=0).values[lat_idx, lon_idx]
+                    np.testing.assert_array_equal(columnas[nombre_interno], esperado.astype(np.float64))
+                    if nombre_interno == 'troposphere':
+                        # The synthetic granules carry fill pixels; both readers must mask them the same way
+                        assert np.isnan(columnas[nombre_interno]).any()
+
+def test_leer_franja_igual_que_xarray(archivo_remoto):
+    ruta = archivo_remoto[0]
+    ds_root, ds_product = _abrir_xarray(ruta)
+    with ds_root, ds_product:
+        for fuente in _fuentes(ruta):
+            with GranuloTempo(fuente) as granulo:
+                for i0, i1, j0, j1 in ((0, 120, 0, 150), (37, 115, 11, 140), (119, 120, 0, 1)):
+                    for nombre_tempo in VARIABLES_A_EXTRAER.values():
+                        esperado = ds_product[nombre_tempo].isel(time=0, latitude=slice(i0, i1),
+                                                                 longitude=slice(j0, j1)).values
+                        np.testing.assert_array_equal(granulo.leer_franja(nombre_tempo, i0, i1, j0, j1),
+                                                      esperado.astype(np.float64))
+
+@pytest.mark.parametrize('pixeles_por_punto', [0, 8, 10 ** 9])
+def test_leer_puntos_dispersos(archivo_remoto, monkeypatch, pixeles_por_punto):
+    """Ventana, tramos de fila o píxel a píxel: los mismos valores con cualquier densidad."""
+    monkeypatch.setattr(_granulo, 'PIXELES_POR_PUNTO', pixeles_por_punto)
+    lat_idx = np.array([0, 119, 0, 60, 60, 60, 119, 5])
+    lon_idx = np.array([0, 149, 3, 70, 75, 10, 149, 140])
+    with GranuloTempo(archivo_remoto[0]) as granulo:
+        for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items():
+            esperado = granulo.leer_franja(nombre_tempo, 0, 120)[lat_idx, lon_idx]
+            np.testing.assert_array_equal(granulo.leer_puntos(lat_idx, lon_idx)[nombre_interno], esperado)
+
+def test_puntos_lejanos_no_leen_la_ventana(archivo_remoto, monkeypatch):
+    """Dos esquinas opuestas descomprimen sus dos chunks, no los cuatro de la ventana que las contiene."""
+    lat_idx, lon_idx = np.array([0, 119]), np.array([0, 149])
+
+    def bytes_leidos(pixeles_por_punto):
+        monkeypatch.setattr(_granulo, 'PIXELES_POR_PUNTO', pixeles_por_punto)
+        with open(archivo_remoto[0], 'rb') as f:
+            archivo = ArchivoContado(f)
+            with GranuloTempo(archivo) as granulo:
+                valores = granulo.leer_puntos(lat_idx, lon_idx)
+            return archivo.bytes_leidos, valores
+
+    dispersos, por_filas = bytes_leidos(_granulo.PIXELES_POR_PUNTO)
+    ventana, en_ventana = bytes_leidos(10 ** 9)
+    assert dispersos < ventana
+    for nombre_interno in VARIABLES_A_EXTRAER:
+        np.testing.assert_array_equal(por_filas[nombre_interno], en_ventana[nombre_interno])
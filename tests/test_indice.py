@@ -0,0 +1,131 @@
+"""
+calcular_indice_realista_array frente al calcular_indice_realista escalar
+original de EXTERNALPROYECTS/App.py, en cada frontera de las tablas de
+umbrales, con NaN y con productos ausentes.
+"""
+import ast
+import itertools
+import os
+
+import numpy as np
+import pytest
+
+import tempo
+from conftest import RAIZ
+
+def _referencia():
+    """La función escalar de App.py, sin importar el módulo (hace login en Earthdata al importarse)."""
+    ruta = os.path.join(RAIZ, 'EXTERNALPROYECTS', 'App.py')
+    with open(ruta, 'r', encoding='utf-8') as f:
+        arbol = ast.parse(f.read(), ruta)
+    funcion = next(nodo for nodo in arbol.body
+                   if isinstance(nodo, ast.FunctionDef) and nodo.name == 'calcular_indice_realista')
+    espacio = {}
+    exec(compile(ast.Module(body=[funcion], type_ignores=[]), ruta, 'exec'), espacio)
+    return espacio['calcular_indice_realista']
+
+calcular_referencia = _referencia()
+
+def _bordes(umbrales):
+    """Cada umbral y el float inmediatamente anterior y posterior."""
+    umbrales = np.asarray(umbrales, dtype=np.float64)
+    return np.unique(np.concatenate([umbrales, np.nextafter(umbrales, -np.inf), np.nextafter(umbrales, np.inf)]))
+
+BORDES_NO2 = np.concatenate([_bordes(tempo.UMBRALES_NO2), [0.0, -1e15, np.nan]])
+BORDES_ESTRATOSFERA = np.concatenate([_bordes([2e15, 4e15]), [3e15, np.nan]])
+BORDES_HCHO = np.concatenate([_bordes(tempo.UMBRALES_HCHO), [0.0, np.nan]])
+BORDES_O3 = np.concatenate([_bordes([v for bajo, alto, _ in tempo.BANDAS_O3 for v in (bajo, alto)]), [8e18, 0.0, np.nan]])
+
+def _comparar(casos, nan_como_ausente=False, referencia=calcular_referencia):
+    """casos: lista de dicts {contaminante: {variable: float}}, todos con los mismos productos y variables."""
+    contaminantes = {
+        contaminante: {
+            nombre: np.array([caso[contaminante][nombre] for caso in casos])
+            for nombre in casos[0][contaminante]
+        }
+        for contaminante in casos[0]
+    }
+    vectorizado = tempo.calcular_indice_realista_array(contaminantes, nan_como_ausente=nan_como_ausente)
+    for caso, valor in zip(casos, vectorizado):
+        esperado = referencia(caso)
+        obtenido = None if np.isnan(valor) else int(valor)
+        assert obtenido == esperado, caso
+
+def test_bordes_no2_y_estratosfera():
+    casos = [
+        {'NO2': {'troposphere': trop, 'uncertainty': 0.2 * abs(trop), 'stratosphere': strat, 'quality_flag': 0.0}}
+        for trop, strat in itertools.product(BORDES_NO2, BORDES_ESTRATOSFERA)
+    ]
+    _comparar(casos)
+
+def test_bordes_hcho():
+    casos = [
+        {'HCHO': {'troposphere': trop, 'uncertainty': unc, 'stratosphere': 0.0, 'quality_flag': 0.0}}
+        for trop, unc in itertools.product(BORDES_HCHO, [0.0, 1e14, 1e17, np.nan])
+    ]
+    _comparar(casos)
+
+def test_bordes_o3():
+    casos = [{'O3': {'troposphere': total, 'uncertainty': 0.0, 'stratosphere': 0.0, 'quality_flag': 0.0}}
+             for total in BORDES_O3]
+    _comparar(casos)
+
+def test_combinaciones_de_bordes():
+    # Every band of every product together, so the weighting and the x1.15 rule for two high sub-indices are exercised
+    casos = [
+        {
+            'NO2': {'troposphere': no2, 'uncertainty': 1e15, 'stratosphere': strat, 'quality_flag': 0.0},
+            'HCHO': {'troposphere': hcho, 'uncertainty': 2e15, 'stratosphere': 0.0, 'quality_flag': 0.0},
+            'O3': {'troposphere': o3, 'uncertainty': 0.0, 'stratosphere': 0.0, 'quality_flag': 0.0},
+        }
+        for no2, strat, hcho, o3 in itertools.product(BORDES_NO2[::2], BORDES_ESTRATOSFERA[::2], BORDES_HCHO[::2], BORDES_O3[::3])
+    ]
+    _comparar(casos)
+
+@pytest.mark.parametrize('bandera', [0.0, 1.0, 2.0, np.nan])
+def test_quality_flag(bandera):
+    casos = [
+        {
+            'NO2': {'troposphere': 3e15, 'uncertainty': 1e14, 'stratosphere': 3e15, 'quality_flag': 0.0},
+            'O3': {'troposphere': 8e18, 'uncertainty': 0.0, 'stratosphere': 0.0, 'quality_flag': bandera},
+        }
+    ]
+    _comparar(casos)
+
+def test_nan_como_ausente():
+    """
+    Con nan_como_ausente (rejilla completa, alertas, modos '8h'/'diario') un
+    producto con troposphere NaN cuenta como si no estuviera, bandera incluida.
+    """
+    def sin_ausentes(caso):
+        presentes = {c: v for c, v in caso.items() if not np.isnan(v['troposphere'])}
+        return calcular_referencia(presentes) if presentes else None
+
+    casos = [
+        {
+            'NO2': {'troposphere': no2, 'uncertainty': 1e15, 'stratosphere': 3e15, 'quality_flag': 0.0},
+            'HCHO': {'troposphere': hcho, 'uncertainty': 2e15, 'stratosphere': 0.0, 'quality_flag': 0.0},
+            'O3': {'troposphere': o3, 'uncertainty': 0.0, 'stratosphere': 0.0, 'quality_flag': 0.0},
+        }
+        for no2, hcho, o3 in itertools.product([np.nan, 4e15, 6e16], [np.nan, 1e15, 2e16], [np.nan, 8e18, 5e18])
+    ]
+    _comparar(casos, nan_como_ausente=True, referencia=sin_ausentes)
+
+def test_aleatorio_y_envoltorio_escalar():
+    rng = np.random.default_rng(0)
+    n = 20000
+    contaminantes = {
+        contaminante: {
+            'troposphere': rng.uniform(-0.1, 2.5, n) * escala,
+            'uncertainty': rng.uniform(0, 1.2, n) * escala,
+            'stratosphere': rng.uniform(0, 6e15, n),
+            'quality_flag': (rng.random(n) < 0.1).astype(np.float64),
+        }
+        for contaminante, escala in (('NO2', 2e16), ('HCHO', 1e16), ('O3', 8e18))
+    }
+    vectorizado = tempo.calcular_indice_realista_array(contaminantes)
+    for k in range(0, n, 7):
+        caso = {c: {nombre: float(v[k]) for nombre, v in variables.items()} for c, variables in contaminantes.items()}
+        esperado = calcular_referencia(caso)
+        assert (None if np.isnan(vectorizado[k]) else int(vectorizado[k])) == esperado
+        assert tempo.calcular_indice_realista(caso) == esperado
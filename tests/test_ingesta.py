@@ -0,0 +1,96 @@
+"""
+Ingesta incremental con FuenteDirectorio sobre el archivo remoto sintético:
+las particiones publicadas reproducen el granulo, la marca de agua avanza hora
+a hora y no salta una descarga vacía o fallida, y la retención conserva sólo
+las últimas horas.
+"""
+import os
+from datetime import timedelta
+
+import numpy as np
+
+import sintetico
+import tempo
+from _granulo import VARIABLES_A_EXTRAER, GranuloTempo
+from _ingesta import FuenteDirectorio, ingerir, leer_manifiesto
+from conftest import INICIO
+
+HORAS = [f'{INICIO + timedelta(hours=h):%Y-%m-%dT%H}' for h in range(5)]
+
+class FuenteConFallos(FuenteDirectorio):
+    """FuenteDirectorio cuya descarga de ciertos granulos llega vacía o lanza."""
+
+    def __init__(self, directorio, vacios=(), errores=()):
+        super().__init__(directorio)
+        self.vacios, self.errores = set(vacios), set(errores)
+
+    def ruta(self, granulo):
+        nombre = tempo.id_granulo(granulo)
+        if nombre in self.vacios:
+            return None
+        if nombre in self.errores:
+            raise OSError('HTTP 500 al descargar')
+        return super().ruta(granulo)
+
+def _horas_publicadas(almacen):
+    return sorted(d for d in os.listdir(almacen) if os.path.isdir(os.path.join(almacen, d)))
+
+def _comprobar_particion(almacen, hora, contaminante, ruta):
+    particion = os.path.join(almacen, hora, contaminante)
+    with GranuloTempo(ruta) as granulo:
+        np.testing.assert_array_equal(np.load(os.path.join(particion, 'latitude.npy')), granulo.latitudes)
+        np.testing.assert_array_equal(np.load(os.path.join(particion, 'longitude.npy')), granulo.longitudes)
+        n_lat, _ = granulo.forma
+        for nombre_interno, nombre_tempo in VARIABLES_A_EXTRAER.items():
+            np.testing.assert_array_equal(np.load(os.path.join(particion, f'{nombre_interno}.npy')),
+                                          granulo.leer_franja(nombre_tempo, 0, n_lat).astype(np.float32))
+
+def _nuevo_granulo(directorio, contaminante, escaneo=5):
+    hora = INICIO + timedelta(hours=escaneo - 1)
+    ruta = os.path.join(directorio, sintetico.nombre_granulo(sintetico.PRODUCTOS[contaminante], hora, escaneo=escaneo))
+    return sintetico.crear_granulo(ruta, forma=(120, 150), escala=sintetico.ESCALAS[contaminante],
+                                   semilla=500 + escaneo)
+
+def test_ingesta_marca_de_agua_y_retencion(archivo_remoto, tmp_path):
+    directorio = os.path.dirname(archivo_remoto[0])
+    almacen = str(tmp_path / 'almacen')
+    fuente = FuenteDirectorio(directorio)
+
+    ingeridas = ingerir(fuente, almacen, conservar=2)
+    assert ingeridas == {config['contaminante']: HORAS[:4] for config in tempo.DATASETS_CONFIG}
+    manifiesto = leer_manifiesto(almacen)
+    assert {c: e['hora'] for c, e in manifiesto.items()} == {c: HORAS[3] for c in ingeridas}
+    # Only the two newest hours survive, and no half-written temporary directory is left behind
+    assert _horas_publicadas(almacen) == HORAS[2:4]
+    assert sorted(os.listdir(almacen)) == HORAS[2:4] + ['actual.json']
+    for ruta in archivo_remoto[-3:]:
+        contaminante = next(c for c, s in sintetico.PRODUCTOS.items() if os.path.basename(ruta).startswith(s + '_'))
+        assert manifiesto[contaminante]['granulo'] == os.path.basename(ruta)
+        _comprobar_particion(almacen, HORAS[3], contaminante, ruta)
+
+    # Nothing new: a second pass ingests nothing and keeps the manifest
+    assert ingerir(fuente, almacen, conservar=2) == {c: [] for c in ingeridas}
+    assert leer_manifiesto(almacen) == manifiesto
+
+def test_descarga_vacia_o_fallida_no_mueve_la_marca(archivo_remoto, tmp_path):
+    directorio = os.path.dirname(archivo_remoto[0])
+    almacen = str(tmp_path / 'almacen')
+    ingerir(FuenteDirectorio(directorio), almacen, conservar=10)
+
+    # Two new hours per product; the older one fails to download for NO2 (empty) and O3 (error)
+    nuevos = {c: [_nuevo_granulo(directorio, c, 5), _nuevo_granulo(directorio, c, 6)] for c in sintetico.PRODUCTOS}
+    fuente = FuenteConFallos(directorio, vacios=[os.path.basename(nuevos['NO2'][0])],
+                             errores=[os.path.basename(nuevos['O3'][0])])
+    ingeridas = ingerir(fuente, almacen, conservar=10)
+    nuevas = [f'{INICIO + timedelta(hours=h):%Y-%m-%dT%H}' for h in (4, 5)]
+    assert ingeridas == {'NO2': [], 'O3': [], 'HCHO': nuevas}
+    manifiesto = leer_manifiesto(almacen)
+    assert manifiesto['NO2']['hora'] == manifiesto['O3']['hora'] == HORAS[3]
+    assert manifiesto['HCHO']['hora'] == nuevas[1]
+
+    # Once the downloads work the skipped hour is ingested, not jumped over
+    ingeridas = ingerir(FuenteDirectorio(directorio), almacen, conservar=10)
+    assert ingeridas == {'NO2': nuevas, 'O3': nuevas, 'HCHO': []}
+    for contaminante, rutas in nuevos.items():
+        for hora, ruta in zip(nuevas, rutas):
+            _comprobar_particion(almacen, hora, contaminante, ruta)
@@ -0,0 +1,83 @@
+"""
+InstantaneaCompartida frente a los cambios del archivo que publica
+api/_instantanea.py: una versión nueva se mapea en cuanto cambia la firma,
+un archivo corrupto deja de servirse sin reintentarlo en cada consulta y los
+arrays ya mapeados de la versión anterior siguen siendo legibles.
+"""
+import os
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+import _instantanea
+import sintetico
+import tempo
+from _granulo import GranuloTempo
+from _ingesta import FuenteDirectorio
+from conftest import INICIO
+
+@pytest.fixture
+def aperturas(monkeypatch):
+    """Cuenta los intentos de mapear la instantánea."""
+    llamadas = []
+    original = _instantanea.Instantanea
+
+    def contar(ruta):
+        llamadas.append(ruta)
+        return original(ruta)
+
+    monkeypatch.setattr(_instantanea, 'Instantanea', contar)
+    return llamadas
+
+def _troposfera(ruta_granulo):
+    with GranuloTempo(ruta_granulo) as granulo:
+        return granulo.leer_franja('vertical_column_troposphere', 0, granulo.forma[0]).astype(np.float32)
+
+def test_nueva_version_corrupta_y_recuperacion(archivo_remoto, tmp_path, aperturas):
+    ruta = str(tmp_path / 'instantanea.bin')
+    actualizados = _instantanea.cargar(FuenteDirectorio(os.path.dirname(archivo_remoto[0])), ruta)
+    ultima = f'{INICIO + timedelta(hours=3):%Y-%m-%dT%H}'
+    assert actualizados == {'NO2': ultima, 'O3': ultima, 'HCHO': ultima}
+
+    lector = tempo.InstantaneaCompartida(ruta, max_edad_h=0)
+    particion = lector.particion('NO2')
+    assert particion['hora'] == ultima and lector.versiones == 1
+    anteriores = particion['variables']['troposphere']
+    np.testing.assert_array_equal(anteriores[:], _troposfera(archivo_remoto[-3]))
+
+    # Same file, same answer: no new mapping
+    for _ in range(3):
+        assert lector.particion('O3')['hora'] == ultima
+    assert len(aperturas) == 1 and lector.versiones == 1
+
+    # An unreadable file is swapped in (always by rename: truncating a mapped file would
+    # SIGBUS its readers). It stops being served and is opened once, not once per query
+    corrupta = str(tmp_path / 'corrupta.bin')
+    with open(corrupta, 'wb') as f:
+        f.write(b'NOTEMPO!' + bytes(64))
+    os.replace(corrupta, ruta)
+    for contaminante in ('NO2', 'O3', 'HCHO', 'NO2'):
+        assert lector.particion(contaminante) is None
+    assert len(aperturas) == 2 and lector.versiones == 2
+    # Arrays handed out before the change stay readable: they hold the old mapping
+    np.testing.assert_array_equal(anteriores[:], _troposfera(archivo_remoto[-3]))
+
+    # The loader publishes a new hour: picked up on the next query
+    nueva = INICIO + timedelta(hours=4)
+    nuevos = {}
+    for i, (contaminante, short_name) in enumerate(sintetico.PRODUCTOS.items()):
+        nombre = sintetico.nombre_granulo(short_name, nueva, escaneo=5)
+        ruta_granulo = sintetico.crear_granulo(str(tmp_path / nombre), forma=(120, 150),
+                                               escala=sintetico.ESCALAS[contaminante], semilla=700 + i)
+        nuevos[contaminante] = (f'{nueva:%Y-%m-%dT%H}', nombre, ruta_granulo)
+    _instantanea.escribir(ruta, nuevos)
+    particion = lector.particion('NO2')
+    assert particion['hora'] == f'{nueva:%Y-%m-%dT%H}' and particion['granulo'] == nuevos['NO2'][1]
+    np.testing.assert_array_equal(particion['variables']['troposphere'][:], _troposfera(nuevos['NO2'][2]))
+    assert len(aperturas) == 3 and lector.versiones == 3
+
+    # The file disappearing is a change too; it is not retried while missing
+    os.remove(ruta)
+    assert lector.particion('NO2') is None and lector.particion('HCHO') is None
+    assert len(aperturas) == 3
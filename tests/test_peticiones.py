@@ -0,0 +1,50 @@
+"""
+Validación de process_tempo_request antes de leer ningún granulo: tamaño del
+lote, coordenadas fuera del área de TEMPO y 'relleno' estricto.
+"""
+import pytest
+
+import tempo
+
+@pytest.fixture
+def sin_lectura(monkeypatch):
+    """Falla si alguna petición llega a consultar granulos o a generar puntos."""
+    def prohibido(*args, **kwargs):
+        raise AssertionError('la petición debió rechazarse antes de leer')
+
+    monkeypatch.setattr(tempo, 'generar_coordenadas', prohibido)
+    monkeypatch.setattr(tempo, 'consultar_tempo_coordenada_cacheada', prohibido)
+    monkeypatch.setattr(tempo, 'consultar_tempo_lote_cacheado', prohibido)
+
+@pytest.mark.parametrize('data', [
+    {'lat': 30, 'lon': -100, 'num_coordenadas': 10 ** 9, 'radio': 1000},
+    {'puntos': [{'lat': 30, 'lon': -100}] * (tempo.MAX_PUNTOS_LOTE + 1)},
+    {'puntos': {'lat': 30, 'lon': -100}},
+    {'lat': 30, 'lon': -100, 'num_coordenadas': 4, 'radio': 'nan'},
+])
+def test_lote_acotado_antes_de_generar(sin_lectura, data):
+    respuesta, estado = tempo.process_tempo_request(data)
+    assert estado == 400 and 'error' in respuesta
+
+@pytest.mark.parametrize('lat, lon', [
+    ('nan', -100), (30, 'inf'), (95, -100), (-30, -100), (30, 10), (30, -200),
+])
+def test_coordenadas_fuera_de_dominio(sin_lectura, lat, lon):
+    respuesta, estado = tempo.process_tempo_request({'lat': lat, 'lon': lon})
+    assert estado == 400 and 'error' in respuesta
+    respuesta, estado = tempo.process_tempo_request({'puntos': [{'lat': 30, 'lon': -100}, {'lat': lat, 'lon': lon}]})
+    assert estado == 400 and 'error' in respuesta
+
+@pytest.mark.parametrize('valor, esperado', [
+    (True, True), (False, False), (1, True), (0, False), ('true', True), ('false', False),
+    ('1', True), ('0', False), (' False ', False), (None, False),
+])
+def test_bandera_estricta(valor, esperado):
+    assert tempo.parsear_bandera(valor) is esperado
+
+@pytest.mark.parametrize('valor', ['no', 'yes', 2, 0.5, [], 'verdadero'])
+def test_bandera_invalida(sin_lectura, valor):
+    with pytest.raises(ValueError):
+        tempo.parsear_bandera(valor)
+    respuesta, estado = tempo.process_tempo_request({'lat': 30, 'lon': -100, 'relleno': valor})
+    assert estado == 400 and 'relleno' in respuesta['error']
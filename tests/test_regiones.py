@@ -0,0 +1,47 @@
+"""
+Modo región sobre la rejilla sintética (lat0=14.01, lon0=-120.99, paso 0.02,
+120x150): un polígono menor que un píxel cae en el píxel de su centro y uno
+fuera de la rejilla responde sin datos en vez de fallar o usar el borde.
+"""
+import numpy as np
+
+import tempo
+from _regiones import anillos, rasterizar
+
+LATITUDES = 14.01 + 0.02 * np.arange(120)
+LONGITUDES = -120.99 + 0.02 * np.arange(150)
+
+def _caja(lat_min, lon_min, lat_max, lon_max):
+    return {'type': 'Polygon', 'coordinates': [[
+        [lon_min, lat_min], [lon_max, lat_min], [lon_max, lat_max], [lon_min, lat_max], [lon_min, lat_min]
+    ]]}
+
+def _region(geometria, monkeypatch):
+    monkeypatch.setattr(tempo, 'cache_granulos', tempo.CacheGranulos())
+    monkeypatch.setattr(tempo, 'cache_mascaras', tempo.CacheMascaras())
+    respuesta, estado = tempo.process_tempo_request({'modo': 'region', 'geometria': geometria})
+    assert estado == 200
+    return respuesta['resultados'][0]
+
+def test_rasterizar_fuera_de_la_rejilla():
+    filas, columnas = rasterizar(anillos(_caja(40.0, -100.0, 40.5, -99.5)), LATITUDES, LONGITUDES)
+    assert filas.size == columnas.size == 0
+    # Smaller than a pixel but on the grid: the pixel under its centre
+    filas, columnas = rasterizar(anillos(_caja(15.012, -120.008, 15.014, -120.006)), LATITUDES, LONGITUDES)
+    assert (filas.tolist(), columnas.tolist()) == ([50], [49])
+
+def test_region_fuera_de_la_rejilla_sin_datos(archivo_remoto, monkeypatch):
+    resultado = _region(_caja(40.0, -100.0, 40.5, -99.5), monkeypatch)
+    assert not resultado['tiene_datos'] and resultado['aqi_satelital'] is None
+    assert {c: p['en_region'] for c, p in resultado['pixeles'].items()} == {'NO2': 0, 'O3': 0, 'HCHO': 0}
+
+def test_region_menor_que_un_pixel(archivo_remoto, monkeypatch):
+    resultado = _region(_caja(15.012, -120.008, 15.014, -120.006), monkeypatch)
+    assert {c: p['en_region'] for c, p in resultado['pixeles'].items()} == {'NO2': 1, 'O3': 1, 'HCHO': 1}
+
+def test_lectura_con_mascara_vacia(archivo_remoto):
+    with tempo.GranuloTempo(archivo_remoto[0]) as granulo:
+        valores, = tempo._leer_region_granulo_abierto(
+            granulo, lambda indice: (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)))
+    assert valores and all(v.size == 0 for v in valores.values())
+    assert tempo.estadisticas_region(valores) == (None, {'validos': 0, 'en_region': 0})
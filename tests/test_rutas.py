@@ -0,0 +1,34 @@
+"""
+POST /api/tempo/warm del app de Flask: deshabilitado sin
+TEMPO_TOKEN_PRECALENTAR y, con él, sólo con el token como bearer.
+"""
+import pytest
+
+import tempo
+
+@pytest.fixture
+def cliente(monkeypatch):
+    llamadas = []
+    monkeypatch.setattr(tempo, 'precalentar', lambda: llamadas.append(1) or {'auth': True})
+    cliente = tempo.app.test_client()
+    cliente.llamadas = llamadas
+    return cliente
+
+def test_warm_deshabilitado_sin_token(cliente, monkeypatch):
+    monkeypatch.setattr(tempo, 'TOKEN_PRECALENTAR', None)
+    assert cliente.get('/api/tempo/warm').status_code == 405
+    assert cliente.post('/api/tempo/warm', headers={'Authorization': 'Bearer '}).status_code == 404
+    assert cliente.llamadas == []
+
+@pytest.mark.parametrize('autorizacion', [None, 'Bearer otro', 'secreto', 'Basic secreto'])
+def test_warm_rechaza_token_invalido(cliente, monkeypatch, autorizacion):
+    monkeypatch.setattr(tempo, 'TOKEN_PRECALENTAR', 'secreto')
+    headers = {'Authorization': autorizacion} if autorizacion else {}
+    assert cliente.post('/api/tempo/warm', headers=headers).status_code == 403
+    assert cliente.llamadas == []
+
+def test_warm_con_token(cliente, monkeypatch):
+    monkeypatch.setattr(tempo, 'TOKEN_PRECALENTAR', 'secreto')
+    respuesta = cliente.post('/api/tempo/warm', headers={'Authorization': 'Bearer secreto'})
+    assert respuesta.status_code == 200 and respuesta.get_json() == {'auth': True}
+    assert cliente.llamadas == [1]